@@ -13,10 +13,13 @@ from ._app import (
     url_for,
 )
 from ._dihttp import RequestComponent, RequestURL, Response
-from ._form import Field, FieldValues, Form, RenderableForm
-from ._plating import Plating
+from ._form import Field, FieldValues, Form, RenderableForm, SignedCSRFTokens
+from ._json import StreamingJSON
+from ._metrics import LatencyHistogram, PrometheusResource, RouteMetrics
+from ._plating import FragmentCache, Plating
 from ._requirer import Requirer
 from ._session import Authorization, SessionProcurer
+from ._tracing import RingBufferTracer, TracedSpan
 from ._version import __version__ as _incremental_version
 
 if TYPE_CHECKING:
@@ -32,7 +35,9 @@ __all__ = (
     "KleinErrorHandler",
     "KleinRenderable",
     "KleinRouteHandler",
+    "LatencyHistogram",
     "Plating",
+    "FragmentCache",
     "Field",
     "FieldValues",
     "Form",
@@ -40,7 +45,13 @@ __all__ = (
     "RequestURL",
     "Response",
     "RenderableForm",
+    "RingBufferTracer",
+    "PrometheusResource",
+    "RouteMetrics",
     "SessionProcurer",
+    "SignedCSRFTokens",
+    "StreamingJSON",
+    "TracedSpan",
     "Authorization",
     "Requirer",
     "__author__",
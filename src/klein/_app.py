@@ -45,7 +45,12 @@ from werkzeug.routing import Map, MapAdapter, Rule, Submount
 from zope.interface import implementer
 
 from ._decorators import modified, named
-from ._interfaces import IKleinRequest, KleinQueryValue
+from ._interfaces import (
+    IKleinRequest,
+    IRouteMetrics,
+    ITracer,
+    KleinQueryValue,
+)
 from ._resource import KleinResource
 
 
@@ -127,6 +132,36 @@ def _call(
     return result
 
 
+def _caller(f: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Create a function which calls C{f} exactly as L{_call} would, but which
+    only checks whether C{f} is L{klein._decorators.bindable} once, now.
+
+    @return: a callable taking the same arguments as L{_call}, other than
+        C{f} itself.
+    """
+    if getattr(f, "__klein_bound__", False):
+
+        def callBound(instance: Any, *args: Any, **kwargs: Any) -> Any:
+            result = f(instance, *args, **kwargs)
+            if iscoroutine(result):
+                result = ensureDeferred(result)
+            return result
+
+        return callBound
+
+    def callUnbound(instance: Any, *args: Any, **kwargs: Any) -> Any:
+        if instance is not None:
+            result = f(instance, *args, **kwargs)
+        else:
+            result = f(*args, **kwargs)
+        if iscoroutine(result):
+            result = ensureDeferred(result)
+        return result
+
+    return callUnbound
+
+
 def buildURL(
     mapper: MapAdapter,
     endpoint: str,
@@ -180,6 +215,10 @@ class Klein:
     @ivar _url_map: A C{werkzeug.routing.Map} object which will be used for
         routing resolution.
     @ivar _endpoints: A C{dict} mapping endpoint names to handler functions.
+    @ivar metrics: An L{IRouteMetrics} to record the timing of each request
+        with, such as a L{klein.RouteMetrics}, or L{None} to record nothing.
+    @ivar tracer: An L{ITracer} to report the stages of handling each request
+        to, such as a L{klein.RingBufferTracer}, or L{None} to trace nothing.
     """
 
     _subroute_segments = 0
@@ -190,6 +229,8 @@ class Klein:
         self._error_handlers: ErrorHandlers = []
         self._instance: Optional[Klein] = None
         self._boundAs: Optional[str] = None
+        self.metrics: Optional[IRouteMetrics] = None
+        self.tracer: Optional[ITracer] = None
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, Klein):
@@ -280,6 +321,8 @@ class Klein:
             k._url_map = self._url_map
             k._endpoints = self._endpoints
             k._error_handlers = self._error_handlers
+            k.metrics = self.metrics
+            k.tracer = self.tracer
             k._instance = instance
             kref = ref(k)
             try:
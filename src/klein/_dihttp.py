@@ -2,7 +2,7 @@
 Dependency-Injected HTTP metadata.
 """
 
-from typing import Any, Dict, Mapping, Sequence, Type, Union, cast
+from typing import Any, Dict, Mapping, Sequence, Tuple, Type, Union, cast
 
 import attr
 
@@ -103,6 +103,43 @@ class RequestComponent:
         "Nothing to do upon finalization."
 
 
+_EncodedHeaders = Tuple[Tuple[bytes, Tuple[bytes, ...]], ...]
+
+
+def _encodeHeaders(
+    headers: Mapping[
+        Union[str, bytes], Union[str, bytes, Sequence[Union[str, bytes]]]
+    ]
+) -> _EncodedHeaders:
+    """
+    Encode a mapping of header names to values into a tuple of C{(name,
+    values)} pairs where every name and value is L{bytes}, ready to be passed
+    to L{Headers.setRawHeaders
+    <twisted.web.http_headers.Headers.setRawHeaders>} as a new L{list}.
+
+    Names are encoded as ISO-8859-1 and values as UTF-8, matching the
+    encoding L{Headers <twisted.web.http_headers.Headers>} applies itself.
+    """
+
+    def encodeValue(value: Union[str, bytes]) -> bytes:
+        if isinstance(value, str):
+            return value.encode("utf-8")
+        return value
+
+    encoded = []
+    for headerName, headerValueOrValues in headers.items():
+        if isinstance(headerName, str):
+            headerName = headerName.encode("iso-8859-1")
+        if isinstance(headerValueOrValues, (str, bytes)):
+            headerValues: Sequence[Union[str, bytes]] = [headerValueOrValues]
+        else:
+            headerValues = headerValueOrValues
+        encoded.append(
+            (headerName, tuple(encodeValue(value) for value in headerValues))
+        )
+    return tuple(encoded)
+
+
 @attr.s(frozen=True)
 class Response:
     """
@@ -118,6 +155,11 @@ class Response:
         - a body object, which can be anything else Klein understands; for
           example, an IResource, an IRenderable, str, bytes, etc.
 
+    Headers are encoded once, when the L{Response} is constructed, so a
+    L{Response} may be created once (for example, at module scope) and
+    returned from many requests cheaply.  As a consequence, mutating the
+    C{headers} mapping after construction has no effect on the response.
+
     @since: Klein NEXT
     """
 
@@ -129,6 +171,21 @@ class Response:
         default=attr.Factory(dict),
     )
     body = attr.ib(type=Any, default="")
+    _encodedHeaders = attr.ib(
+        type=_EncodedHeaders, init=False, repr=False, eq=False
+    )
+    _encodedBody = attr.ib(type=Any, init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self) -> None:
+        # This class is frozen, so bypass its __setattr__ to record the
+        # encoded forms of its attributes.
+        object.__setattr__(
+            self, "_encodedHeaders", _encodeHeaders(self.headers)
+        )
+        body = self.body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        object.__setattr__(self, "_encodedBody", body)
 
     def _applyToRequest(self, request: IRequest) -> Any:
         """
@@ -143,10 +200,9 @@ class Response:
               actually creates a txrequest-style response object.
         """
         request.setResponseCode(self.code)
-        for headerName, headerValueOrValues in self.headers.items():
-            if not isinstance(headerValueOrValues, (str, bytes)):
-                headerValues = headerValueOrValues
-            else:
-                headerValues = [headerValueOrValues]
-            request.responseHeaders.setRawHeaders(headerName, headerValues)
-        return self.body
+        setRawHeaders = request.responseHeaders.setRawHeaders
+        for headerName, headerValues in self._encodedHeaders:
+            # Older versions of Twisted require a list, and keep the one they
+            # are given, so each request gets its own.
+            setRawHeaders(headerName, list(headerValues))
+        return self._encodedBody
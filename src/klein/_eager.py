@@ -0,0 +1,129 @@
+# -*- test-case-name: klein.test.test_eager -*-
+"""
+Synchronous-where-possible execution of generator-based request handling.
+"""
+
+from functools import wraps
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Generator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from twisted.internet.defer import Deferred, ensureDeferred
+from twisted.python.failure import Failure
+
+C = TypeVar("C", bound=Callable)
+
+
+def _drive(
+    generator: Generator,
+    sent: Any,
+    isFailure: bool,
+    waiting: Optional[Deferred],
+    current: List[Deferred],
+) -> Any:
+    """
+    Run C{generator} until it finishes or yields a L{Deferred} which has not
+    yet fired.
+
+    @param sent: The value (or L{Failure}, if C{isFailure}) to send into the
+        generator first.
+
+    @param waiting: The L{Deferred} to fire with the result of the generator,
+        if it has already been suspended; otherwise L{None}.
+
+    @param current: A list holding the L{Deferred} on which the generator is
+        suspended, if it is, so that cancelling C{waiting} cancels it.
+
+    @return: the result of the generator if it finished without being
+        suspended, or a L{Deferred} that fires with its result if it was.
+    """
+    while True:
+        try:
+            if isFailure:
+                yielded = sent.throwExceptionIntoGenerator(generator)
+            else:
+                yielded = generator.send(sent)
+        except StopIteration as stop:
+            if waiting is None:
+                return stop.value
+            waiting.callback(stop.value)
+            return waiting
+        except BaseException:
+            if waiting is None:
+                raise
+            waiting.errback()
+            return waiting
+
+        if not isinstance(yielded, Deferred):
+            sent, isFailure = yielded, False
+            continue
+
+        available: List[Any] = []
+        suspended: List[Deferred] = []
+
+        def resume(result: Any) -> None:
+            if suspended:
+                _drive(
+                    generator,
+                    result,
+                    isinstance(result, Failure),
+                    suspended[0],
+                    current,
+                )
+            else:
+                available.append(result)
+
+        yielded.addBoth(resume)
+        if available:
+            [sent] = available
+            isFailure = isinstance(sent, Failure)
+            continue
+        if waiting is None:
+            waiting = Deferred(lambda waiting: current[0].cancel())
+        current[:] = [yielded]
+        suspended.append(waiting)
+        return waiting
+
+
+def eagerly(generatorFunction: C) -> C:
+    """
+    Decorate a generator function to be run like one decorated with
+    L{twisted.internet.defer.inlineCallbacks}, except that yielded
+    L{Deferred}s which have already fired are resumed immediately, and no
+    L{Deferred} is created unless the generator has to wait for one.
+
+    @return: a function which returns the generator's return value (or raises
+        its exception) if it never had to wait, or a L{Deferred} firing with
+        its result if it did.  Cancelling that L{Deferred} cancels the one
+        the generator is waiting for.
+    """
+
+    @wraps(generatorFunction)
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return _drive(generatorFunction(*args, **kwargs), None, False, None, [])
+
+    return run  # type: ignore[return-value]
+
+
+def awaitNext(iterator: AsyncIterator) -> Deferred:
+    """
+    Get the next item from an asynchronous iterator.
+
+    @return: a L{Deferred} firing with C{(True, item)}, or C{(False, None)}
+        if C{iterator} is exhausted.
+    """
+
+    async def nextItem() -> Tuple[bool, Any]:
+        try:
+            return (True, await iterator.__anext__())
+        except StopAsyncIteration:
+            return (False, None)
+
+    return ensureDeferred(nextItem())
@@ -1,6 +1,9 @@
 # -*- test-case-name: klein.test.test_form -*-
 
+import hashlib
+import hmac
 import json
+import re
 from typing import (
     Any,
     AnyStr,
@@ -11,26 +14,30 @@ from typing import (
     NoReturn,
     Optional,
     Sequence,
+    Tuple,
     Type,
     cast,
 )
 
 import attr
 
-from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.interfaces import IReactorTime
 from twisted.python.components import Componentized, registerAdapter
 from twisted.web.error import MissingRenderMethod
-from twisted.web.http import FORBIDDEN
+from twisted.web.http import FORBIDDEN, REQUEST_ENTITY_TOO_LARGE
 from twisted.web.iweb import IRenderable, IRequest
 from twisted.web.resource import Resource
-from twisted.web.template import Element, Tag, TagLoader, tags
+from twisted.web.template import Element, Tag, TagLoader, slot, tags
 
 from zope.interface import Attribute, Interface, implementer
 
 from ._app import KleinRenderable, _call
 from ._decorators import bindable
+from ._eager import eagerly
+from ._tracing import traced
 from .interfaces import (
     EarlyExit,
+    ICSRFTokens,
     IDependencyInjector,
     IRequestLifecycle,
     IRequiredParameter,
@@ -39,6 +46,7 @@ from .interfaces import (
     ValidationError,
     ValueAbsent,
 )
+from .storage._memory import _defaultClock
 
 
 class CrossSiteRequestForgery(Resource):
@@ -71,15 +79,151 @@ def textConverter(value: AnyStr) -> str:
         return value
 
 
-class IParsedJSONBody(Interface):
+# The largest JSON request body that forms will parse, by default.
+DEFAULT_MAX_JSON_BODY_SIZE = 10 * 1024 * 1024
+
+# How much of a JSON request body to read at a time.
+_JSON_CHUNK_SIZE = 64 * 1024
+
+
+_ABSENT = "a value was required but none was supplied"
+
+
+def _validate(
+    value: Any, converter: Callable[[Any], Any], required: bool, default: Any
+) -> Any:
+    """
+    Implementation of L{Field.validateValue}, taking the attributes of the
+    field that it uses, so that L{Form} need not look them up per request.
+    """
+    if value is None:
+        if required:
+            raise ValueAbsent(_ABSENT)
+        return default
+    try:
+        return converter(value)
+    except ValueError as ve:
+        raise ValidationError(str(ve))
+
+
+class RequestEntityTooLarge(Resource):
+    """
+    A request body was too large to parse.  Request aborted.
+    """
+
+    def __init__(self, limit: int) -> None:
+        super().__init__()
+        self.limit = limit
+
+    def render(self, request: IRequest) -> bytes:
+        """
+        For all HTTP methods, return a 413.
+        """
+        request.setResponseCode(REQUEST_ENTITY_TOO_LARGE)
+        return "Request body larger than {} bytes.".format(self.limit).encode(
+            "utf-8"
+        )
+
+
+class IParsedBody(Interface):
     """
-    Marker interface for the dict parsed from the request body's JSON contents.
+    Marker interface for the L{ParsedBody} of a request.
     """
 
     # TODO: how to allow applications to pass options to loads, such as
     # parse_float?
 
 
+@attr.s(frozen=True)
+class ParsedBody:
+    """
+    The form values submitted with a request, parsed only once per request
+    however many fields look them up.
+
+    @ivar json: The value parsed from a JSON request body, or L{None} if the
+        request body is not JSON.
+
+    @ivar args: The request's key/value form arguments.
+    """
+
+    json = attr.ib(type=Any)
+    args = attr.ib(type=Dict[bytes, List[bytes]])
+
+    @classmethod
+    def fromRequest(
+        cls,
+        request: IRequest,
+        maxJSONBodySize: Optional[int] = DEFAULT_MAX_JSON_BODY_SIZE,
+    ) -> "ParsedBody":
+        """
+        Get the L{ParsedBody} of C{request}, parsing it if this is the first
+        time it has been asked for.
+
+        @param maxJSONBodySize: The largest JSON body, in bytes, to parse, or
+            L{None} for no limit.
+
+        @raise EarlyExit: if the request body is JSON and is larger than
+            C{maxJSONBodySize}.
+        """
+        parsed = request.getComponent(IParsedBody)
+        if parsed is None:
+            parsed = cls(_parseJSON(request, maxJSONBodySize), request.args)
+            request.setComponent(IParsedBody, parsed)
+        return cast(ParsedBody, parsed)
+
+    def lookup(self, fieldName: str, encodedFieldName: bytes) -> Any:
+        """
+        Look up the value of a field.
+
+        @param fieldName: The field's name.
+
+        @param encodedFieldName: The field's name, encoded as UTF-8.
+
+        @return: the field's value: any JSON value if the body was JSON, or
+            text if it was key/value pairs, or L{None} if it is absent.
+        """
+        if self.json is not None:
+            if fieldName not in self.json:
+                return None
+            return self.json[fieldName]
+        allValues = self.args.get(encodedFieldName)
+        if allValues:
+            return allValues[0].decode("utf-8")
+        else:
+            return None
+
+
+def _parseJSON(request: IRequest, maxJSONBodySize: Optional[int]) -> Any:
+    """
+    Parse the body of C{request} as JSON, if its content type says it is.
+
+    The body is read a chunk at a time, so that a body larger than
+    C{maxJSONBodySize} is rejected without reading all of it.
+
+    @return: the parsed value, or L{None} if the body is not JSON.
+    """
+    contentType = request.getHeader(b"content-type")
+    if contentType is None or not contentType.startswith(b"application/json"):
+        return None
+    if maxJSONBodySize is not None:
+        declared = request.getHeader(b"content-length")
+        if declared is not None and declared.isdigit():
+            if int(declared) > maxJSONBodySize:
+                raise EarlyExit(RequestEntityTooLarge(maxJSONBodySize))
+    request.content.seek(0)
+    chunks = []
+    size = 0
+    while True:
+        chunk = request.content.read(_JSON_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if maxJSONBodySize is not None and size > maxJSONBodySize:
+            raise EarlyExit(RequestEntityTooLarge(maxJSONBodySize))
+        chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode("utf-8"))
+
+
 @implementer(IRequiredParameter)
 @attr.s(frozen=True)
 class Field:
@@ -150,16 +294,20 @@ class Field:
         value = self.value
         if value is None:
             value = ""  # type: ignore[unreachable]
+        return self._tags(value, _errorTags(self.error))
+
+    def _tags(self, value: Any, error_tags: List[Any]) -> Iterable[Tag]:
+        """
+        Implementation of L{Field.asTags}.
+
+        @param value: The value of the C{input} tag.
+
+        @param error_tags: Renderables describing the field's validation
+            error.
+        """
         input_tag = tags.input(
             type=self.formInputType, name=self.formFieldName, value=value
         )
-        error_tags = []
-        if self.error:
-            error_tags.append(
-                tags.div(class_="klein-form-validation-error")(
-                    self.error.message
-                )
-            )
         if self.formLabel:
             yield tags.label(self.formLabel, ": ", input_tag, *error_tags)
         else:
@@ -178,26 +326,9 @@ class Field:
         fieldName = self.formFieldName
         if fieldName is None:
             raise ValueError("Cannot extract unnamed form field.")
-        contentType = request.getHeader(b"content-type")
-        if contentType is not None and contentType.startswith(
-            b"application/json"
-        ):
-            # TODO: parse only once, please.
-            parsed = request.getComponent(IParsedJSONBody)
-            if parsed is None:
-                request.content.seek(0)
-                octets = request.content.read()
-                characters = octets.decode("utf-8")
-                parsed = json.loads(characters)
-                request.setComponent(IParsedJSONBody, parsed)
-            if fieldName not in parsed:
-                return None
-            return parsed[fieldName]
-        allValues = request.args.get(fieldName.encode("utf-8"))
-        if allValues:
-            return allValues[0].decode("utf-8")
-        else:
-            return None
+        return ParsedBody.fromRequest(request).lookup(
+            fieldName, fieldName.encode("utf-8")
+        )
 
     def validateValue(self, value: Any) -> Any:
         """
@@ -208,15 +339,7 @@ class Field:
 
         @return: The converted value.
         """
-        if value is None:
-            if self.required:
-                raise ValueAbsent("a value was required but none was supplied")
-            else:
-                return self.default
-        try:
-            return self.converter(value)
-        except ValueError as ve:
-            raise ValidationError(str(ve))
+        return _validate(value, self.converter, self.required, self.default)
 
     @classmethod
     def text(cls, **kw: Any) -> "Field":
@@ -288,6 +411,83 @@ class Field:
         )
 
 
+# (field, form field name, encoded form field name, Python argument name,
+#  extract, validate, converter, required, default), where extract and
+#  validate are the field's own extractValue and validateValue if it overrides
+#  those of Field, and otherwise None, so that extraction can be done inline
+#  and validation with _validate.
+_CompiledField = Tuple[
+    Field,
+    Optional[str],
+    bytes,
+    Optional[str],
+    Optional[Callable[[IRequest], Any]],
+    Optional[Callable[[Any], Any]],
+    Callable[[Any], Any],
+    bool,
+    Any,
+]
+
+
+def _compileField(field: Field) -> _CompiledField:
+    """
+    Resolve everything about C{field} that L{Form.populateRequestValues}
+    needs, so that it need not be looked up for each request.
+    """
+    extract = validate = None
+    if type(field).extractValue is not Field.extractValue:
+        extract = field.extractValue
+    if type(field).validateValue is not Field.validateValue:
+        validate = field.validateValue
+    return (
+        field,
+        field.formFieldName,
+        (field.formFieldName or "").encode("utf-8"),
+        field.pythonArgumentName,
+        extract,
+        validate,
+        field.converter,
+        field.required,
+        field.default,
+    )
+
+
+def _errorTags(error: Optional[ValidationError]) -> List[Tag]:
+    """
+    Render a field's validation error, if it has one.
+    """
+    if not error:
+        return []
+    return [tags.div(class_="klein-form-validation-error")(error.message)]
+
+
+# (method, enctype, encoding)
+_FormTemplateKey = Tuple[str, str, str]
+
+_ACTION_SLOT = "klein-form-action"
+_CSRF_SLOT = "klein-form-csrf"
+
+
+def _valueSlot(index: int) -> str:
+    return f"klein-form-value-{index}"
+
+
+def _errorSlot(index: int) -> str:
+    return f"klein-form-error-{index}"
+
+
+def _fieldSlot(index: int) -> str:
+    return f"klein-form-field-{index}"
+
+
+def _customTags(field: Field) -> bool:
+    """
+    Does C{field} override L{Field.asTags}, so that it must be rendered anew
+    for each request rather than cached with slots for its value and error?
+    """
+    return type(field).asTags is not Field.asTags
+
+
 @implementer(IRenderable)
 @attr.s
 class RenderableForm:
@@ -315,6 +515,7 @@ class RenderableForm:
         type=Dict[Field, ValidationError],
         default=cast(Dict[Field, ValidationError], attr.Factory(dict)),
     )
+    _csrfTokens = attr.ib(type=Optional[ICSRFTokens], default=None)
 
     ENCTYPE_FORM_DATA = "multipart/form-data"
     ENCTYPE_URL_ENCODED = "application/x-www-form-urlencoded"
@@ -324,39 +525,75 @@ class RenderableForm:
         @return: A hidden L{Field} containing the cross-site request forgery
             protection token.
         """
-        return Field.hidden(CSRF_PROTECTION, self._session.identifier)
+        return Field.hidden(
+            CSRF_PROTECTION, _tokenFor(self._session, self._csrfTokens)
+        )
 
-    def _fieldsToRender(self) -> Iterable[Field]:
+    def _template(self) -> Tag:
         """
-        @return: an iterable of L{Field} objects to include in the HTML
-            representation of this form.  This includes:
+        Get the markup of this form, with slots for the action, the CSRF
+        token and the value and error of each field, creating it if this is
+        the first time it has been rendered with this method, enctype and
+        encoding.  The action is a slot because it may vary with the URL of
+        each request, which would otherwise grow the cache without bound.
+        A field which overrides L{Field.asTags} has a slot for all of its
+        markup instead, which is rendered anew each time.
+
+        The markup includes:
 
-                - all the user-specified fields in the form
+            - all the user-specified fields in the form
 
-                - the CSRF protection hidden field
+            - the CSRF protection hidden field
 
-                - if no "submit" buttons are included in the form, one
-                  additional field for a default submit button so the form can
-                  be submitted.
+            - if no "submit" buttons are included in the form, one
+              additional field for a default submit button so the form can be
+              submitted.
+
+        @return: a L{Tag} which must not be modified, since it is shared
+            between requests.
         """
+        key = (self._method, self._enctype, self._encoding)
+        templates = self._form.templates
+        template = templates.get(key)
+        if template is not None:
+            return template
+
         anySubmit = False
-        for field in self._form.fields:
-            yield attr.assoc(
-                field,
-                value=self.prevalidationValues.get(field, field.value),
-                error=self.validationErrors.get(field, None),
-            )
+        fieldTags = []
+        for index, field in enumerate(self._form.fields):
+            if _customTags(field):
+                fieldTags.append(slot(_fieldSlot(index)))
+            else:
+                fieldTags.extend(
+                    field._tags(
+                        slot(_valueSlot(index)), [slot(_errorSlot(index))]
+                    )
+                )
             if field.formInputType == "submit":
                 anySubmit = True
         if not anySubmit:
-            yield Field(
-                converter=str,
-                formInputType="submit",
-                value="submit",
-                formFieldName="__klein_auto_submit__",
+            fieldTags.extend(
+                Field(
+                    converter=str,
+                    formInputType="submit",
+                    value="submit",
+                    formFieldName="__klein_auto_submit__",
+                ).asTags()
             )
+        formAttributes = {
+            "accept-charset": self._encoding,
+            "class": "klein-form",
+        }
         if self._method.lower() == "post":
-            yield self._fieldForCSRF()
+            # Enctype has no meaning on method="GET" forms.
+            formAttributes.update(enctype=self._enctype)
+            fieldTags.extend(
+                Field.hidden(CSRF_PROTECTION, "")._tags(slot(_CSRF_SLOT), [])
+            )
+        template = templates[key] = tags.form(
+            action=slot(_ACTION_SLOT), method=self._method, **formAttributes
+        )(fieldTags)
+        return template
 
     # Public interface below.
 
@@ -371,16 +608,23 @@ class RenderableForm:
         """
         Render this form to the given request.
         """
-        formAttributes = {
-            "accept-charset": self._encoding,
-            "class": "klein-form",
-        }
+        slots: Dict[str, Any] = {_ACTION_SLOT: self._action}
+        prevalidationValues = self.prevalidationValues
+        validationErrors = self.validationErrors
+        for index, field in enumerate(self._form.fields):
+            value = prevalidationValues.get(field, field.value)
+            error = validationErrors.get(field)
+            if _customTags(field):
+                slots[_fieldSlot(index)] = list(
+                    attr.assoc(field, value=value, error=error).asTags()
+                )
+                continue
+            slots[_valueSlot(index)] = "" if value is None else value
+            slots[_errorSlot(index)] = _errorTags(error)
         if self._method.lower() == "post":
-            # Enctype has no meaning on method="GET" forms.
-            formAttributes.update(enctype=self._enctype)
-        return tags.form(
-            action=self._action, method=self._method, **formAttributes
-        )(field.asTags() for field in self._fieldsToRender())
+            slots[_CSRF_SLOT] = self._fieldForCSRF().value
+        # The template is shared, so fill its slots on a new tag around it.
+        return tags.transparent(self._template()).fillSlots(**slots)
 
     def glue(self) -> Iterable[Tag]:
         """
@@ -444,6 +688,7 @@ def defaultValidationFailureHandler(
         "utf-8",
         fieldValues.prevalidationValues,
         fieldValues.validationErrors,
+        ICSRFTokens(request, None),
     )
 
     return Element(TagLoader(renderable))
@@ -472,15 +717,22 @@ class IForm(Interface):
     """
 
     fields: Sequence[Field] = Attribute("Form fields")
+    templates: Dict[_FormTemplateKey, Tag] = Attribute(
+        "Markup for this form, by method, enctype and encoding, "
+        "cached by L{RenderableForm}."
+    )
 
     def populateRequestValues(
         injectionComponents: Componentized,
         instance: Any,
         request: IRequest,
-    ) -> Deferred:
+    ) -> Any:
         """
         Extract the values present in this request and populate a
         L{FieldValues} object.
+
+        @return: L{None}, or a L{Deferred} firing with L{None} if validation
+            had to wait.
         """
 
 
@@ -523,9 +775,12 @@ class IFieldValues(Interface):
         "Validation errors"
     )
 
-    def validate(instance: Any, request: IRequest) -> Deferred:
+    def validate(instance: Any, request: IRequest) -> Any:
         """
         If any validation errors have occurred, raise a relevant exception.
+
+        @return: L{None}, or a L{Deferred} firing with L{None} or failing
+            with the exception, if the validation failure handler had to wait.
         """
 
 
@@ -542,8 +797,8 @@ class FieldValues:
     validationErrors = attr.ib(type=Dict[Field, ValidationError])
     _injectionComponents = attr.ib(type=Componentized)
 
-    @inlineCallbacks
-    def validate(self, instance: Any, request: IRequest) -> Deferred:
+    @eagerly
+    def validate(self, instance: Any, request: IRequest) -> Any:
         if self.validationErrors:
             result = yield _call(
                 instance,
@@ -593,7 +848,7 @@ class FieldInjector:
         # side-effect-free (like a search field) that can be handled even
         # without a CSRF token.
         @bindable
-        def populateValuesHook(instance: Any, request: IRequest) -> Deferred:
+        def populateValuesHook(instance: Any, request: IRequest) -> Any:
             return finalForm.populateRequestValues(
                 self._componentized, instance, request
             )
@@ -601,7 +856,7 @@ class FieldInjector:
         self._lifecycle.addPrepareHook(
             populateValuesHook,
             provides=[IFieldValues],
-            requires=[ISession],
+            after=[ISession],
         )
 
 
@@ -619,6 +874,68 @@ class IValidationFailureHandler(Interface):
         """
 
 
+# The expiry of a signed token: a timestamp in ASCII digits, short enough to
+# convert to an int cheaply and without error.
+_SIGNED_EXPIRY = re.compile("[0-9]{1,20}")
+
+
+@implementer(ICSRFTokens)
+@attr.s
+class SignedCSRFTokens:
+    """
+    Cross-site request forgery protection tokens which are signed with a
+    secret key.
+
+    Each token is bound to a session and expires after C{maxAge} seconds, and
+    is checked without any per-session state, so any process which knows the
+    secret key can check the tokens issued by any other.  Unlike the default
+    tokens, these do not reveal the session identifier in the markup of a
+    form.
+
+    Use by passing one to L{klein.SessionProcurer} as C{csrfTokens}.
+
+    @ivar maxAge: The number of seconds for which a token is valid.
+    """
+
+    _secret = attr.ib(type=bytes)
+    maxAge = attr.ib(type=float, default=86400.0)
+    _clock = attr.ib(type=IReactorTime, default=attr.Factory(_defaultClock))
+
+    def _signature(self, session: ISession, expires: str) -> str:
+        message = "{}:{}:{}".format(
+            session.identifier, int(session.isConfidential), expires
+        )
+        return hmac.new(
+            self._secret, message.encode("utf-8"), hashlib.sha256
+        ).hexdigest()
+
+    def tokenFor(self, session: ISession) -> str:
+        expires = str(int(self._clock.seconds() + self.maxAge))
+        return expires + "." + self._signature(session, expires)
+
+    def isValid(self, session: ISession, token: str) -> bool:
+        expires, dot, signature = token.partition(".")
+        if not (
+            dot
+            and _SIGNED_EXPIRY.fullmatch(expires)
+            and int(expires) > self._clock.seconds()
+        ):
+            return False
+        return hmac.compare_digest(
+            signature.encode("utf-8"),
+            self._signature(session, expires).encode("ascii"),
+        )
+
+
+def _tokenFor(session: ISession, tokens: Optional[ICSRFTokens]) -> str:
+    """
+    Issue a CSRF protection token for C{session}.
+    """
+    if tokens is None:
+        return cast(str, session.identifier)
+    return tokens.tokenFor(session)
+
+
 def checkCSRF(request: IRequest) -> None:
     """
     Check the request for cross-site request forgery, raising an EarlyExit if
@@ -641,8 +958,14 @@ def checkCSRF(request: IRequest) -> None:
         # check that token.
         token = request.args.get(CSRF_PROTECTION.encode("ascii"), [b""])[
             0
-        ].decode("ascii")
-        if token == session.identifier:
+        ].decode("utf-8", "replace")
+        tokens = ICSRFTokens(request, None)
+        if tokens is not None:
+            if tokens.isValid(session, token):
+                return
+        elif hmac.compare_digest(
+            token.encode("utf-8"), session.identifier.encode("utf-8")
+        ):
             # The token matches.  We're OK.
             return
     # leak only the value passed, not the actual token, just in
@@ -655,9 +978,28 @@ def checkCSRF(request: IRequest) -> None:
 class Form:
     """
     A L{Form} is a collection of fields attached to a function.
+
+    @ivar maxJSONBodySize: The largest JSON request body, in bytes, that this
+        form will parse, or L{None} for no limit.
     """
 
     fields = attr.ib(type=Sequence[Field])
+    maxJSONBodySize = attr.ib(
+        type=Optional[int], default=DEFAULT_MAX_JSON_BODY_SIZE, kw_only=True
+    )
+    templates = attr.ib(
+        type=Dict[_FormTemplateKey, Tag],
+        default=attr.Factory(dict),
+        init=False,
+        repr=False,
+        eq=False,
+    )
+    _plan = attr.ib(
+        type=Sequence[_CompiledField], init=False, repr=False, eq=False
+    )
+
+    def __attrs_post_init__(self) -> None:
+        self._plan = [_compileField(field) for field in self.fields]
 
     @staticmethod
     def onValidationFailureFor(
@@ -703,42 +1045,85 @@ class Form:
 
         return decorate
 
-    @inlineCallbacks
+    @eagerly
     def populateRequestValues(
         self,
         injectionComponents: Componentized,
         instance: Any,
         request: IRequest,
-    ) -> Deferred:
+    ) -> Any:
         assert IFieldValues(request, None) is None
 
+        checkCSRF(request)
+
+        body = traced(
+            request,
+            "klein.form.parse",
+            {},
+            ParsedBody.fromRequest,
+            request,
+            self.maxJSONBodySize,
+        )
+        arguments, prevalidationValues, validationErrors = traced(
+            request, "klein.form.validate", {}, self._convert, request, body
+        )
+        values = FieldValues(
+            self,
+            arguments,
+            prevalidationValues,
+            validationErrors,
+            injectionComponents,
+        )
+        if validationErrors:
+            yield values.validate(instance, request)
+        request.setComponent(IFieldValues, values)
+
+    def _convert(
+        self, request: IRequest, body: ParsedBody
+    ) -> Tuple[
+        Dict[str, Any], Dict[Field, Optional[str]], Dict[Field, ValidationError]
+    ]:
+        """
+        Extract, validate and convert the value of each field from
+        C{request}.
+
+        @return: the converted values of the fields which are valid, by
+            argument name; the values of all the fields before validation;
+            and the validation errors of those which are not valid.
+        """
         validationErrors = {}
         prevalidationValues = {}
         arguments = {}
-
-        checkCSRF(request)
-
-        for field in self.fields:
-            text = field.extractValue(request)
+        for (
+            field,
+            fieldName,
+            encodedFieldName,
+            argName,
+            extract,
+            validate,
+            converter,
+            required,
+            default,
+        ) in self._plan:
+            if extract is not None:
+                text = extract(request)
+            elif fieldName is None:
+                raise ValueError("Cannot extract unnamed form field.")
+            else:
+                text = body.lookup(fieldName, encodedFieldName)
             prevalidationValues[field] = text
             try:
-                value = field.validateValue(text)
-                argName = field.pythonArgumentName
+                if validate is not None:
+                    value = validate(text)
+                else:
+                    value = _validate(text, converter, required, default)
                 if argName is None:
                     raise ValidationError("Form fields must all have names.")
             except ValidationError as ve:
                 validationErrors[field] = ve
             else:
                 arguments[argName] = value
-        values = FieldValues(
-            self,
-            arguments,
-            prevalidationValues,
-            validationErrors,
-            injectionComponents,
-        )
-        yield values.validate(instance, request)
-        request.setComponent(IFieldValues, values)
+        return arguments, prevalidationValues, validationErrors
 
     @classmethod
     def rendererFor(
@@ -821,6 +1206,7 @@ class RenderableFormParam:
             self._encoding,
             prevalidationValues={},
             validationErrors={},
+            csrfTokens=ICSRFTokens(request, None),
         )
 
     def finalize(self) -> None:
@@ -9,6 +9,9 @@ works, since mypy doesn't otherwise get along with Zope Interface.
 
 from typing import Mapping, Optional, Union
 
+from twisted.python.failure import Failure
+from twisted.web.iweb import IRequest
+
 from zope.interface import Attribute, Interface
 
 
@@ -31,4 +34,87 @@ class IKleinRequest(Interface):
         """
 
 
+class IRouteMetrics(Interface):
+    """
+    A recipient of timing measurements of each request handled by a
+    L{klein.Klein} application, as set on its C{metrics} attribute.
+    """
+
+    def recordRequest(
+        endpoint: Optional[str],
+        matchTime: float,
+        handlerTime: Optional[float],
+        totalTime: float,
+        failed: bool,
+    ) -> None:
+        """
+        Record a request which has finished.
+
+        @param endpoint: The endpoint of the route which handled the request,
+            or L{None} if no route matched it.
+
+        @param matchTime: The number of seconds spent matching the request to
+            a route.
+
+        @param handlerTime: The number of seconds from matching the route until
+            its handler's result was ready, including waiting for any
+            L{Deferred} it returned; or L{None} if no route matched.
+
+        @param totalTime: The number of seconds from the start of handling the
+            request until it finished.
+
+        @param failed: Whether handling the request failed, so that it was
+            handled by an error handler or Klein's default error responses.
+        """
+
+
+class ITracer(Interface):
+    """
+    A recipient of the start and end of each stage, or span, of handling a
+    request, as set on the C{tracer} attribute of a L{klein.Klein}
+    application.
+
+    The stages traced include matching the request's route (C{klein.match}),
+    running the route (C{klein.handler}), each of a L{klein.Requirer}'s
+    prepare hooks and injectors (C{klein.prepare} and C{klein.inject}),
+    procuring a session and authorizing it (C{klein.session.procure} and
+    C{klein.session.authorize}), parsing and validating a form
+    (C{klein.form.parse} and C{klein.form.validate}), rendering the result
+    (C{klein.render} and C{klein.plating.render}), and the whole request
+    (C{klein.request}).  Spans may overlap, since stages may run
+    concurrently.
+    """
+
+    def startSpan(
+        name: str, request: IRequest, attributes: Mapping[str, object]
+    ) -> object:
+        """
+        A stage of handling C{request} has started.
+
+        @param name: The name of the stage, such as C{"klein.match"}.
+
+        @param attributes: Details of the stage, such as the name of the
+            prepare hook being run.
+
+        @return: an object identifying the span, to pass to
+            L{ITracer.endSpan}.
+        """
+
+    def endSpan(
+        span: object,
+        attributes: Mapping[str, object],
+        failure: Optional[Failure],
+    ) -> None:
+        """
+        A stage of handling a request has ended.
+
+        @param span: The result of L{ITracer.startSpan} for the stage.
+
+        @param attributes: Further details of the stage, learned while it ran.
+
+        @param failure: The failure with which the stage ended, or L{None} if
+            it succeeded.
+        """
+
+
 __all__ = ()
@@ -269,6 +269,30 @@ class ISessionProcurer(Interface):
         """
 
 
+class ICSRFTokens(Interface):
+    """
+    An L{ICSRFTokens} issues and checks the tokens included in forms to protect
+    them against cross-site request forgery.
+
+    Provide one to forms by setting it as a component of the request, as
+    L{klein.SessionProcurer} does if given one; otherwise, a session's
+    identifier is its token.
+    """
+
+    def tokenFor(session: ISession) -> str:
+        """
+        Issue a token to include in a form rendered for C{session}.
+        """
+
+    def isValid(session: ISession, token: str) -> bool:
+        """
+        Is C{token}, submitted with a form, valid for C{session}?
+
+        This must take the same time to compare any C{token}, so that it does
+        not reveal how much of a valid token an attacker has guessed.
+        """
+
+
 class IDependencyInjector(Interface):
     """
     An injector for a given dependency.
@@ -282,6 +306,10 @@ class IDependencyInjector(Interface):
         IRequiredParameter.  This may return a Deferred, or an object, or an
         object directly providing the relevant interface.
 
+        The injectors of a route are all invoked before any of their values
+        is waited upon, so their values are computed concurrently; an
+        injector must not depend on the value of another.
+
         @param instance: The instance to which the Klein router processing this
             request is bound.
 
@@ -316,6 +344,7 @@ class IRequestLifecycle(Interface):
         beforeHook: Callable,
         requires: Sequence[Type[Interface]] = (),
         provides: Sequence[Type[Interface]] = (),
+        after: Sequence[Type[Interface]] = (),
     ) -> None:
         """
         Add a hook that promises to prepare the request by supplying the given
@@ -323,7 +352,17 @@ class IRequestLifecycle(Interface):
         requirements.
 
         Prepare hooks are run I{before any} L{IDependencyInjector}s I{inject
-        their values}.
+        their values}.  Each hook runs after all the hooks providing what it
+        requires, and hooks which do not depend on each other may run
+        concurrently.
+
+        @param requires: Interfaces which must be provided by other hooks
+            before this one runs.  It is an error if no hook provides them.
+
+        @param provides: Interfaces this hook supplies.
+
+        @param after: Interfaces which, if any other hook provides them,
+            must be provided before this one runs.
         """
 
 
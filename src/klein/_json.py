@@ -0,0 +1,252 @@
+# -*- test-case-name: klein.test.test_json -*-
+"""
+Streaming JSON responses.
+"""
+
+from inspect import iscoroutine
+from json import dumps
+from types import GeneratorType
+from typing import Any, Callable, Generator, List, Optional
+
+import attr
+from attr import Factory
+
+from twisted.internet.defer import Deferred, ensureDeferred, maybeDeferred
+from twisted.internet.interfaces import IPushProducer
+from twisted.python import log
+from twisted.python.failure import Failure
+from twisted.web.http import INTERNAL_SERVER_ERROR
+from twisted.web.iweb import IRequest
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET
+
+from zope.interface import implementer
+
+from ._eager import awaitNext, eagerly
+
+# The types which json.dumps encodes on its own.
+_ATOM_TYPES = (str, int, float, type(None))
+
+# Text, or a Deferred whose result should be encoded next.
+_Chunk = Any
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def _key(key: Any) -> str:
+    """
+    Convert C{key} to the string that L{json.dumps} would use for it as the
+    key of an object.
+    """
+    if isinstance(key, str):
+        return key
+    if isinstance(key, _ATOM_TYPES):
+        return dumps(key)
+    raise TypeError(f"keys must be str, int, float, bool or None, not {key!r}")
+
+
+def _chunks(
+    obj: Any, default: Optional[Callable[[Any], Any]]
+) -> Generator[_Chunk, Any, None]:
+    """
+    Encode C{obj} as JSON, formatted as L{json.dumps} would format it.
+
+    @param default: Called with any object which is not JSON serializable to
+        get a JSON serializable version of it, or L{None}.
+
+    @return: a generator of L{str}s of JSON, and of L{Deferred}s, whose
+        results must be sent back into the generator.  The L{Deferred}s and
+        coroutines within C{obj} are yielded only as the encoding reaches
+        them.  Generators and asynchronous iterables are encoded as arrays,
+        pulling each item from them only as the encoding reaches it.
+    """
+    while isinstance(obj, Deferred) or iscoroutine(obj):
+        obj = yield ensureDeferred(obj)
+    if isinstance(obj, _ATOM_TYPES):
+        yield dumps(obj)
+    elif isinstance(obj, (list, tuple, GeneratorType)):
+        separator = "["
+        for child in obj:
+            yield separator
+            separator = ", "
+            yield from _chunks(child, default)
+        yield "[]" if separator == "[" else "]"
+    elif hasattr(obj, "__aiter__"):
+        iterator = obj.__aiter__()
+        separator = "["
+        while True:
+            more, child = yield awaitNext(iterator)
+            if not more:
+                break
+            yield separator
+            separator = ", "
+            yield from _chunks(child, default)
+        yield "[]" if separator == "[" else "]"
+    elif isinstance(obj, dict):
+        if not obj:
+            yield "{}"
+            return
+        separator = "{"
+        for key, value in obj.items():
+            if isinstance(key, Deferred):
+                key = yield key
+            yield separator + dumps(_key(key)) + ": "
+            separator = ", "
+            yield from _chunks(value, default)
+        yield "}"
+    elif default is not None:
+        yield from _chunks(default(obj), default)
+    else:
+        raise TypeError(obj, f"{obj} not JSON serializable")
+
+
+@implementer(IPushProducer)
+@attr.s
+class _WriteGate:
+    """
+    A streaming producer registered with a request, which tells whoever is
+    writing a response to it whether its transport wants more data.
+
+    @ivar stopped: Whether the request's connection has been lost, so that
+        nothing more should be written.
+    """
+
+    stopped = attr.ib(type=bool, default=False, init=False)
+    _paused = attr.ib(type=bool, default=False, init=False)
+    _waiting = attr.ib(type=List[Deferred], default=Factory(list), init=False)
+
+    def pauseProducing(self) -> None:
+        self._paused = True
+
+    def resumeProducing(self) -> None:
+        self._paused = False
+        waiting, self._waiting = self._waiting, []
+        for deferred in waiting:
+            deferred.callback(None)
+
+    def stopProducing(self) -> None:
+        self.stopped = True
+        self.resumeProducing()
+
+    def whenWritable(self) -> Optional[Deferred]:
+        """
+        @return: L{None} if more may be written now, or a L{Deferred} that
+            fires when it may.
+        """
+        if not self._paused:
+            return None
+        waiting: Deferred = Deferred()
+        self._waiting.append(waiting)
+        return waiting
+
+
+@eagerly
+def _writeJSON(
+    request: IRequest,
+    gate: _WriteGate,
+    obj: Any,
+    default: Optional[Callable[[Any], Any]],
+    chunkSize: int,
+) -> Generator:
+    """
+    Encode C{obj} and write it to C{request}, in chunks of about
+    C{chunkSize} characters, for as long as C{gate} allows.
+
+    @return: L{True} if all of C{obj} was written, or L{False} if the
+        request's connection was lost first.
+    """
+    buffered: List[str] = []
+    size = 0
+    chunks = _chunks(obj, default)
+    sent = None
+    while True:
+        try:
+            chunk = chunks.send(sent)
+        except StopIteration:
+            break
+        sent = None
+        if isinstance(chunk, Deferred):
+            # Write what is ready before waiting for more.
+            if buffered and not chunk.called:
+                request.write("".join(buffered).encode("utf-8"))
+                buffered, size = [], 0
+            sent = yield chunk
+        else:
+            buffered.append(chunk)
+            size += len(chunk)
+            if size < chunkSize:
+                continue
+            request.write("".join(buffered).encode("utf-8"))
+            buffered, size = [], 0
+        yield gate.whenWritable()
+        if gate.stopped:
+            return False
+    request.write("".join(buffered).encode("utf-8"))
+    return True
+
+
+class StreamingJSON(Resource):
+    """
+    A JSON response body which is encoded and written to the request a chunk
+    at a time, pausing whenever the request's transport has enough to send,
+    rather than being built in memory all at once.
+
+    Return one from a L{Klein.route} to respond with JSON.  Its value may
+    contain L{Deferred}s and coroutines; each is waited on when encoding
+    reaches it, after the JSON before it has been written.  Since the
+    response may have begun by then, a failure at that point can only be
+    logged, and the connection is closed to show the client that the
+    response is incomplete.
+
+    @ivar value: The value to encode.
+
+    @ivar default: Called with any object within C{value} which is not JSON
+        serializable to get a JSON serializable version of it, like the
+        C{default} argument of L{json.dumps}, or L{None}.
+
+    @ivar chunkSize: The approximate number of characters to encode before
+        writing them to the request.
+
+    @since: Klein NEXT
+    """
+
+    isLeaf = True
+
+    def __init__(
+        self,
+        value: Any,
+        default: Optional[Callable[[Any], Any]] = None,
+        *,
+        chunkSize: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        super().__init__()
+        self.value = value
+        self.default = default
+        self.chunkSize = chunkSize
+
+    def render(self, request: IRequest) -> object:
+        """
+        Start writing this JSON to C{request}.
+        """
+        request.setHeader(b"content-type", b"application/json")
+        gate = _WriteGate()
+        request.registerProducer(gate, True)
+
+        def written(complete: bool) -> None:
+            request.unregisterProducer()
+            if complete:
+                request.finish()
+
+        def failed(failure: Failure) -> None:
+            log.err(failure, "An error occurred while encoding JSON.")
+            request.unregisterProducer()
+            if request.startedWriting:
+                request.loseConnection()
+            else:
+                request.setResponseCode(INTERNAL_SERVER_ERROR)
+                request.finish()
+
+        maybeDeferred(
+            _writeJSON, request, gate, self.value, self.default, self.chunkSize
+        ).addCallbacks(written, failed)
+        return NOT_DONE_YET
@@ -0,0 +1,315 @@
+# -*- test-case-name: klein.test.test_metrics -*-
+"""
+Per-route request metrics.
+"""
+
+from bisect import bisect_left
+from math import ceil, log2
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import attr
+from attr import Factory
+
+from twisted.web.iweb import IRequest
+from twisted.web.resource import Resource
+
+from zope.interface import implementer
+
+from ._interfaces import IRouteMetrics
+
+
+def _bounds(
+    lowest: float, highest: float, bucketsPerDoubling: int
+) -> List[float]:
+    """
+    Compute the upper bounds of the buckets of a L{LatencyHistogram}.
+    """
+    count = ceil(log2(highest / lowest) * bucketsPerDoubling)
+    return [lowest * 2 ** (i / bucketsPerDoubling) for i in range(count + 1)]
+
+
+@attr.s
+class LatencyHistogram:
+    """
+    A histogram of durations, in the style of an HDR histogram: its buckets
+    grow geometrically, so that every duration between C{lowest} and
+    C{highest} is recorded with the same relative precision, and recording
+    one takes a constant, small amount of time and no memory.
+
+    @ivar lowest: The upper bound, in seconds, of the smallest bucket.
+
+    @ivar highest: The largest duration, in seconds, to distinguish from
+        larger ones.
+
+    @ivar bucketsPerDoubling: The number of buckets into which to divide each
+        doubling of duration; each bucket spans a factor of
+        C{2 ** (1 / bucketsPerDoubling)}.
+
+    @ivar bounds: The upper bound of each bucket, in seconds.
+
+    @ivar counts: The number of durations in each bucket, with one more for
+        durations larger than the largest bound.
+
+    @ivar count: The number of durations recorded.
+
+    @ivar sum: The sum of the durations recorded.
+
+    @since: Klein NEXT
+    """
+
+    lowest = attr.ib(type=float, default=1e-5)
+    highest = attr.ib(type=float, default=60.0)
+    bucketsPerDoubling = attr.ib(type=int, default=4)
+    bounds = attr.ib(type=List[float], init=False, repr=False)
+    counts = attr.ib(type=List[int], init=False, repr=False)
+    count = attr.ib(type=int, default=0, init=False)
+    sum = attr.ib(type=float, default=0.0, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.bounds = _bounds(
+            self.lowest, self.highest, self.bucketsPerDoubling
+        )
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def record(self, duration: float) -> None:
+        """
+        Record a duration, in seconds.
+        """
+        self.counts[bisect_left(self.bounds, duration)] += 1
+        self.count += 1
+        self.sum += duration
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile of the durations recorded.
+
+        @param q: The quantile, between 0 and 1; for example, C{0.99} for the
+            99th percentile.
+
+        @return: the upper bound of the bucket containing the quantile, so an
+            overestimate by at most the width of that bucket; C{inf} if the
+            quantile is larger than C{highest}; or L{None} if nothing has been
+            recorded.
+        """
+        if not self.count:
+            return None
+        rank = max(1, ceil(q * self.count))
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+@attr.s
+class EndpointMetrics:
+    """
+    The metrics recorded for one endpoint by L{RouteMetrics}.
+
+    @ivar requests: The number of requests handled.
+
+    @ivar failures: The number of requests whose handling failed.
+
+    @ivar matchTime: The time spent matching requests to routes.
+
+    @ivar handlerTime: The time from matching the route until its handler's
+        result was ready.
+
+    @ivar totalTime: The time from the start of handling each request until
+        it finished.
+
+    @since: Klein NEXT
+    """
+
+    requests = attr.ib(type=int, default=0)
+    failures = attr.ib(type=int, default=0)
+    matchTime = attr.ib(
+        type=LatencyHistogram, default=Factory(LatencyHistogram)
+    )
+    handlerTime = attr.ib(
+        type=LatencyHistogram, default=Factory(LatencyHistogram)
+    )
+    totalTime = attr.ib(
+        type=LatencyHistogram, default=Factory(LatencyHistogram)
+    )
+
+
+@implementer(IRouteMetrics)
+@attr.s
+class RouteMetrics:
+    """
+    Counters and latency histograms of the requests handled by a
+    L{klein.Klein} application, by endpoint.
+
+    To record them, set one as the C{metrics} attribute of the application.
+    To export them, read C{endpoints}, or serve a L{PrometheusResource}.
+
+    @ivar endpoints: The metrics of each endpoint, with those of requests
+        which matched no route under L{None}.
+
+    @since: Klein NEXT
+    """
+
+    endpoints = attr.ib(
+        type=Dict[Optional[str], EndpointMetrics], default=Factory(dict)
+    )
+
+    def recordRequest(
+        self,
+        endpoint: Optional[str],
+        matchTime: float,
+        handlerTime: Optional[float],
+        totalTime: float,
+        failed: bool,
+    ) -> None:
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self.endpoints[endpoint] = EndpointMetrics()
+        metrics.requests += 1
+        if failed:
+            metrics.failures += 1
+        metrics.matchTime.record(matchTime)
+        if handlerTime is not None:
+            metrics.handlerTime.record(handlerTime)
+        metrics.totalTime.record(totalTime)
+
+
+@attr.s
+class _RequestTimer:
+    """
+    Times the handling of one request by L{klein.KleinResource}, and reports
+    it to an L{IRouteMetrics} when the request finishes.
+    """
+
+    _metrics = attr.ib(type=IRouteMetrics)
+    _started = attr.ib(type=float, init=False)
+    _endpoint = attr.ib(type=Optional[str], default=None, init=False)
+    _matched = attr.ib(type=Optional[float], default=None, init=False)
+    _handled = attr.ib(type=Optional[float], default=None, init=False)
+    _failed = attr.ib(type=bool, default=False, init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self._started = perf_counter()
+
+    def matched(self, endpoint: str) -> None:
+        """
+        The request has been matched to the route for C{endpoint}.
+        """
+        self._matched = perf_counter()
+        self._endpoint = endpoint
+
+    def handled(self, result: Any) -> Any:
+        """
+        The route's handler's result is ready; a callback which passes
+        C{result} through.
+        """
+        self._handled = perf_counter()
+        return result
+
+    def failed(self) -> None:
+        """
+        Handling the request failed, perhaps because it matched no route.
+        """
+        if self._matched is None:
+            self._matched = perf_counter()
+        self._failed = True
+
+    def finished(self, result: object) -> None:
+        """
+        The request has finished, or its connection was lost; a callback for
+        L{IRequest.notifyFinish}.
+        """
+        now = perf_counter()
+        matched = now if self._matched is None else self._matched
+        handlerTime = None
+        if self._endpoint is not None and self._handled is not None:
+            handlerTime = self._handled - matched
+        self._metrics.recordRequest(
+            self._endpoint,
+            matched - self._started,
+            handlerTime,
+            now - self._started,
+            self._failed,
+        )
+
+
+def _label(value: Optional[str]) -> str:
+    """
+    Quote a label value for the Prometheus text format.
+    """
+    if value is None:
+        return '""'
+    escaped = (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    )
+    return f'"{escaped}"'
+
+
+def _histogramLines(
+    name: str, label: str, histogram: LatencyHistogram
+) -> Iterable[str]:
+    """
+    Format a L{LatencyHistogram} in the Prometheus text format.
+    """
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{{endpoint={label},le="{bound:.6g}"}} {cumulative}'
+    yield f'{name}_bucket{{endpoint={label},le="+Inf"}} {histogram.count}'
+    yield f"{name}_sum{{endpoint={label}}} {histogram.sum!r}"
+    yield f"{name}_count{{endpoint={label}}} {histogram.count}"
+
+
+class PrometheusResource(Resource):
+    """
+    A resource which exports L{RouteMetrics} in the Prometheus text format.
+
+    @since: Klein NEXT
+    """
+
+    isLeaf = True
+
+    def __init__(self, metrics: RouteMetrics, prefix: str = "klein") -> None:
+        """
+        @param metrics: The metrics to export.
+
+        @param prefix: The prefix of the name of each metric.
+        """
+        super().__init__()
+        self._metrics = metrics
+        self._prefix = prefix
+
+    def render_GET(self, request: IRequest) -> bytes:
+        request.setHeader(
+            b"content-type", b"text/plain; version=0.0.4; charset=utf-8"
+        )
+        return "".join(line + "\n" for line in self._lines()).encode("utf-8")
+
+    def _lines(self) -> Iterable[str]:
+        prefix = self._prefix
+        endpoints = [
+            (_label(endpoint), metrics)
+            for endpoint, metrics in self._metrics.endpoints.items()
+        ]
+        for name, attribute, description in [
+            ("requests_total", "requests", "Requests handled."),
+            ("request_failures_total", "failures", "Requests which failed."),
+        ]:
+            yield f"# HELP {prefix}_{name} {description}"
+            yield f"# TYPE {prefix}_{name} counter"
+            for label, metrics in endpoints:
+                value = getattr(metrics, attribute)
+                yield f"{prefix}_{name}{{endpoint={label}}} {value}"
+        for name, attribute, description in [
+            ("match_seconds", "matchTime", "Time spent matching routes."),
+            ("handler_seconds", "handlerTime", "Time spent in handlers."),
+            ("request_seconds", "totalTime", "Time spent on each request."),
+        ]:
+            yield f"# HELP {prefix}_{name} {description}"
+            yield f"# TYPE {prefix}_{name} histogram"
+            for label, metrics in endpoints:
+                yield from _histogramLines(
+                    f"{prefix}_{name}", label, getattr(metrics, attribute)
+                )
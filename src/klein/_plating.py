@@ -4,23 +4,66 @@
 Templating wrapper support for Klein.
 """
 
-from functools import partial
-from json import dumps
-from operator import setitem
-from typing import Any, Callable, List, Tuple, cast
+from collections import OrderedDict
+from functools import lru_cache, partial
+from inspect import iscoroutine
+from itertools import chain
+from types import GeneratorType, MethodType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
 
 import attr
-
-from twisted.internet.defer import Deferred, inlineCallbacks, returnValue
+from attr import Factory
+
+from twisted.internet.defer import (
+    Deferred,
+    DeferredList,
+    ensureDeferred,
+    fail,
+    maybeDeferred,
+    succeed,
+)
+from twisted.internet.interfaces import IReactorTime
+from twisted.python import log
+from twisted.python.failure import Failure
 from twisted.web.error import MissingRenderMethod
-from twisted.web.iweb import IRequest
-from twisted.web.template import Element, Tag, TagLoader
+from twisted.web.iweb import IRenderable, IRequest
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET
+from twisted.web.template import (
+    CDATA,
+    TEMPLATE_NAMESPACE,
+    CharRef,
+    Comment,
+    Element,
+    Tag,
+    TagLoader,
+    XMLString,
+    flatten,
+    flattenString,
+    slot,
+    tags,
+)
+from twisted.web.util import FailureElement
 
-from ._app import _call
-from ._decorators import bindable, modified, originalName
+from zope.interface import implementer
 
+from ._app import _call, _caller
+from ._decorators import bindable, modified, originalName
+from ._eager import awaitNext, eagerly
+from ._json import StreamingJSON, _WriteGate
+from ._tracing import traced
+from .storage._memory import _defaultClock
 
-StackType = List[Tuple[Any, Callable[[Any], None]]]
 
 # https://github.com/python/mypy/issues/224
 ATOM_TYPES = (
@@ -33,11 +76,70 @@ ATOM_TYPES = (
 def _should_return_json(request: IRequest) -> bool:
     """
     Should the given request result in a JSON entity-body?
+
+    It should if it has a C{json} query parameter (which Twisted has already
+    parsed), or if its C{Accept} header prefers JSON to HTML.
+    """
+    if request.args.get(b"json"):
+        return True
+    accept = request.getHeader(b"accept")
+    return accept is not None and _prefersJSON(accept)
+
+
+# The representations a Plating can produce, as (type, subtype).
+_HTML = (b"text", b"html")
+_JSON = (b"application", b"json")
+
+
+@lru_cache(maxsize=256)
+def _prefersJSON(accept: bytes) -> bool:
     """
-    return bool(request.args.get(b"json"))
+    Does the C{Accept} header C{accept} prefer JSON to HTML?
+
+    Each media type gets the quality of the most specific media range that
+    matches it; HTML wins ties, so that a missing or unhelpful C{Accept}
+    header still gets HTML.  Clients send very few distinct C{Accept}
+    headers, so the answers are cached.
+    """
+    # (specificity, quality) for HTML and JSON.
+    html = json = (-1, 0.0)
+    for mediaRange in accept.split(b","):
+        mediaType, *parameters = mediaRange.split(b";")
+        major, _, minor = mediaType.strip().lower().partition(b"/")
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition(b"=")
+            if name.strip().lower() == b"q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        html = max(html, _specificity(major, minor, quality, _HTML))
+        json = max(json, _specificity(major, minor, quality, _JSON))
+    return json[1] > html[1]
+
+
+def _specificity(
+    major: bytes, minor: bytes, quality: float, offered: Tuple[bytes, bytes]
+) -> Tuple[int, float]:
+    """
+    How specifically does the media range C{major}/C{minor} match the media
+    type C{offered}?
+
+    @return: a specificity (higher being more specific, or -1 if the range
+        does not match) and C{quality}.
+    """
+    if major == b"*" and minor == b"*":
+        return (0, quality)
+    if major != offered[0]:
+        return (-1, 0.0)
+    if minor == b"*":
+        return (1, quality)
+    if minor == offered[1]:
+        return (2, quality)
+    return (-1, 0.0)
 
 
-@inlineCallbacks
 def resolveDeferredObjects(root: Any) -> Deferred:
     """
     Wait on possibly nested L{Deferred}s that represent a JSON
@@ -51,68 +153,109 @@ def resolveDeferredObjects(root: Any) -> Deferred:
         of C{root}, or that fails with the first exception
         encountered.
     """
+    try:
+        resolved = _resolve(root)
+    except BaseException:
+        return fail()
+    if isinstance(resolved, Deferred):
+        return resolved
+    return succeed(resolved)
+
+
+def _resolve(obj: Any) -> Any:
+    """
+    Resolve the L{Deferred}s and coroutines within the JSON-serializable
+    object C{obj}, all at once.
+
+    Generators and asynchronous iterables are left as they are, for
+    L{StreamingJSON} to pull their items from as it writes them.
+
+    @return: C{obj} itself if it contains no L{Deferred}s, coroutines or
+        L{PlatedElement}s; otherwise, a copy of C{obj} with them resolved,
+        or a L{Deferred} firing with one if any have not fired yet.  Only
+        the containers with something to resolve somewhere inside them are
+        copied.
+
+    @raise TypeError: if C{obj} is not JSON serializable.
+    """
+    if isinstance(obj, ATOM_TYPES + (GeneratorType,)) or hasattr(
+        obj, "__aiter__"
+    ):
+        return obj
+    if isinstance(obj, Deferred):
+        return obj.addCallback(_resolve)
+    if iscoroutine(obj):
+        return ensureDeferred(obj).addCallback(_resolve)
+    if isinstance(obj, (PlatedElement, _Fragment)):
+        return _resolve(obj._asJSON())
+    build: Callable[[List[Any]], Any]
+    if isinstance(obj, list):
+        parts, build = obj, list
+    elif isinstance(obj, tuple):
+        parts, build = list(obj), tuple
+    elif isinstance(obj, dict):
+        parts = [part for item in obj.items() for part in item]
+        build = _pairsToDict
+    else:
+        raise TypeError(
+            obj,
+            f"{obj} not JSON serializable",
+        )
+    resolved = [_resolve(part) for part in parts]
+    if any(isinstance(part, Deferred) for part in resolved):
+        return _gather(resolved).addCallback(build)
+    if all(after is before for after, before in zip(resolved, parts)):
+        return obj
+    return build(resolved)
 
-    result = [None]
-    setResult = partial(setitem, result, 0)
-    stack: StackType = [(root, setResult)]
-
-    while stack:
-        mightBeDeferred, setter = stack.pop()
-        # inlineCallbacks pauses the generator only on yielded
-        # Deferreds. It's resumed immediately with any other object.
-        # Consequently coroutines must be wrapped in ensureDeferred.
-        obj = yield mightBeDeferred
-        if isinstance(obj, ATOM_TYPES):
-            setter(obj)
-        elif isinstance(obj, list):
-            parent: Any = [None] * len(obj)
-            setter(parent)
-            stack.extend(
-                reversed(
-                    [
-                        (child, partial(setitem, parent, i))
-                        for i, child in enumerate(obj)
-                    ]
-                )
-            )
-        elif isinstance(obj, tuple):
-            parent = [None] * len(obj)
-            setter(tuple(parent))
-
-            def setTupleItem(i, value, parent=parent, setter=setter):
-                parent[i] = value
-                setter(tuple(parent))
-
-            stack.extend(
-                reversed(
-                    [
-                        (child, partial(setTupleItem, i))
-                        for i, child in enumerate(obj)
-                    ]
-                )
-            )
-        elif isinstance(obj, dict):
-            parent = {}
-            setter(parent)
-            for key, value in reversed(list(obj.items())):
-                pair = [None, None]
-                setKey = partial(setitem, pair, 0)
-
-                def setValue(value, pair=pair, parent=parent):
-                    pair[1] = value
-                    parent.update([pair])
-
-                stack.append((value, setValue))
-                stack.append((key, setKey))
-        elif isinstance(obj, PlatedElement):
-            stack.append((obj._asJSON(), setter))
-        else:
-            raise TypeError(
-                obj,
-                f"{obj} not JSON serializable",
-            )
 
-    returnValue(result[0])
+def _pairsToDict(parts: List[Any]) -> Dict[Any, Any]:
+    """
+    Build a L{dict} from a flat list of alternating keys and values.
+    """
+    return dict(zip(parts[::2], parts[1::2]))
+
+
+def _gather(values: List[Any]) -> Deferred:
+    """
+    Wait for all of the L{Deferred}s in C{values} at once.
+
+    @return: a L{Deferred} firing with a copy of C{values} with each
+        L{Deferred} replaced by its result, or failing with the first failure
+        of any of them, in which case the rest are cancelled.  Cancelling it
+        cancels all of them.
+    """
+    indexes = [
+        i for i, value in enumerate(values) if isinstance(value, Deferred)
+    ]
+    waiting = [values[i] for i in indexes]
+
+    def gathered(results: List[Tuple[bool, Any]]) -> List[Any]:
+        gathered = list(values)
+        for i, (ignored, result) in zip(indexes, results):
+            gathered[i] = result
+        return gathered
+
+    def failed(failure: Failure) -> Failure:
+        # Nothing will use the results of the others now.  Cancelling a
+        # Deferred which has already fired does nothing, unless it is waiting
+        # on another, which is cancelled in turn.
+        for deferred in waiting:
+            deferred.cancel()
+        return cast(Failure, failure.value.subFailure)
+
+    return DeferredList(
+        waiting, fireOnOneErrback=True, consumeErrors=True
+    ).addCallbacks(gathered, failed)
+
+
+def _platedJSON(obj: Any) -> Any:
+    """
+    Convert a L{PlatedElement} within JSON data to its JSON representation.
+    """
+    if isinstance(obj, (PlatedElement, _Fragment)):
+        return obj._asJSON()
+    raise TypeError(obj, f"{obj} not JSON serializable")
 
 
 def _extra_types(input):
@@ -124,6 +267,178 @@ def _extra_types(input):
     return input
 
 
+# Stands in for the children of a tag while flattening its start and end tags;
+# the flattener escapes any "&" in text, so this cannot appear otherwise.
+_CHILDREN = CharRef(0x10FFFF)
+_CHILDREN_BYTES = b"&#1114111;"
+
+_STATIC_TYPES = (bytes, str, CharRef, Comment, CDATA)
+
+
+def _isStatic(root: Any) -> bool:
+    """
+    Does the template C{root} flatten to the same markup for every request?
+    """
+    if isinstance(root, _STATIC_TYPES):
+        return True
+    if isinstance(root, (list, tuple)):
+        return all(_isStatic(child) for child in root)
+    return (
+        isinstance(root, Tag)
+        and _isStaticTag(root)
+        and _isStatic(root.children)
+    )
+
+
+def _isStaticTag(root: Tag) -> bool:
+    """
+    Do the start and end tags of C{root} flatten to the same markup for every
+    request?
+    """
+    return (
+        root.render is None
+        and not root.slotData
+        and all(_isStatic(value) for value in root.attributes.values())
+    )
+
+
+def _flattenStatic(root: Any) -> bytes:
+    """
+    Flatten C{root}, for which L{_isStatic} is true.
+    """
+    result: List[bytes] = []
+    flattenString(None, root).addCallback(result.append)
+    [flattened] = result
+    return flattened
+
+
+def _joined(parts: Iterable[Any]) -> List[Any]:
+    """
+    Join together adjacent L{bytes} in C{parts}.
+    """
+    joined: List[Any] = []
+    for part in parts:
+        if isinstance(part, bytes) and joined and isinstance(joined[-1], bytes):
+            joined[-1] += part
+        else:
+            joined.append(part)
+    return joined
+
+
+def _preflatten(root: Any) -> List[Any]:
+    """
+    Flatten as much of the template C{root} as possible ahead of time.
+
+    @return: a L{list} of L{bytes} of markup, interleaved with the parts of
+        C{root} which must be flattened for each request: slots, tags with
+        render directives or filled slots, and anything else whose markup may
+        vary.
+    """
+    if _isStatic(root):
+        return [_flattenStatic(root)]
+    if isinstance(root, (list, tuple)):
+        return _joined(part for child in root for part in _preflatten(child))
+    if not isinstance(root, Tag) or not _isStaticTag(root):
+        return [root]
+    children = _preflatten(root.children)
+    if not root.tagName:
+        return children
+    startTag, endTag = _flattenStatic(
+        Tag(root.tagName, dict(root.attributes), [_CHILDREN])
+    ).split(_CHILDREN_BYTES)
+    return _joined([startTag, *children, endTag])
+
+
+@implementer(IRenderable)
+@attr.s
+class _Hole:
+    """
+    A part of a L{PlatedElement}'s template which L{_preflatten} could not
+    flatten ahead of time, rendered with the element's slots and render
+    methods.
+    """
+
+    _element = attr.ib(type="PlatedElement")
+    _part = attr.ib(type=Any)
+
+    def lookupRenderMethod(self, name: str) -> Callable:
+        return self._element.lookupRenderMethod(name)
+
+    def render(self, request: IRequest) -> Tag:
+        return tags.transparent(self._part).fillSlots(**self._element._slots)
+
+
+class _PlatedPage(Resource):
+    """
+    The HTML page for a L{Plating.routed} route, which writes the parts of
+    its template that were flattened ahead of time directly to the request,
+    and flattens only the rest.
+    """
+
+    isLeaf = True
+
+    def __init__(self, element: "PlatedElement", parts: List[Any]) -> None:
+        """
+        @param element: The element whose slots and renderers fill in the
+            page.
+
+        @param parts: The page's template, pre-flattened by L{_preflatten}.
+        """
+        super().__init__()
+        self._element = element
+        self._parts = parts
+
+    def render(self, request: IRequest) -> object:
+        """
+        Render the page, like L{twisted.web.template.renderElement}.
+        """
+        request.write(b"<!DOCTYPE html>\n")
+        gate = self._element._gate = _WriteGate()
+        request.registerProducer(gate, True)
+        d = maybeDeferred(
+            traced, request, "klein.plating.render", {}, self._write, request
+        )
+
+        def failed(failure: Failure) -> Any:
+            log.err(failure, "An error occurred while rendering the response.")
+            site = getattr(request, "site", None)
+            if site is not None and site.displayTracebacks:
+                return flatten(request, FailureElement(failure), request.write)
+            request.write(
+                b'<div style="font-size:800%;'
+                b"background-color:#FFF;"
+                b"color:#F00"
+                b'">An error occurred while rendering the response.</div>'
+            )
+            return None
+
+        def finish(ignored: object) -> None:
+            request.unregisterProducer()
+            if not gate.stopped:
+                request.finish()
+
+        d.addErrback(failed)
+        d.addBoth(finish)
+        return NOT_DONE_YET
+
+    @eagerly
+    def _write(self, request: IRequest) -> Generator:
+        write = request.write
+        slots = self._element._slots
+        gate = self._element._gate
+        for part in self._parts:
+            if gate is not None and gate.stopped:
+                return
+            if isinstance(part, bytes):
+                write(part)
+            elif isinstance(part, slot) and isinstance(
+                slots.get(part.name), _Fragment
+            ):
+                write(slots[part.name].markup)
+            else:
+                yield flatten(request, _Hole(self._element, part), write)
+
+
 class PlatedElement(Element):
     """
     The element type returned by L{Plating}.  This contains several utility
@@ -131,22 +446,33 @@ class PlatedElement(Element):
     """
 
     def __init__(
-        self, slot_data, preloaded, boundInstance, presentationSlots, renderers
+        self,
+        slot_data,
+        preloaded,
+        boundInstance,
+        presentationSlots,
+        renderers,
+        renderMethods=None,
     ):
         """
         @param slot_data: A dictionary mapping names to values.
 
-        @param preloaded: The pre-loaded data.
+        @param preloaded: The pre-loaded data, which is not modified, so it
+            may be shared between elements.
+
+        @param renderMethods: A cache of render methods, shared between the
+            elements with the same C{renderers}.
         """
         self.slot_data = slot_data
         self._boundInstance = boundInstance
         self._presentationSlots = presentationSlots
         self._renderers = renderers
+        self._renderMethods = {} if renderMethods is None else renderMethods
+        self._gate: Optional[_WriteGate] = None
+        self._slots = {k: _extra_types(v) for k, v in slot_data.items()}
         super().__init__(
             loader=TagLoader(
-                preloaded.fillSlots(
-                    **{k: _extra_types(v) for k, v in slot_data.items()}
-                )
+                tags.transparent(preloaded).fillSlots(**self._slots)
             )
         )
 
@@ -163,33 +489,213 @@ class PlatedElement(Element):
         """
         @return: a renderer.
         """
+        key = (type(self._boundInstance), name)
+        try:
+            renderMethod = self._renderMethods[key]
+        except KeyError:
+            renderMethod = self._renderMethods[key] = self._renderMethod(name)
+        return MethodType(renderMethod, self)
+
+    def _renderMethod(self, name):
+        """
+        Create the function to call, with this element, to render the render
+        directive C{name}.  It depends only on C{name}, the L{Plating}'s
+        renderers and the type of the bound instance, so L{Plating} caches it
+        for every element it creates.
+        """
         if name in self._renderers:
             wrapped = self._renderers[name]
+            call = _caller(wrapped)
 
             @modified("plated render wrapper", wrapped)
             def renderWrapper(
-                request: IRequest, tag: Tag, *args: Any, **kw: Any
+                element: "PlatedElement",
+                request: IRequest,
+                tag: Tag,
+                *args: Any,
+                **kw: Any,
             ) -> Any:
-                return _call(
-                    self._boundInstance, wrapped, request, tag, *args, **kw
-                )
+                return call(element._boundInstance, request, tag, *args, **kw)
 
             return renderWrapper
-        if ":" not in name:
-            raise MissingRenderMethod(self, name)
-        slot, type = name.split(":", 1)
-
-        def renderList(request, tag):
-            for item in self.slot_data[slot]:
-                yield tag.fillSlots(item=_extra_types(item))
-
-        types = {
-            "list": renderList,
-        }
-        if type in types:
-            return types[type]
+        slotName, colon, type = name.partition(":")
+        if colon and type in _SLOT_RENDERERS:
+            return _SLOT_RENDERERS[type](slotName)
+        raise MissingRenderMethod(self, name)
+
+
+def _listRenderer(slotName: str) -> Callable:
+    """
+    Create the C{"slot:list"} renderer, which renders its tag once for each
+    item of the list in the slot named C{slotName}, with the C{item} slot
+    filled with it.
+    """
+
+    def renderList(element, request, tag):
+        return _renderRows(element._gate, element.slot_data[slotName], tag)
+
+    return renderList
+
+
+def _renderRows(
+    gate: Optional[_WriteGate], items: Any, tag: Tag
+) -> Generator[Any, None, None]:
+    """
+    Render C{tag} once for each of C{items}, which may be any iterable
+    (including one of L{Deferred}s) or an asynchronous iterable.
+
+    Each item is pulled only once the rows before it have been flattened,
+    and, if C{gate} is not L{None}, only once the request wants more, so
+    that rows may be written to it as they are produced.
+    """
+
+    def fill(item: Any) -> Tag:
+        return tag.fillSlots(item=_extra_types(item))
+
+    if hasattr(items, "__aiter__"):
+        iterator, items = items.__aiter__(), None
+    else:
+        iterator, items = None, iter(items)
+    while True:
+        if gate is not None:
+            writable = gate.whenWritable()
+            if writable is not None:
+                yield writable.addCallback(lambda ignored: "")
+            if gate.stopped:
+                return
+        if iterator is None:
+            item = next(items, _NO_ITEM)
+            more = item is not _NO_ITEM
+        else:
+            pulled: List[Tuple[bool, Any]] = []
+            step = awaitNext(iterator).addCallback(pulled.append)
+            if not pulled:
+                yield step.addCallback(lambda ignored: "")
+            [(more, item)] = pulled
+        if not more:
+            return
+        if isinstance(item, Deferred):
+            yield item.addCallback(fill)
         else:
-            raise MissingRenderMethod(self, name)
+            yield fill(item)
+
+
+_NO_ITEM = object()
+
+
+# The renderers for C{"slot:type"} render directives, by type.
+_SLOT_RENDERERS = {
+    "list": _listRenderer,
+}
+
+
+@implementer(IRenderable)
+@attr.s
+class _Fragment:
+    """
+    The flattened HTML and JSON representation of a widget, cached by a
+    L{FragmentCache}.
+
+    @ivar markup: The flattened HTML.
+
+    @ivar json: The L{Deferred}-free JSON representation.
+    """
+
+    markup = attr.ib(type=bytes)
+    json = attr.ib(type=Any)
+    _tree = attr.ib(type=Any, default=None, init=False, repr=False)
+
+    @classmethod
+    @eagerly
+    def fromElement(cls, element: "PlatedElement") -> Generator:
+        """
+        Flatten C{element}, without a request, and resolve its JSON.
+
+        @return: a L{_Fragment}, or a L{Deferred} firing with one if either
+            had to wait.
+        """
+        markup = yield flattenString(None, element)
+        json = yield resolveDeferredObjects(element._asJSON())
+        return cls(markup, json)
+
+    def _asJSON(self) -> Any:
+        return self.json
+
+    def lookupRenderMethod(self, name: str) -> Callable:
+        raise MissingRenderMethod(self, name)
+
+    def render(self, request: IRequest) -> Any:
+        """
+        Render the cached HTML, where it cannot be written directly, as the
+        static tags it was flattened from, parsing it the first time.
+        """
+        if self._tree is None:
+            self._tree = XMLString(
+                b'<t:transparent xmlns:t="%s">%s</t:transparent>'
+                % (TEMPLATE_NAMESPACE.encode("ascii"), self.markup)
+            ).load()
+        return self._tree
+
+
+@attr.s
+class FragmentCache:
+    """
+    A cache of the rendered HTML and JSON of widgets, keyed by the arguments
+    they were called with, for use with L{Plating.widgeted}.
+
+    Cached widgets are rendered without a request, so their render methods
+    must not depend on one, and their output must depend only on their
+    arguments.
+
+    @ivar ttl: The number of seconds for which to cache a widget.
+
+    @ivar maxEntries: The maximum number of widgets to cache; the
+        least-recently-used one is discarded when it is exceeded.
+
+    @since: Klein NEXT
+    """
+
+    ttl = attr.ib(type=float, default=60.0)
+    maxEntries = attr.ib(type=int, default=1000)
+    _clock = attr.ib(type=IReactorTime, default=Factory(_defaultClock))
+    _entries = attr.ib(
+        type="OrderedDict[Any, Tuple[float, _Fragment]]",
+        default=Factory(OrderedDict),
+        init=False,
+        repr=False,
+    )
+
+    def get(self, key: Any) -> Optional[_Fragment]:
+        """
+        Look up the cached fragment for C{key}, or L{None}.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, fragment = entry
+        if expires <= self._clock.seconds():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return fragment
+
+    def put(self, key: Any, fragment: _Fragment) -> _Fragment:
+        """
+        Cache C{fragment} for C{key}.
+
+        @return: C{fragment}
+        """
+        self._entries[key] = (self._clock.seconds() + self.ttl, fragment)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxEntries:
+            self._entries.popitem(last=False)
+        return fragment
+
+    def clear(self) -> None:
+        """
+        Forget all cached fragments.
+        """
+        self._entries.clear()
 
 
 class Plating:
@@ -207,6 +713,16 @@ class Plating:
         self._loader = TagLoader(tags)
         self._presentationSlots = {self.CONTENT} | set(presentation_slots)
         self._renderers = {}
+        self._renderMethods = {}
+        self._parts = None
+
+    def _preflattened(self):
+        """
+        Flatten the static parts of this L{Plating}'s template, once.
+        """
+        if self._parts is None:
+            self._parts = _preflatten(self._loader.load())
+        return self._parts
 
     def renderMethod(self, renderer):
         """
@@ -217,6 +733,7 @@ class Plating:
         decorated function.
         """
         self._renderers[str(originalName(renderer))] = renderer
+        self._renderMethods.clear()
         return renderer
 
     def routed(self, routing, tags):
@@ -227,26 +744,36 @@ class Plating:
 
             @modified("plating route renderer", method, routing)
             @bindable
-            @inlineCallbacks
+            @eagerly
             def mymethod(
                 instance: Any, request: IRequest, *args: Any, **kw: Any
             ) -> Any:
                 data = yield _call(instance, method, request, *args, **kw)
+                # Either representation may be chosen by the Accept header.
+                request.responseHeaders.addRawHeader(b"vary", b"Accept")
                 if _should_return_json(request):
-                    json_data = self._defaults.copy()
-                    json_data.update(data)
-                    for ignored in self._presentationSlots:
-                        json_data.pop(ignored, None)
-                    request.setHeader(b"content-type", b"application/json")
-                    ready = yield resolveDeferredObjects(json_data)
-                    result = dumps(ready)
+                    # Resolve everything that can fail before the response
+                    # starts, so that failures reach the app's error
+                    # handlers; only iterables are left to stream.
+                    json_data = yield resolveDeferredObjects(
+                        {
+                            key: value
+                            for key, value in chain(
+                                self._defaults.items(), data.items()
+                            )
+                            if key not in self._presentationSlots
+                        }
+                    )
+                    result = StreamingJSON(json_data, _platedJSON)
                 else:
                     data[self.CONTENT] = loader.load()
                     request.setHeader(
                         b"content-type", b"text/html; charset=utf-8"
                     )
-                    result = self._elementify(instance, data)
-                returnValue(result)
+                    result = _PlatedPage(
+                        self._elementify(instance, data), self._preflattened()
+                    )
+                return result
 
             return method
 
@@ -259,13 +786,13 @@ class Plating:
         slot_data = self._defaults.copy()
         slot_data.update(to_fill_with)
         [loaded] = self._loader.load()
-        loaded = loaded.clone()
         return PlatedElement(
             slot_data=slot_data,
             preloaded=loaded,
             renderers=self._renderers,
             boundInstance=instance,
             presentationSlots=self._presentationSlots,
+            renderMethods=self._renderMethods,
         )
 
     @attr.s
@@ -283,6 +810,7 @@ class Plating:
         _plating = attr.ib(type="Plating")
         _function = attr.ib(type=Callable[..., Any])
         _instance = attr.ib(type=object)
+        _cache = attr.ib(type=Optional[FragmentCache], default=None)
 
         def __call__(self, *args, **kwargs):
             return self._function(*args, **kwargs)
@@ -294,22 +822,49 @@ class Plating:
                     instance, owner
                 ),
                 instance=instance,
+                cache=self._cache,
             )
 
         def widget(self, *args, **kwargs):
             """
             Construct a L{PlatedElement} the rendering of this widget.
+
+            If this widget has a L{FragmentCache} and has been rendered with
+            the same (hashable) arguments recently, return its cached
+            rendering instead; otherwise, render it and cache the result,
+            returning a L{Deferred} if that has to wait.
             """
+            if self._cache is None:
+                return self._elementify(*args, **kwargs)
+            key = (self._function, args, tuple(sorted(kwargs.items())))
+            try:
+                fragment = self._cache.get(key)
+            except TypeError:
+                return self._elementify(*args, **kwargs)
+            if fragment is not None:
+                return fragment
+            fragment = _Fragment.fromElement(self._elementify(*args, **kwargs))
+            if isinstance(fragment, Deferred):
+                return fragment.addCallback(partial(self._cache.put, key))
+            return self._cache.put(key, fragment)
+
+        def _elementify(self, *args, **kwargs):
             data = self._function(*args, **kwargs)
             return self._plating._elementify(self._instance, data)
 
         def __getattr__(self, attr):
             return getattr(self._function, attr)
 
-    def widgeted(self, function):
+    def widgeted(self, function=None, cache=None):
         """
         A decorator that turns a function into a renderer for an
         element without a L{Klein.route}.  Use this to create reusable
         template elements.
+
+        @param cache: A L{FragmentCache} in which to cache the widget's
+            renderings, keyed by its arguments; if given, call this with
+            only C{cache} to get the decorator.
         """
-        return self._Widget(self, function, None)
+        if function is None:
+            return partial(self.widgeted, cache=cache)
+        return self._Widget(self, function, None, cache)
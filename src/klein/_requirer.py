@@ -1,43 +1,209 @@
-from typing import Any, Callable, Dict, List, Sequence, Type
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+)
 
 import attr
 
-from twisted.internet.defer import Deferred, inlineCallbacks, returnValue
+from twisted.internet.defer import Deferred, fail
 from twisted.python.components import Componentized
+from twisted.python.reflect import qual
 from twisted.web.iweb import IRequest
 
 from zope.interface import Interface, implementer
 
-from ._app import _call
+from ._app import _caller
 from ._decorators import bindable, modified
+from ._eager import eagerly
+from ._tracing import traced
 from .interfaces import (
     EarlyExit,
     IDependencyInjector,
     IRequestLifecycle,
     IRequiredParameter,
+    ITracer,
 )
 
 
+@eagerly
+def gatherInOrder(calls: Iterable[Callable[..., Any]], *args: Any) -> Any:
+    """
+    Invoke each of C{calls} with C{args}, then wait for all of their results
+    together.
+
+    @return: a L{list} of the results of C{calls}, or, if any of them is a
+        L{Deferred} which has not yet fired, a L{Deferred} firing with that
+        list once all of them are available.  If any of C{calls} fail, the
+        failure of the first of them, in order, is raised.
+    """
+    results: List[Any] = []
+    for call in calls:
+        try:
+            results.append(call(*args))
+        except BaseException:
+            results.append(fail())
+
+    values = []
+    for index, result in enumerate(results):
+        try:
+            values.append((yield result))
+        except BaseException:
+            # Only the first failure is reported; don't log the rest as
+            # unhandled.  (This one has already been consumed.)
+            for rest in results[index:]:
+                if isinstance(rest, Deferred):
+                    rest.addErrback(lambda failure: None)
+            raise
+    return values
+
+
+@attr.s(frozen=True)
+class _PrepareHook:
+    """
+    A hook added with L{RequestLifecycle.addPrepareHook}.
+    """
+
+    hook = attr.ib(type=Callable)
+    requires = attr.ib(type=Tuple[Type[Interface], ...])
+    provides = attr.ib(type=Tuple[Type[Interface], ...])
+    after = attr.ib(type=Tuple[Type[Interface], ...])
+
+
+def _functionName(function: Callable) -> str:
+    return getattr(function, "__qualname__", repr(function))
+
+
+def _hookName(hook: _PrepareHook) -> str:
+    return _functionName(hook.hook)
+
+
+def _tracedCalls(
+    request: IRequest, name: str, calls: Sequence[Callable], details: Sequence
+) -> List[Callable]:
+    """
+    Wrap each of C{calls} to report it to C{request}'s L{ITracer} as a span
+    named C{name}, with the corresponding item of C{details} as its
+    attributes.
+    """
+    return [
+        partial(traced, request, name, attributes, call)
+        for call, attributes in zip(calls, details)
+    ]
+
+
+def _interfaceNames(interfaces: Iterable[Type[Interface]]) -> str:
+    return ", ".join(sorted(qual(interface) for interface in interfaces))
+
+
 @implementer(IRequestLifecycle)
 @attr.s
 class RequestLifecycle:
     """
     Mechanism to run hooks at the start of a request managed by a L{Requirer}.
+
+    Hooks are run in waves: each wave consists of every hook whose
+    requirements are provided by hooks in earlier waves, and the hooks in a
+    wave run concurrently.
+
+    @ivar _waves: The hooks to run, grouped into waves, once the lifecycle
+        has been finalized; otherwise L{None}.
     """
 
-    _prepareHooks = attr.ib(type=List, default=attr.Factory(list))
+    _prepareHooks = attr.ib(type=List[_PrepareHook], default=attr.Factory(list))
+    _waves = attr.ib(
+        type=Optional[Tuple[Tuple[Callable, ...], ...]],
+        default=None,
+        init=False,
+    )
 
     def addPrepareHook(
         self,
         beforeHook: Callable,
         requires: Sequence[Type[Interface]] = (),
         provides: Sequence[Type[Interface]] = (),
+        after: Sequence[Type[Interface]] = (),
     ) -> None:
-        # TODO: topological requirements sort
-        self._prepareHooks.append(beforeHook)
+        self._prepareHooks.append(
+            _PrepareHook(
+                beforeHook, tuple(requires), tuple(provides), tuple(after)
+            )
+        )
+        self._waves = None
+
+    def finalize(self) -> None:
+        """
+        Sort the hooks added with L{RequestLifecycle.addPrepareHook} into
+        waves according to what they require and provide.
+
+        @raise ValueError: if a hook requires an interface that no hook
+            provides, or if the hooks' requirements form a cycle.
+        """
+        hooks = self._prepareHooks
+        providers: Dict[Type[Interface], List[int]] = {}
+        for index, hook in enumerate(hooks):
+            for interface in hook.provides:
+                providers.setdefault(interface, []).append(index)
+
+        dependencies: List[Set[int]] = []
+        for index, hook in enumerate(hooks):
+            unmet = [
+                interface
+                for interface in hook.requires
+                if interface not in providers
+            ]
+            if unmet:
+                raise ValueError(
+                    "Hook {} requires {}, which no hook provides.".format(
+                        _hookName(hook), _interfaceNames(unmet)
+                    )
+                )
+            dependencies.append(
+                {
+                    provider
+                    for interface in hook.requires + hook.after
+                    for provider in providers.get(interface, ())
+                    if provider != index
+                }
+            )
+
+        waves: List[Tuple[Callable, ...]] = []
+        done: Set[int] = set()
+        remaining = list(range(len(hooks)))
+        while remaining:
+            ready = [i for i in remaining if dependencies[i] <= done]
+            if not ready:
+                raise ValueError(
+                    "Prepare hooks {} have cyclic requirements.".format(
+                        ", ".join(_hookName(hooks[i]) for i in remaining)
+                    )
+                )
+            waves.append(tuple(hooks[i].hook for i in ready))
+            done.update(ready)
+            remaining = [i for i in remaining if i not in done]
+        self._waves = tuple(waves)
+
+    @property
+    def waves(self) -> Tuple[Tuple[Callable, ...], ...]:
+        """
+        The hooks added with L{RequestLifecycle.addPrepareHook}, grouped into
+        the waves in which they run.
+        """
+        if self._waves is None:
+            self.finalize()
+        assert self._waves is not None
+        return self._waves
 
-    @inlineCallbacks
-    def runPrepareHooks(self, instance: Any, request: IRequest) -> Deferred:
+    @eagerly
+    def runPrepareHooks(self, instance: Any, request: IRequest) -> Any:
         """
         Execute all the hooks added with L{RequestLifecycle.addPrepareHook}.
         This is invoked by the L{requires} route machinery.
@@ -45,9 +211,174 @@ class RequestLifecycle:
         @param instance: The instance bound to the Klein route.
 
         @param request: The IRequest being processed.
+
+        @return: L{None}, or a L{Deferred} firing with L{None}, if any hook
+            had to wait, once all the hooks are done.
+        """
+        for wave in self.waves:
+            yield gatherInOrder(
+                [_caller(hook) for hook in wave], instance, request
+            )
+
+
+@attr.s(frozen=True)
+class InjectionPlan:
+    """
+    The steps that a route decorated with L{Requirer.require} takes to handle
+    each request, computed once when the route is defined.
+
+    The plan of a route is available, for debugging, as the C{injectionPlan}
+    attribute of the decorated function; L{InjectionPlan.describe} explains
+    it.
+
+    @ivar function: The decorated route function.
+
+    @ivar bound: Whether C{function} always takes an instance argument, as it
+        does if it is L{bindable}.
+
+    @ivar prepareWaves: The prepare hooks to run, in waves; the hooks in each
+        wave run concurrently, after all the hooks in the previous wave.
+
+    @ivar parameterNames: The names of the parameters to inject.
+
+    @ivar injectors: The injector for each of C{parameterNames}; their values
+        are computed concurrently, after all the prepare hooks.
+    """
+
+    function = attr.ib(type=Callable)
+    bound = attr.ib(type=bool)
+    prepareWaves = attr.ib(type=Tuple[Tuple[Callable, ...], ...])
+    parameterNames = attr.ib(type=Tuple[str, ...])
+    injectors = attr.ib(type=Tuple[IDependencyInjector, ...])
+    _callFunction = attr.ib(type=Callable, init=False, repr=False, eq=False)
+    _prepareCalls = attr.ib(
+        type=Tuple[Tuple[Callable, ...], ...], init=False, repr=False, eq=False
+    )
+    _injectCalls = attr.ib(
+        type=Tuple[Callable, ...], init=False, repr=False, eq=False
+    )
+    _prepareDetails = attr.ib(
+        type=Tuple[Tuple[Dict[str, object], ...], ...],
+        init=False,
+        repr=False,
+        eq=False,
+    )
+    _injectDetails = attr.ib(
+        type=Tuple[Dict[str, object], ...], init=False, repr=False, eq=False
+    )
+
+    def __attrs_post_init__(self) -> None:
+        object.__setattr__(self, "_callFunction", _caller(self.function))
+        object.__setattr__(
+            self,
+            "_prepareCalls",
+            tuple(
+                tuple(_caller(hook) for hook in wave)
+                for wave in self.prepareWaves
+            ),
+        )
+        object.__setattr__(
+            self,
+            "_injectCalls",
+            tuple(injector.injectValue for injector in self.injectors),
+        )
+        object.__setattr__(
+            self,
+            "_prepareDetails",
+            tuple(
+                tuple({"hook": _functionName(hook)} for hook in wave)
+                for wave in self.prepareWaves
+            ),
+        )
+        object.__setattr__(
+            self,
+            "_injectDetails",
+            tuple(
+                {"parameter": name, "injector": qual(type(injector))}
+                for name, injector in zip(self.parameterNames, self.injectors)
+            ),
+        )
+
+    @classmethod
+    def compile(
+        cls,
+        function: Callable,
+        lifecycle: RequestLifecycle,
+        injectors: Dict[str, IDependencyInjector],
+    ) -> "InjectionPlan":
+        """
+        Compute the plan for a route from its finalized lifecycle and
+        injectors.
+        """
+        return cls(
+            function,
+            getattr(function, "__klein_bound__", False),
+            lifecycle.waves,
+            tuple(injectors),
+            tuple(injectors.values()),
+        )
+
+    @eagerly
+    def execute(
+        self,
+        instance: Any,
+        request: IRequest,
+        args: Tuple[Any, ...],
+        routeParams: Dict[str, Any],
+    ) -> Any:
+        """
+        Handle a request by running the prepare hooks, injecting the
+        parameters, and then calling the route function.
+
+        @param routeParams: The arguments passed to the route by the layer
+            below dependency injection; injected values are added to it.
+
+        @return: the result of the route, or a L{Deferred} firing with it if
+            any step had to wait.
         """
-        for hook in self._prepareHooks:
-            yield _call(instance, hook, request)
+        prepareCalls: Sequence[Sequence[Callable]] = self._prepareCalls
+        injectCalls: Sequence[Callable] = self._injectCalls
+        if ITracer(request, None) is not None:
+            prepareCalls = [
+                _tracedCalls(request, "klein.prepare", wave, details)
+                for wave, details in zip(prepareCalls, self._prepareDetails)
+            ]
+            injectCalls = _tracedCalls(
+                request, "klein.inject", injectCalls, self._injectDetails
+            )
+        try:
+            for wave in prepareCalls:
+                yield gatherInOrder(wave, instance, request)
+            if injectCalls:
+                values = yield gatherInOrder(
+                    injectCalls, instance, request, routeParams
+                )
+                # Every injector is done with routeParams by now.
+                routeParams.update(zip(self.parameterNames, values))
+        except EarlyExit as ee:
+            return ee.alternateReturnValue
+        return (yield self._callFunction(instance, *args, **routeParams))
+
+    def describe(self) -> str:
+        """
+        Describe this plan, one step per line.
+        """
+        lines = [
+            "Plan for {}{}:".format(
+                getattr(self.function, "__qualname__", repr(self.function)),
+                " (bindable)" if self.bound else "",
+            )
+        ]
+        for number, wave in enumerate(self.prepareWaves, 1):
+            lines.append(
+                "  prepare wave {}: {}".format(
+                    number,
+                    ", ".join(_functionName(hook) for hook in wave),
+                )
+            )
+        for name, injector in zip(self.parameterNames, self.injectors):
+            lines.append(f"  inject {name}: {injector!r}")
+        return "\n".join(lines)
 
 
 _routeDecorator = Any  # a decorator like @route
@@ -82,10 +413,11 @@ class Requirer:
             def fooForRequest(request):
                 request.setComponent(IFoo, someFooComponent)
 
-        @note: C{requiresComponents} is, at this point, for the reader's
-            interest only, the framework will not topologically sort
-            dependencies; you must presently register prerequisites in the
-            order you want them to be called.
+        Prerequisites run after any prerequisites which provide the
+        components they require, and concurrently with those they do not
+        depend upon.  Requiring a component which nothing provides, or
+        requirements which form a cycle, is an error when the route is
+        defined.
         """
 
         def decorator(prerequisiteMethod: Callable) -> Callable:
@@ -126,28 +458,19 @@ class Requirer:
             for v in injectors.values():
                 v.finalize()
 
+            plan = InjectionPlan.compile(
+                functionWithRequirements, lifecycle, injectors
+            )
+
             @modified("dependency-injecting route", functionWithRequirements)
             @bindable
-            @inlineCallbacks
             def router(
                 instance: Any, request: IRequest, *args: Any, **routeParams: Any
             ) -> Any:
-                injected = routeParams.copy()
-                try:
-                    yield lifecycle.runPrepareHooks(instance, request)
-                    for (k, injector) in injectors.items():
-                        injected[k] = yield injector.injectValue(
-                            instance, request, routeParams
-                        )
-                except EarlyExit as ee:
-                    result = ee.alternateReturnValue
-                else:
-                    result = yield _call(
-                        instance, functionWithRequirements, *args, **injected
-                    )
-                returnValue(result)
+                return plan.execute(instance, request, args, routeParams)
 
             fWR, iC = functionWithRequirements, injectionComponents
+            fWR.injectionPlan = plan  # type: ignore[attr-defined]
             fWR.injectionComponents = iC  # type: ignore[attr-defined]
             routeDecorator(router)
             return functionWithRequirements
@@ -1,11 +1,13 @@
 # -*- test-case-name: klein.test.test_resource -*-
 
+from functools import partial
 from typing import Any, List, TYPE_CHECKING, Tuple, Union, cast
 
 from twisted.internet import defer
 from twisted.internet.defer import Deferred, maybeDeferred
 from twisted.python import log
 from twisted.python.failure import Failure
+from twisted.python.reflect import qual
 from twisted.web import server
 from twisted.web.iweb import IRenderable, IRequest
 from twisted.web.resource import IResource, Resource, getChildForRequest
@@ -15,7 +17,9 @@ from twisted.web.template import renderElement
 from werkzeug.exceptions import HTTPException
 
 from ._dihttp import Response
-from ._interfaces import IKleinRequest
+from ._interfaces import IKleinRequest, ITracer
+from ._metrics import _RequestTimer
+from ._tracing import _Span, traced
 
 if TYPE_CHECKING:
     from ._app import ErrorHandlers, Klein, KleinRenderable
@@ -145,6 +149,25 @@ class KleinResource(Resource):
         return not result
 
     def render(self, request: IRequest) -> "KleinRenderable":
+        # Time this request only if anyone wants to know.
+        timer = None
+        if self._app.metrics is not None:
+            timer = _RequestTimer(self._app.metrics)
+            request.notifyFinish().addBoth(timer.finished)
+
+        # Likewise, trace it only if anyone is listening, and let the other
+        # stages of handling it know who is.
+        tracer = self._app.tracer
+        if tracer is not None:
+            request.setComponent(ITracer, tracer)
+            span = _Span.start(
+                tracer,
+                request,
+                "klein.request",
+                {"method": request.method, "uri": request.uri},
+            )
+            request.notifyFinish().addBoth(span.end)
+
         # Stuff we need to know for the mapper.
         try:
             (
@@ -157,6 +180,8 @@ class KleinResource(Resource):
         except _URLDecodeError as e:
             for what, fail in e.errors:
                 log.err(fail, f"Invalid encoding in {what}.")
+            if timer is not None:
+                timer.failed()
             request.setResponseCode(400)
             return b"Non-UTF-8 encoding in URL."
 
@@ -183,8 +208,18 @@ class KleinResource(Resource):
             # to percolate up. If that happens it will be handled below in
             # processing_failed, either by a user-registered error handler or
             # one of our defaults.
-            (rule, kwargs) = mapper.match(return_rule=True)
+            if tracer is None:
+                (rule, kwargs) = mapper.match(return_rule=True)
+            else:
+                (rule, kwargs) = traced(
+                    request,
+                    "klein.match",
+                    {},
+                    partial(mapper.match, return_rule=True),
+                )
             endpoint = rule.endpoint
+            if timer is not None:
+                timer.matched(endpoint)
 
             # Try pretty hard to fix up prepath and postpath.
             segment_count = self._app.endpoints[
@@ -198,16 +233,40 @@ class KleinResource(Resource):
             # Standard Twisted Web stuff. Defer the method action, giving us
             # something renderable or printable. Return NOT_DONE_YET and set up
             # the incremental renderer.
-            d = maybeDeferred(
-                self._app.execute_endpoint, endpoint, request, **kwargs
-            )
+            if tracer is None:
+                d = maybeDeferred(
+                    self._app.execute_endpoint, endpoint, request, **kwargs
+                )
+            else:
+                d = maybeDeferred(
+                    traced,
+                    request,
+                    "klein.handler",
+                    {"endpoint": endpoint},
+                    partial(
+                        self._app.execute_endpoint, endpoint, request, **kwargs
+                    ),
+                )
 
             request.notifyFinish().addErrback(lambda _: d.cancel())
 
+            if timer is not None:
+                d.addBoth(timer.handled)
             return d
 
         d = maybeDeferred(_execute)
 
+        def rendering(r: object) -> None:
+            """
+            Trace the rendering of C{r}, which lasts until the request
+            finishes.
+            """
+            if tracer is not None:
+                span = _Span.start(
+                    tracer, request, "klein.render", {"type": qual(type(r))}
+                )
+                request.notifyFinish().addBoth(span.end)
+
         # type note: returns Any because Response._applyToRequest returns Any
         def process(r: object) -> Any:
             """
@@ -219,10 +278,12 @@ class KleinResource(Resource):
                 r = r._applyToRequest(request)
 
             if IResource.providedBy(r):
+                rendering(r)
                 request.render(getChildForRequest(r, request))
                 return StandInResource
 
             if IRenderable.providedBy(r):
+                rendering(r)
                 renderElement(request, r)
                 return StandInResource
 
@@ -238,6 +299,8 @@ class KleinResource(Resource):
             # processing.  We don't return failure here because there
             # is no way to surface this failure to the user if the
             # request is finished.
+            if timer is not None:
+                timer.failed()
             if request_finished[0]:
                 if not failure.check(defer.CancelledError):
                     log.err(failure, "Unhandled Error Processing Request.")
@@ -1,20 +1,25 @@
 # -*- test-case-name: klein.test.test_session -*-
 
-from typing import Any, Callable, Dict, Optional, Sequence, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Type, Union
 
 import attr
 
-from twisted.internet.defer import inlineCallbacks, returnValue
-from twisted.python.components import Componentized
+from twisted.internet.defer import Deferred, maybeDeferred
+from twisted.internet.interfaces import IReactorTime
+from twisted.python.components import Componentized, registerAdapter
 from twisted.python.reflect import qual
 from twisted.web.http import UNAUTHORIZED
 from twisted.web.iweb import IRequest
 from twisted.web.resource import Resource
 
-from zope.interface import Interface, implementer
+from zope.interface import Attribute, Interface, implementer
 
+from ._decorators import bindable
+from ._eager import eagerly
+from ._tracing import traced
 from .interfaces import (
     EarlyExit,
+    ICSRFTokens,
     IDependencyInjector,
     IRequestLifecycle,
     IRequiredParameter,
@@ -68,6 +73,25 @@ class SessionProcurer:
         a session if one is not already associated with the request and the
         request is a GET.
     @type _setCookieOnGET: L{bool}
+
+    @ivar _trustForwardedProto: Treat requests whose C{X-Forwarded-Proto}
+        header says C{https} as having been sent securely.  Only enable this
+        when Klein is behind a TLS-terminating reverse proxy which always sets
+        that header, since otherwise any client can set it.
+    @type _trustForwardedProto: L{bool}
+
+    @ivar _insecureReportClock: If set, tokens which were sent over an
+        insecure transport are collected and reported to the session store
+        together, in a single call to C{sentInsecurely} on the next iteration
+        of this clock, rather than on the request path.  If L{None}, they are
+        reported immediately.
+    @type _insecureReportClock: L{IReactorTime} or L{None}
+
+    @ivar _csrfTokens: If set, the tokens which forms rendered for and
+        submitted with requests whose sessions this procurer procures use to
+        protect against cross-site request forgery, such as
+        L{klein.SignedCSRFTokens}; if L{None}, the session identifier is used.
+    @type _csrfTokens: L{ICSRFTokens} or L{None}
     """
 
     _store = attr.ib(type=ISessionStore)
@@ -81,17 +105,89 @@ class SessionProcurer:
     _secureTokenHeader = attr.ib(type=bytes, default=b"X-Auth-Token")
     _insecureTokenHeader = attr.ib(type=bytes, default=b"X-INSECURE-Auth-Token")
     _setCookieOnGET = attr.ib(type=bool, default=True)
+    _trustForwardedProto = attr.ib(type=bool, default=False)
+    _insecureReportClock = attr.ib(type=Optional[IReactorTime], default=None)
+    _csrfTokens = attr.ib(type=Optional[ICSRFTokens], default=None)
+    _insecureTokens = attr.ib(
+        type=List[bytes], default=attr.Factory(list), init=False, repr=False
+    )
+
+    def _isSecure(self, request: IRequest) -> bool:
+        """
+        Was C{request} sent over a secure transport, either to us or, if we
+        trust it, to the reverse proxy in front of us?
+        """
+        if request.isSecure():
+            return True
+        if self._trustForwardedProto:
+            forwarded = request.getHeader(b"x-forwarded-proto")
+            if forwarded is not None:
+                # The last entry is the one added by the proxy nearest to us,
+                # which is the one we trust.
+                return forwarded.split(b",")[-1].strip().lower() == b"https"
+        return False
+
+    def _detectInsecureTokens(self, request: IRequest) -> None:
+        """
+        Report any session tokens sent with C{request}, which was sent over an
+        insecure transport, to the session store, in case a buggy client has
+        inadvertently disclosed a secure token.
+        """
+        tokens = []
+        getRawHeaders = request.requestHeaders.getRawHeaders
+        for header in (self._secureTokenHeader, self._insecureTokenHeader):
+            values = getRawHeaders(header)
+            if values:
+                tokens.extend(values)
+        for cookie in (self._secureCookie, self._insecureCookie):
+            value = request.getCookie(cookie)
+            if value:
+                tokens.append(value)
+        if not tokens:
+            return
+        if self._insecureReportClock is None:
+            self._store.sentInsecurely(tokens)
+            return
+        if not self._insecureTokens:
+            self._insecureReportClock.callLater(0, self._reportInsecureTokens)
+        self._insecureTokens.extend(tokens)
+
+    def _reportInsecureTokens(self) -> None:
+        """
+        Report all the tokens collected by L{_detectInsecureTokens} to the
+        session store.
+        """
+        tokens, self._insecureTokens = self._insecureTokens, []
+        self._store.sentInsecurely(tokens)
 
-    @inlineCallbacks
     def procureSession(
         self, request: IRequest, forceInsecure: bool = False
-    ) -> Any:
+    ) -> Deferred:
+        return maybeDeferred(
+            traced,
+            request,
+            "klein.session.procure",
+            {},
+            self._procureSession,
+            request,
+            forceInsecure,
+        )
+
+    @eagerly
+    def _procureSession(self, request: IRequest, forceInsecure: bool) -> Any:
+        """
+        Implementation of L{SessionProcurer.procureSession}, which only
+        returns a L{Deferred} if the session store has to wait.
+        """
+        if self._csrfTokens is not None:
+            request.setComponent(ICSRFTokens, self._csrfTokens)
+        isSecure = self._isSecure(request)
         alreadyProcured = request.getComponent(ISession)
         if alreadyProcured is not None:
-            if not forceInsecure or not request.isSecure():
-                returnValue(alreadyProcured)
+            if not forceInsecure or not isSecure:
+                return alreadyProcured
 
-        if request.isSecure():
+        if isSecure:
             if forceInsecure:
                 tokenHeader = self._insecureTokenHeader
                 cookieName: Union[str, bytes] = self._insecureCookie
@@ -102,27 +198,11 @@ class SessionProcurer:
                 sentSecurely = True
         else:
             # Have we inadvertently disclosed a secure token over an insecure
-            # transport, for example, due to a buggy client?
-            allPossibleSentTokens: Sequence[str] = sum(
-                [
-                    request.requestHeaders.getRawHeaders(header, [])
-                    for header in [
-                        self._secureTokenHeader,
-                        self._insecureTokenHeader,
-                    ]
-                ],
-                [],
-            ) + [
-                it
-                for it in [
-                    request.getCookie(cookie)
-                    for cookie in [self._secureCookie, self._insecureCookie]
-                ]
-                if it
-            ]
-            # Does it seem like this check is expensive? It sure is! Don't want
-            # to do it? Turn on your dang HTTPS!
-            self._store.sentInsecurely(allPossibleSentTokens)
+            # transport, for example, due to a buggy client?  Does it seem
+            # like this check is expensive?  It can be!  Don't want to do it?
+            # Turn on your dang HTTPS!  (Or, if you have, and it's terminated
+            # by a proxy, set trustForwardedProto.)
+            self._detectInsecureTokens(request)
             tokenHeader = self._insecureTokenHeader
             cookieName = self._insecureCookie
             sentSecurely = False
@@ -191,10 +271,10 @@ class SessionProcurer:
                 secure=sentSecurely,
                 httpOnly=True,
             )
-        if sentSecurely or not request.isSecure():
+        if sentSecurely or not isSecure:
             # Do not cache the insecure session on the secure request, thanks.
             request.setComponent(ISession, session)
-        returnValue(session)
+        return session
 
 
 class AuthorizationDenied(Resource):
@@ -276,29 +356,154 @@ class Authorization:
     ) -> IDependencyInjector:
         """
         Register this authorization to inject a parameter.
+
+        All the L{Authorization}s on a route are authorized together, with a
+        single call to L{ISession.authorize} per request.
         """
-        return self
+        required = IRequiredAuthorizations(injectionComponents)
+        if self._interface not in required.interfaces:
+            required.interfaces.append(self._interface)
+        required.authorizations.append(self)
+        return _BatchedAuthorization(self, required)
 
-    @inlineCallbacks
+    @eagerly
     def injectValue(
         self, instance: Any, request: IRequest, routeParams: Dict[str, Any]
     ) -> Any:
         """
         Inject a value by asking the request's session.
         """
-        # TODO: this could be optimized to do fewer calls to 'authorize' by
-        # collecting all the interfaces that are necessary and then using
-        # addBeforeHook; the interface would not need to change.
         session = ISession(request)
-        provider = (yield session.authorize([self._interface])).get(
-            self._interface
-        )
+        authorized = yield session.authorize([self._interface])
+        return self._provide(instance, authorized)
+
+    def _provide(
+        self, instance: Any, authorized: Dict[Type[Interface], Any]
+    ) -> Any:
+        """
+        Select the provider of this authorization's interface from the result
+        of L{ISession.authorize}.
+
+        @raise EarlyExit: if the interface is required and was not authorized.
+        """
+        provider = authorized.get(self._interface)
         if self._required and provider is None:
             raise EarlyExit(self._whenDenied(self._interface, instance))
         # TODO: CSRF protection should probably go here
-        returnValue(provider)
+        return provider
 
     def finalize(self) -> None:
         """
         Nothing to finalize when registering.
         """
+
+
+class IAuthorizationResults(Interface):
+    """
+    Marker interface for the L{dict} of providers authorized by the request's
+    session for the L{Authorization}s of the current route.
+    """
+
+
+class IRequiredAuthorizations(Interface):
+    """
+    The interfaces that L{Authorization}s on a single route require.
+    """
+
+    interfaces: List[Type[Interface]] = Attribute("Required interfaces.")
+    authorizations: List[Authorization] = Attribute(
+        "The L{Authorization}s which require them."
+    )
+
+    def finalize() -> None:
+        """
+        Arrange for all of C{interfaces} to be authorized before the route's
+        dependencies are injected, and for the request to exit early, before
+        any of them are injected, if any of C{authorizations} is denied.
+        """
+
+
+@implementer(IRequiredAuthorizations)
+@attr.s
+class RequiredAuthorizations:
+    """
+    The interfaces that L{Authorization}s on a single route require, and the
+    prepare hook that authorizes them.
+    """
+
+    _lifecycle = attr.ib(type=IRequestLifecycle)
+    interfaces = attr.ib(type=List[Type[Interface]], default=attr.Factory(list))
+    authorizations = attr.ib(
+        type=List[Authorization], default=attr.Factory(list)
+    )
+    _finalized = attr.ib(type=bool, default=False)
+
+    @classmethod
+    def fromComponentized(
+        cls, componentized: Componentized
+    ) -> "RequiredAuthorizations":
+        """
+        Create a L{RequiredAuthorizations} from a componentized object.
+        """
+        lifecycle = IRequestLifecycle(componentized)
+        assert lifecycle is not None
+        return cls(lifecycle)
+
+    def finalize(self) -> None:
+        if self._finalized:
+            return
+        self._finalized = True
+        interfaces = self.interfaces
+        authorizations = self.authorizations
+        details = {"interfaces": [qual(interface) for interface in interfaces]}
+
+        @bindable
+        @eagerly
+        def authorizeAll(instance: Any, request: IRequest) -> Any:
+            authorized = yield traced(
+                request,
+                "klein.session.authorize",
+                details,
+                ISession(request).authorize,
+                interfaces,
+            )
+            # Exit before any of the route's parameters start being injected
+            # if a required authorization was denied.
+            for authorization in authorizations:
+                authorization._provide(instance, authorized)
+            request.setComponent(IAuthorizationResults, authorized)
+
+        self._lifecycle.addPrepareHook(
+            authorizeAll,
+            provides=[IAuthorizationResults],
+            requires=[ISession],
+        )
+
+
+registerAdapter(
+    RequiredAuthorizations.fromComponentized,
+    Componentized,
+    IRequiredAuthorizations,
+)
+
+
+@implementer(IDependencyInjector)
+@attr.s
+class _BatchedAuthorization:
+    """
+    The injector for an L{Authorization} on a particular route, which injects
+    its value from the results of the route's single authorization request.
+    """
+
+    _authorization = attr.ib(type=Authorization)
+    _required = attr.ib(type=IRequiredAuthorizations)
+
+    def injectValue(
+        self, instance: Any, request: IRequest, routeParams: Dict[str, Any]
+    ) -> Any:
+        return self._authorization._provide(
+            instance, request.getComponent(IAuthorizationResults)
+        )
+
+    def finalize(self) -> None:
+        self._required.finalize()
@@ -0,0 +1,185 @@
+# -*- test-case-name: klein.test.test_tracing -*-
+"""
+Tracing the stages of handling a request.
+"""
+
+from collections import deque
+from time import perf_counter, time
+from typing import Any, Callable, Deque, Mapping, Optional
+
+import attr
+
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
+from twisted.python.reflect import qual
+from twisted.web.iweb import IRequest
+
+from zope.interface import implementer
+
+from ._interfaces import ITracer
+
+
+@attr.s(frozen=True)
+class _Span:
+    """
+    A span which has been started with an L{ITracer}.
+    """
+
+    _tracer = attr.ib(type=ITracer)
+    _span = attr.ib(type=object)
+
+    @classmethod
+    def start(
+        cls,
+        tracer: ITracer,
+        request: IRequest,
+        name: str,
+        attributes: Mapping[str, object],
+    ) -> "_Span":
+        return cls(tracer, tracer.startSpan(name, request, attributes))
+
+    def end(
+        self,
+        result: object = None,
+        attributes: Optional[Mapping[str, object]] = None,
+    ) -> None:
+        """
+        End this span.
+
+        @param result: The result of the stage; if it is a L{Failure}, the
+            stage failed.
+
+        @param attributes: Further details of the stage, if any.
+        """
+        self._tracer.endSpan(
+            self._span,
+            {} if attributes is None else attributes,
+            result if isinstance(result, Failure) else None,
+        )
+
+
+def traced(
+    request: IRequest,
+    name: str,
+    attributes: Mapping[str, object],
+    f: Callable[..., Any],
+    *args: Any,
+) -> Any:
+    """
+    Call C{f} with C{args} as a stage of handling C{request}, reporting it to
+    the request's L{ITracer} as a span which ends when C{f}'s result is
+    ready, if the request has a tracer.
+
+    @return: the result of C{f}.
+    """
+    tracer = ITracer(request, None)
+    if tracer is None:
+        return f(*args)
+    span = _Span.start(tracer, request, name, attributes)
+    try:
+        result = f(*args)
+    except BaseException:
+        span.end(Failure())
+        raise
+    if isinstance(result, Deferred):
+
+        def ended(result: object) -> object:
+            span.end(result)
+            return result
+
+        return result.addBoth(ended)
+    span.end()
+    return result
+
+
+@attr.s(frozen=True)
+class TracedSpan:
+    """
+    A span recorded by a L{RingBufferTracer}.
+
+    @ivar name: The name of the stage.
+
+    @ivar requestID: An identifier of the request, unique among the requests
+        being handled at the same time.
+
+    @ivar attributes: The attributes of the span, from its start and end.
+
+    @ivar started: When the span started, in seconds since the epoch.
+
+    @ivar duration: How long the span lasted, in seconds.
+
+    @ivar error: A description of the failure with which the stage ended, or
+        L{None} if it succeeded.
+
+    @since: Klein NEXT
+    """
+
+    name = attr.ib(type=str)
+    requestID = attr.ib(type=int)
+    attributes = attr.ib(type=Mapping[str, object])
+    started = attr.ib(type=float)
+    duration = attr.ib(type=float)
+    error = attr.ib(type=Optional[str], default=None)
+
+
+@attr.s
+class _OpenSpan:
+    """
+    A span which a L{RingBufferTracer} has started but not yet ended.
+    """
+
+    name = attr.ib(type=str)
+    requestID = attr.ib(type=int)
+    attributes = attr.ib(type=Mapping[str, object])
+    started = attr.ib(type=float)
+    counter = attr.ib(type=float)
+
+
+@implementer(ITracer)
+@attr.s
+class RingBufferTracer:
+    """
+    An L{ITracer} which keeps the most recent spans in memory, for
+    attributing the latency of requests to the stages of handling them.
+
+    To record spans, set one as the C{tracer} attribute of an application;
+    by default, an application's C{tracer} is L{None}, and nothing is traced.
+
+    @ivar size: The number of spans to keep.
+
+    @ivar spans: The most recently ended spans, oldest first.
+
+    @since: Klein NEXT
+    """
+
+    size = attr.ib(type=int, default=1000)
+    spans = attr.ib(type=Deque[TracedSpan], init=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.spans = deque(maxlen=self.size)
+
+    def startSpan(
+        self, name: str, request: IRequest, attributes: Mapping[str, object]
+    ) -> object:
+        return _OpenSpan(name, id(request), attributes, time(), perf_counter())
+
+    def endSpan(
+        self,
+        span: object,
+        attributes: Mapping[str, object],
+        failure: Optional[Failure],
+    ) -> None:
+        assert isinstance(span, _OpenSpan)
+        error = None
+        if failure is not None:
+            error = f"{qual(failure.type)}: {failure.getErrorMessage()}"
+        self.spans.append(
+            TracedSpan(
+                span.name,
+                span.requestID,
+                {**span.attributes, **attributes},
+                span.started,
+                perf_counter() - span.counter,
+                error,
+            )
+        )
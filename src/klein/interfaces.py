@@ -2,9 +2,10 @@ from ._iform import (
     ValidationError,
     ValueAbsent,
 )
-from ._interfaces import IKleinRequest
+from ._interfaces import IKleinRequest, IRouteMetrics, ITracer
 from ._isession import (
     EarlyExit,
+    ICSRFTokens,
     IDependencyInjector,
     IRequestLifecycle,
     IRequiredParameter,
@@ -22,10 +23,13 @@ from ._isession import (
 
 __all__ = (
     "EarlyExit",
+    "ICSRFTokens",
     "IDependencyInjector",
     "IKleinRequest",
     "IRequestLifecycle",
     "IRequiredParameter",
+    "IRouteMetrics",
+    "ITracer",
     "ISession",
     "ISessionProcurer",
     "ISessionStore",
@@ -0,0 +1,260 @@
+# -*- test-case-name: klein.test.test_cache -*-
+"""
+Caching of session authorization results.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+import attr
+from attr import Factory
+
+from twisted.internet.defer import Deferred, succeed
+from twisted.python.components import Componentized
+
+from zope.interface import Interface, implementer
+
+from klein.interfaces import ISession, ISessionStore, SessionMechanism
+
+from ._memory import _defaultClock
+
+# (session identifier, interface)
+_CacheKey = Tuple[str, Type[Interface]]
+
+# Cached in place of a provider for interfaces the session may not have.
+_DENIED = object()
+
+# Returned by AuthorizationCache.get when nothing is cached.
+_MISSING = object()
+
+
+@attr.s
+class AuthorizationCache:
+    """
+    A cache of the results of L{ISession.authorize}, shared between requests,
+    keyed by session identifier and interface.
+
+    Whenever the bindings of a session change in a way that might change what
+    it is authorized for (for example, when it logs in or out), the
+    application or session store must call L{AuthorizationCache.invalidate}.
+
+    @ivar ttl: The number of seconds for which to cache a result.
+
+    @ivar maxEntries: The maximum number of results to cache; the
+        least-recently-used result is discarded when it is exceeded.
+    """
+
+    ttl = attr.ib(type=float, default=60.0)
+    maxEntries = attr.ib(type=int, default=10000)
+    _clock = attr.ib(type=Any, default=Factory(_defaultClock))
+    _entries = attr.ib(
+        type="OrderedDict[_CacheKey, Tuple[float, Any]]",
+        default=Factory(OrderedDict),
+        init=False,
+        repr=False,
+    )
+
+    def get(self, identifier: str, interface: Type[Interface]) -> Any:
+        """
+        Look up a cached result.
+
+        @return: the cached provider, L{None} if the interface was cached as
+            not authorized, or C{_MISSING} if nothing is cached.
+        """
+        key = (identifier, interface)
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires, provider = entry
+        if expires <= self._clock.seconds():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return None if provider is _DENIED else provider
+
+    def put(
+        self, identifier: str, interface: Type[Interface], provider: Any
+    ) -> None:
+        """
+        Cache C{provider} as the result of authorizing C{interface} for the
+        session identified by C{identifier}; a C{provider} of L{None} means
+        the session is not authorized for C{interface}.
+        """
+        key = (identifier, interface)
+        self._entries[key] = (
+            self._clock.seconds() + self.ttl,
+            _DENIED if provider is None else provider,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxEntries:
+            self._entries.popitem(last=False)
+
+    def invalidate(
+        self,
+        identifier: str,
+        interfaces: Optional[Iterable[Type[Interface]]] = None,
+    ) -> None:
+        """
+        Forget cached results for the session identified by C{identifier}.
+
+        @param interfaces: The interfaces whose results to forget; by default,
+            all of them.
+        """
+        if interfaces is not None:
+            for interface in interfaces:
+                self._entries.pop((identifier, interface), None)
+            return
+        for key in [key for key in self._entries if key[0] == identifier]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """
+        Forget all cached results.
+        """
+        self._entries.clear()
+
+
+@implementer(ISession)
+@attr.s
+class CachingSession:
+    """
+    An L{ISession} which memoizes the results of authorizing its wrapped
+    session for as long as it lives (generally, a single request), and
+    consults and populates an L{AuthorizationCache} shared between requests.
+
+    Looking up any other interface on it, and its data, are passed through to
+    the wrapped session.  To save its data with a store whose sessions must
+    be saved explicitly, use L{AuthorizationCachingStore.saveSession}.
+
+    @ivar session: The wrapped session.
+    """
+
+    session = attr.ib(type=ISession)
+    _cache = attr.ib(type=Optional[AuthorizationCache])
+    _memo = attr.ib(
+        type=Dict[Type[Interface], Any],
+        default=Factory(dict),
+        init=False,
+        repr=False,
+    )
+
+    @property
+    def identifier(self) -> str:
+        return self.session.identifier  # type: ignore[no-any-return]
+
+    @property
+    def isConfidential(self) -> bool:
+        return self.session.isConfidential  # type: ignore[no-any-return]
+
+    @property
+    def authenticatedBy(self) -> SessionMechanism:
+        return self.session.authenticatedBy  # type: ignore[no-any-return]
+
+    @property
+    def _components(self) -> Componentized:
+        """
+        The data of the wrapped session.
+        """
+        return self.session._components  # type: ignore[no-any-return]
+
+    def __conform__(self, interface: Type[Interface]) -> Any:
+        """
+        Adapt the wrapped session to interfaces this session does not itself
+        provide.
+        """
+        if interface.providedBy(self):
+            return None
+        return interface(self.session, None)
+
+    def authorize(self, interfaces: Iterable[Type[Interface]]) -> Deferred:
+        """
+        Authorize the given interfaces, asking the wrapped session only about
+        those with no memoized or cached result.
+        """
+        interfaces = list(interfaces)
+        memo = self._memo
+        cache = self._cache
+        identifier = self.identifier
+        missing: List[Type[Interface]] = []
+        for interface in interfaces:
+            if interface in memo:
+                continue
+            if cache is not None:
+                cached = cache.get(identifier, interface)
+                if cached is not _MISSING:
+                    memo[interface] = cached
+                    continue
+            missing.append(interface)
+
+        def result(ignored: object = None) -> Dict[Type[Interface], Any]:
+            return {
+                interface: memo[interface]
+                for interface in interfaces
+                if memo.get(interface) is not None
+            }
+
+        if not missing:
+            return succeed(result())
+
+        def remember(authorized: Dict[Type[Interface], Any]) -> None:
+            for interface in missing:
+                provider = authorized.get(interface)
+                memo[interface] = provider
+                if cache is not None:
+                    cache.put(identifier, interface, provider)
+
+        return (
+            self.session.authorize(missing)
+            .addCallback(remember)
+            .addCallback(result)
+        )
+
+
+@implementer(ISessionStore)
+@attr.s
+class AuthorizationCachingStore:
+    """
+    An L{ISessionStore} which wraps the sessions of another store in
+    L{CachingSession}s, so that each request authorizes each interface at
+    most once, and, if given an L{AuthorizationCache}, so that results are
+    shared between requests for the same session.
+
+    @ivar store: The wrapped session store.
+
+    @ivar cache: The cache shared between requests, or L{None} to memoize
+        results only within each request.
+    """
+
+    store = attr.ib(type=ISessionStore)
+    cache = attr.ib(type=Optional[AuthorizationCache], default=None)
+
+    def _wrap(self, session: ISession) -> CachingSession:
+        return CachingSession(session, self.cache)
+
+    def newSession(
+        self, isConfidential: bool, authenticatedBy: SessionMechanism
+    ) -> Deferred:
+        return self.store.newSession(
+            isConfidential, authenticatedBy
+        ).addCallback(self._wrap)
+
+    def loadSession(
+        self,
+        identifier: str,
+        isConfidential: bool,
+        authenticatedBy: SessionMechanism,
+    ) -> Deferred:
+        return self.store.loadSession(
+            identifier, isConfidential, authenticatedBy
+        ).addCallback(self._wrap)
+
+    def sentInsecurely(self, identifiers: Sequence[str]) -> None:
+        self.store.sentInsecurely(identifiers)
+
+    def saveSession(self, session: CachingSession) -> None:
+        """
+        Save the data of the session wrapped by C{session} with the wrapped
+        store, for stores whose sessions must be saved explicitly, such as
+        L{klein.storage.sqlite.SQLiteSessionStore}.
+        """
+        self.store.saveSession(session.session)  # type: ignore[attr-defined]
@@ -1,12 +1,26 @@
 # -*- test-case-name: klein.test.test_memory -*-
 from binascii import hexlify
+from collections import OrderedDict
+from heapq import heapify, heappop, heappush
 from os import urandom
-from typing import Any, Callable, Dict, Iterable, Type, cast
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    cast,
+)
 
 import attr
 from attr import Factory
 
 from twisted.internet.defer import Deferred, fail, succeed
+from twisted.internet.interfaces import IReactorTime
+from twisted.internet.task import LoopingCall
 from twisted.python.components import Componentized
 
 from zope.interface import Interface, implementer
@@ -89,9 +103,90 @@ def _noAuthorization(
     return None
 
 
+def _authorizerTable(
+    authorizers: Iterable[_MemoryAuthorizerFunction],
+) -> _authFn:
+    """
+    Combine a collection of callbacks decorated with
+    L{declareMemoryAuthorizer} into a single authorization callback which
+    dispatches on the interface being authorized.
+    """
+    interfaceToCallable = {}
+    for authorizer in authorizers:
+        assert authorizer.__memoryAuthInterface__ is not None
+        specifiedInterface = authorizer.__memoryAuthInterface__
+        interfaceToCallable[specifiedInterface] = authorizer
+
+    def authorizationCallback(
+        interface: Type[Interface], session: ISession, data: Componentized
+    ) -> Any:
+        return interfaceToCallable.get(interface, _noAuthorization)(
+            interface, session, data
+        )
+
+    return authorizationCallback
+
+
+def _defaultClock() -> IReactorTime:
+    """
+    Return the global reactor, for use as the default clock for a
+    L{MemorySessionStore}.
+    """
+    from twisted.internet import reactor
+
+    return cast(IReactorTime, reactor)
+
+
+# (isConfidential, identifier)
+_SessionKey = Tuple[bool, str]
+
+# (absolute deadline, effective deadline)
+_Deadlines = Tuple[float, float]
+
+_never = float("inf")
+
+
 @implementer(ISessionStore)
 @attr.s
 class MemorySessionStore:
+    """
+    An in-memory L{ISessionStore}.
+
+    By default, sessions live for as long as the store does.  Since a
+    L{klein.SessionProcurer} will, by default, create a new session for every
+    cookie-less GET request, long-running processes should bound the store's
+    memory use with some combination of:
+
+        - C{maxAge}, the maximum number of seconds a session may live after it
+          is created; this should generally match the C{maxAge} of the
+          L{klein.SessionProcurer} that is using this store, so that sessions
+          do not outlive their cookies,
+
+        - C{idleTimeout}, the number of seconds a session may go without being
+          loaded before it expires, and
+
+        - C{maxSessions}, the maximum number of sessions to keep; when a new
+          session would exceed it, the least-recently-used session is
+          discarded.
+
+    Expired sessions are never returned from L{MemorySessionStore.loadSession}
+    but are only forgotten by L{MemorySessionStore.expireSessions}, which may
+    be called periodically with L{MemorySessionStore.startExpiring}.
+
+    @ivar authorizationCallback: The callback used to authorize interfaces
+        for sessions in this store.
+
+    @ivar maxAge: The maximum lifetime of a session, in seconds, or L{None}.
+
+    @ivar idleTimeout: The maximum time between loads of a session, in
+        seconds, or L{None}.
+
+    @ivar maxSessions: The maximum number of sessions to retain, or L{None}.
+
+    @ivar _clock: The clock used to determine the current time and to
+        schedule periodic expiry.
+    """
+
     authorizationCallback = attr.ib(type=_authFn, default=_noAuthorization)
     _secureStorage = attr.ib(
         type=Dict[str, Any], default=cast(Dict[str, Any], Factory(dict))
@@ -99,29 +194,40 @@ class MemorySessionStore:
     _insecureStorage = attr.ib(
         type=Dict[str, Any], default=cast(Dict[str, Any], Factory(dict))
     )
+    maxAge = attr.ib(type=Optional[float], default=None, kw_only=True)
+    idleTimeout = attr.ib(type=Optional[float], default=None, kw_only=True)
+    maxSessions = attr.ib(type=Optional[int], default=None, kw_only=True)
+    _clock = attr.ib(
+        type=IReactorTime, default=Factory(_defaultClock), kw_only=True
+    )
+    _recency = attr.ib(
+        type="OrderedDict[_SessionKey, _Deadlines]",
+        default=Factory(OrderedDict),
+        init=False,
+        repr=False,
+    )
+    _expiryHeap = attr.ib(
+        type=List[Tuple[float, _SessionKey]],
+        default=Factory(list),
+        init=False,
+        repr=False,
+    )
+    _expiryLoop = attr.ib(
+        type=Optional[LoopingCall], default=None, init=False, repr=False
+    )
 
     @classmethod
     def fromAuthorizers(
-        cls, authorizers: Iterable[_MemoryAuthorizerFunction]
+        cls, authorizers: Iterable[_MemoryAuthorizerFunction], **kw: Any
     ) -> "MemorySessionStore":
         """
         Create a L{MemorySessionStore} from a collection of callbacks which can
         do authorization.
-        """
-        interfaceToCallable = {}
-        for authorizer in authorizers:
-            assert authorizer.__memoryAuthInterface__ is not None
-            specifiedInterface = authorizer.__memoryAuthInterface__
-            interfaceToCallable[specifiedInterface] = authorizer
-
-        def authorizationCallback(
-            interface: Type[Interface], session: ISession, data: Componentized
-        ) -> Any:
-            return interfaceToCallable.get(interface, _noAuthorization)(
-                interface, session, data
-            )
 
-        return cls(authorizationCallback)
+        @param kw: Additional keyword arguments, such as C{maxAge}, to pass
+            along to L{MemorySessionStore}.
+        """
+        return cls(_authorizerTable(authorizers), **kw)
 
     def _storage(self, isConfidential: bool) -> Dict[str, Any]:
         """
@@ -132,6 +238,23 @@ class MemorySessionStore:
         else:
             return self._insecureStorage
 
+    def _forget(self, key: _SessionKey) -> None:
+        """
+        Remove the session identified by C{key} from this store.
+        """
+        isConfidential, identifier = key
+        self._storage(isConfidential).pop(identifier, None)
+        self._recency.pop(key, None)
+
+    def _slide(self, absolute: float, now: float) -> float:
+        """
+        Compute the effective deadline for a session that was accessed at
+        C{now} and may not outlive C{absolute}.
+        """
+        if self.idleTimeout is None:
+            return absolute
+        return min(absolute, now + self.idleTimeout)
+
     def newSession(
         self, isConfidential: bool, authenticatedBy: SessionMechanism
     ) -> Deferred:
@@ -144,8 +267,39 @@ class MemorySessionStore:
             self.authorizationCallback,
         )
         storage[identifier] = session
+
+        key = (isConfidential, identifier)
+        now = self._clock.seconds()
+        absolute = _never if self.maxAge is None else now + self.maxAge
+        deadline = self._slide(absolute, now)
+        self._recency[key] = (absolute, deadline)
+        if deadline != _never:
+            heappush(self._expiryHeap, (deadline, key))
+        if self.maxSessions is not None:
+            while len(self._recency) > self.maxSessions:
+                oldest, _ = self._recency.popitem(last=False)
+                self._forget(oldest)
+        self._compactExpiryHeap()
         return succeed(session)
 
+    def _compactExpiryHeap(self) -> None:
+        """
+        Rebuild the expiry heap from the live sessions once it has grown to
+        more than twice their number, so that the entries of sessions which
+        were evicted or failed to load, and would otherwise stay until their
+        deadlines, take memory proportional to the number of sessions.
+        """
+        recency = self._recency
+        if len(self._expiryHeap) <= 2 * len(recency) + 16:
+            return
+        heap = [
+            (deadline, key)
+            for key, (absolute, deadline) in recency.items()
+            if deadline != _never
+        ]
+        heapify(heap)
+        self._expiryHeap = heap
+
     def loadSession(
         self,
         identifier: str,
@@ -153,16 +307,70 @@ class MemorySessionStore:
         authenticatedBy: SessionMechanism,
     ) -> Deferred:
         storage = self._storage(isConfidential)
+        key = (isConfidential, identifier)
         if identifier in storage:
-            return succeed(storage[identifier])
-        else:
-            return fail(
-                NoSuchSession(
-                    "Session not found in memory store {id!r}".format(
-                        id=identifier
-                    )
-                )
+            absolute, deadline = self._recency.get(key, (_never, _never))
+            now = self._clock.seconds()
+            if now < deadline:
+                self._recency[key] = (absolute, self._slide(absolute, now))
+                self._recency.move_to_end(key)
+                return succeed(storage[identifier])
+            self._forget(key)
+        return fail(
+            NoSuchSession(
+                "Session not found in memory store {id!r}".format(id=identifier)
             )
+        )
 
     def sentInsecurely(self, tokens: Iterable[str]) -> None:
         return
+
+    def expireSessions(self) -> int:
+        """
+        Forget all sessions whose deadline has passed.
+
+        This takes time proportional to the number of expired sessions (plus
+        the number of sessions whose idle deadlines have been extended since
+        they were last examined), not the total number of sessions.
+
+        @return: the number of sessions that were expired.
+        """
+        now = self._clock.seconds()
+        heap = self._expiryHeap
+        recency = self._recency
+        expired = 0
+        while heap and heap[0][0] <= now:
+            _, key = heappop(heap)
+            deadlines = recency.get(key)
+            if deadlines is None:
+                # Already discarded, by eviction or a failed load.
+                continue
+            deadline = deadlines[1]
+            if deadline > now:
+                # The session was used since this entry was pushed; check on
+                # it again at its new deadline.
+                heappush(heap, (deadline, key))
+                continue
+            self._forget(key)
+            expired += 1
+        return expired
+
+    def startExpiring(self, interval: float) -> None:
+        """
+        Call L{MemorySessionStore.expireSessions} every C{interval} seconds,
+        using this store's clock.
+        """
+        self.stopExpiring()
+        loop = LoopingCall(self.expireSessions)
+        loop.clock = self._clock
+        loop.start(interval, now=False)
+        self._expiryLoop = loop
+
+    def stopExpiring(self) -> None:
+        """
+        Stop periodically expiring sessions, if
+        L{MemorySessionStore.startExpiring} was previously called.
+        """
+        if self._expiryLoop is not None:
+            self._expiryLoop.stop()
+            self._expiryLoop = None
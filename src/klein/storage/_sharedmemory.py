@@ -0,0 +1,447 @@
+# -*- test-case-name: klein.test.test_sharedmemory -*-
+"""
+Session storage in a memory-mapped file shared between processes.
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from binascii import hexlify
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+import attr
+from attr import Factory
+
+from twisted.internet.defer import Deferred, fail, succeed
+
+from zope.interface import implementer
+
+from klein.interfaces import ISessionStore, NoSuchSession, SessionMechanism
+
+from ._memory import (
+    MemorySession,
+    _MemoryAuthorizerFunction,
+    _authFn,
+    _authorizerTable,
+    _defaultClock,
+    _noAuthorization,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+
+# The file begins with a header identifying its layout.
+_HEADER = struct.Struct("<8sII")
+_MAGIC = b"kleinss1"
+
+# Each slot begins with a record header, followed by pickled session data:
+# version, state, confidential, mechanism, expires, identifier, data length.
+_RECORD = struct.Struct("<IBBBxd64sI")
+_VERSION = struct.Struct("<I")
+_DATA_START = _RECORD.size
+
+_EMPTY = 0
+_USED = 1
+_DELETED = 2
+
+_MECHANISMS = [SessionMechanism.Cookie, SessionMechanism.Header]
+
+# The most slots, starting at its home slot, in which a session may be
+# stored, and so the most that any lookup reads.
+_MAX_PROBE = 128
+
+# How many times a reader retries a slot that is being written concurrently
+# before giving up on it.
+_READ_ATTEMPTS = 100
+
+_never = float("inf")
+
+
+class SessionStoreFull(Exception):
+    """
+    There are no free slots left in a L{SharedMemorySessionStore}.
+    """
+
+
+@attr.s(frozen=True)
+class _Record:
+    """
+    A decoded slot of a L{SharedMemorySessionStore}.
+    """
+
+    state = attr.ib(type=int)
+    isConfidential = attr.ib(type=bool)
+    mechanism = attr.ib(type=SessionMechanism)
+    expires = attr.ib(type=float)
+    identifier = attr.ib(type=str)
+    data = attr.ib(type=bytes)
+
+
+@implementer(ISessionStore)
+@attr.s
+class SharedMemorySessionStore:
+    """
+    An L{ISessionStore} kept in a memory-mapped file, so that every process on
+    a host which opens the same file shares the same sessions.  This allows
+    several worker processes to serve one port without sticky routing.
+
+    Create one in each process with L{SharedMemorySessionStore.open}.
+
+    The file contains a fixed-size, open-addressed hash table of C{slots}
+    slots of C{slotSize} bytes each.  A session is stored in one of the 128
+    slots following its identifier's home slot, so no lookup reads more than
+    that; a nearly full table may therefore report L{SessionStoreFull}
+    before every slot is in use.  Each slot holds one session: its
+    identifier, security properties, expiry time and pickled L{Componentized}
+    data, so any components you set on a session must be picklable and small
+    enough to fit.  Call L{SharedMemorySessionStore.saveSession} after
+    modifying a session's data to make the change visible to other processes.
+
+    Reads take no locks: each slot carries a version number which is odd
+    while the slot is being written, and readers retry if it changes while
+    they read.  Writers serialize with each other using an exclusive
+    C{flock} on the file, which is held only while copying a single record,
+    so this store requires a POSIX platform.
+
+    @ivar maxAge: The maximum lifetime of a session, in seconds, or L{None}.
+    """
+
+    _map = attr.ib(type=mmap.mmap)
+    _fd = attr.ib(type=int)
+    _slots = attr.ib(type=int)
+    _slotSize = attr.ib(type=int)
+    authorizationCallback = attr.ib(type=_authFn, default=_noAuthorization)
+    maxAge = attr.ib(type=Optional[float], default=None, kw_only=True)
+    _clock = attr.ib(type=Any, default=Factory(_defaultClock), kw_only=True)
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        slots: int = 65536,
+        slotSize: int = 512,
+        authorizers: Iterable[_MemoryAuthorizerFunction] = (),
+        **kw: Any,
+    ) -> "SharedMemorySessionStore":
+        """
+        Open the shared session table at C{path}, creating it if necessary.
+
+        @param path: The path of the file to map.  Every process which should
+            share sessions must use the same path.
+
+        @param slots: The maximum number of sessions in the table.  Ignored if
+            the file already exists.
+
+        @param slotSize: The size, in bytes, of each slot.  Ignored if the
+            file already exists.
+
+        @param authorizers: Callbacks decorated with
+            L{klein.storage.memory.declareMemoryAuthorizer} which authorize
+            interfaces for sessions in this store.
+
+        @param kw: Additional keyword arguments, such as C{maxAge}, to pass
+            along to L{SharedMemorySessionStore}.
+        """
+        if slotSize <= _RECORD.size:
+            raise ValueError(f"slotSize must be larger than {_RECORD.size}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with _locked(fd):
+            if os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, _HEADER.size + slots * slotSize)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, slots, slotSize), 0)
+            magic, slots, slotSize = _HEADER.unpack(
+                os.pread(fd, _HEADER.size, 0)
+            )
+        if magic != _MAGIC:
+            os.close(fd)
+            raise ValueError(f"{path!r} is not a klein session table")
+        mapped = mmap.mmap(fd, _HEADER.size + slots * slotSize)
+        return cls(
+            mapped, fd, slots, slotSize, _authorizerTable(authorizers), **kw
+        )
+
+    def close(self) -> None:
+        """
+        Unmap and close the session table.
+        """
+        self._map.close()
+        os.close(self._fd)
+
+    def _offset(self, slot: int) -> int:
+        return _HEADER.size + slot * self._slotSize
+
+    def _home(self, identifier: str) -> int:
+        """
+        Compute the first slot which may hold C{identifier}.
+        """
+        # Identifiers are random hex, so a prefix of one is a good hash.  The
+        # fallback must be the same in every process, unlike hash().
+        try:
+            start = int(identifier[:15], 16)
+        except ValueError:
+            start = zlib.crc32(identifier.encode("utf-8"))
+        return start % self._slots
+
+    def _probe(self, identifier: str) -> Iterator[int]:
+        """
+        Yield the slots which may hold C{identifier}, in order.
+        """
+        start = self._home(identifier)
+        for i in range(min(self._slots, _MAX_PROBE)):
+            yield (start + i) % self._slots
+
+    def _read(self, slot: int) -> Optional[_Record]:
+        """
+        Read the record in C{slot} without locking, or return L{None} if it
+        could not be read consistently.
+        """
+        offset = self._offset(slot)
+        end = offset + self._slotSize
+        mapped = self._map
+        for _ in range(_READ_ATTEMPTS):
+            (before,) = _VERSION.unpack_from(mapped, offset)
+            if before & 1:
+                continue
+            raw = mapped[offset:end]
+            (after,) = _VERSION.unpack_from(mapped, offset)
+            if before == after:
+                break
+        else:
+            return None
+        (
+            _,
+            state,
+            confidential,
+            mechanism,
+            expires,
+            identifier,
+            length,
+        ) = _RECORD.unpack_from(raw)
+        if state != _USED:
+            return _Record(state, False, _MECHANISMS[0], _never, "", b"")
+        return _Record(
+            state,
+            bool(confidential),
+            _MECHANISMS[mechanism],
+            expires,
+            identifier.rstrip(b"\0").decode("ascii"),
+            raw[_DATA_START:][:length],
+        )
+
+    def _write(self, slot: int, record: _Record) -> None:
+        """
+        Write C{record} to C{slot}.  Must be called with the write lock held.
+        """
+        offset = self._offset(slot)
+        mapped = self._map
+        (version,) = _VERSION.unpack_from(mapped, offset)
+        _VERSION.pack_into(mapped, offset, version + 1)
+        _RECORD.pack_into(
+            mapped,
+            offset,
+            version + 1,
+            record.state,
+            int(record.isConfidential),
+            _MECHANISMS.index(record.mechanism),
+            record.expires,
+            record.identifier.encode("ascii"),
+            len(record.data),
+        )
+        start = offset + _RECORD.size
+        end = start + len(record.data)
+        mapped[start:end] = record.data
+        _VERSION.pack_into(mapped, offset, version + 2)
+
+    def _find(
+        self, identifier: str, isConfidential: bool
+    ) -> Optional[Tuple[int, _Record]]:
+        """
+        Find the slot holding the given session, if any.
+        """
+        for slot in self._probe(identifier):
+            record = self._read(slot)
+            if record is None:
+                continue
+            if record.state == _EMPTY:
+                return None
+            if (
+                record.state == _USED
+                and record.identifier == identifier
+                and record.isConfidential == isConfidential
+            ):
+                return slot, record
+        return None
+
+    def _store(self, session: MemorySession, expires: float) -> None:
+        """
+        Write C{session} to its slot, or to a free one if it has none.
+        """
+        data = pickle.dumps(session._components)
+        if len(data) > self._slotSize - _RECORD.size:
+            raise ValueError(
+                "Session data is {} bytes; at most {} will fit.".format(
+                    len(data), self._slotSize - _RECORD.size
+                )
+            )
+        record = _Record(
+            _USED,
+            session.isConfidential,
+            session.authenticatedBy,
+            expires,
+            session.identifier,
+            data,
+        )
+        now = self._clock.seconds()
+        with _locked(self._fd):
+            free = None
+            for slot in self._probe(session.identifier):
+                existing = self._read(slot)
+                assert existing is not None, "writers hold the lock"
+                if (
+                    existing.state == _USED
+                    and existing.identifier == session.identifier
+                    and existing.isConfidential == session.isConfidential
+                ):
+                    free = slot
+                    break
+                if free is None and (
+                    existing.state != _USED or existing.expires <= now
+                ):
+                    free = slot
+                if existing.state == _EMPTY:
+                    break
+            if free is None:
+                raise SessionStoreFull(
+                    "All {} session slots where this session may go are in"
+                    " use.".format(min(self._slots, _MAX_PROBE))
+                )
+            self._write(free, record)
+
+    def saveSession(self, session: MemorySession) -> None:
+        """
+        Write C{session}'s current data to the shared table, making it visible
+        to other processes.
+        """
+        found = self._find(session.identifier, session.isConfidential)
+        if found is None:
+            raise NoSuchSession(session.identifier)
+        self._store(session, found[1].expires)
+
+    def newSession(
+        self, isConfidential: bool, authenticatedBy: SessionMechanism
+    ) -> Deferred:
+        identifier = hexlify(os.urandom(32)).decode("ascii")
+        session = MemorySession(
+            identifier,
+            isConfidential,
+            authenticatedBy,
+            self.authorizationCallback,
+        )
+        if self.maxAge is None:
+            expires = _never
+        else:
+            expires = self._clock.seconds() + self.maxAge
+        try:
+            self._store(session, expires)
+        except SessionStoreFull:
+            return fail()
+        return succeed(session)
+
+    def loadSession(
+        self,
+        identifier: str,
+        isConfidential: bool,
+        authenticatedBy: SessionMechanism,
+    ) -> Deferred:
+        found = self._find(identifier, isConfidential)
+        if found is None or found[1].expires <= self._clock.seconds():
+            return fail(
+                NoSuchSession(
+                    "Session not found in shared memory store {id!r}".format(
+                        id=identifier
+                    )
+                )
+            )
+        record = found[1]
+        return succeed(
+            MemorySession(
+                identifier,
+                isConfidential,
+                record.mechanism,
+                self.authorizationCallback,
+                pickle.loads(record.data),
+            )
+        )
+
+    def sentInsecurely(self, tokens: Iterable[str]) -> None:
+        return
+
+    def expireSessions(self) -> int:
+        """
+        Free the slots of all sessions whose maximum age has passed, and
+        empty every freed slot which no lookup needs to probe past.
+
+        Expired slots are reused by new sessions even if this is never
+        called; it serves to shorten the chains that lookups must probe,
+        which otherwise continue past every freed slot.
+
+        The table is scanned without the write lock, which is taken only to
+        free each slot, so other processes are not stalled by the scan.
+
+        @return: the number of sessions expired.
+        """
+        now = self._clock.seconds()
+        # A lookup stops at the first empty slot, so a freed slot may be
+        # emptied only if it is not between a live session and its home.  A
+        # session created during the scan is stored in the first free slot
+        # of its chain, so it never needs a slot that was free to be kept.
+        needed = bytearray(self._slots)
+        freed = []
+        for slot in range(self._slots):
+            record = self._read(slot)
+            if record is None:
+                # Wait for the process writing it to finish.
+                with _locked(self._fd):
+                    record = self._read(slot)
+                assert record is not None, "writers hold the lock"
+            if record.state == _USED and record.expires > now:
+                probe = self._home(record.identifier)
+                while probe != slot:
+                    needed[probe] = 1
+                    probe = (probe + 1) % self._slots
+            elif record.state != _EMPTY:
+                freed.append(slot)
+        expired = 0
+        for slot in freed:
+            with _locked(self._fd):
+                record = self._read(slot)
+                assert record is not None, "writers hold the lock"
+                if record.state == _USED:
+                    if record.expires > now:
+                        # A new session was stored here since the scan.
+                        continue
+                    expired += 1
+                state = _DELETED if needed[slot] else _EMPTY
+                self._write(
+                    slot,
+                    _Record(state, False, _MECHANISMS[0], _never, "", b""),
+                )
+        return expired
+
+
+@contextmanager
+def _locked(fd: int) -> Iterator[None]:
+    """
+    Hold an exclusive lock on the file C{fd} for the duration of the block.
+    """
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
@@ -0,0 +1,448 @@
+# -*- test-case-name: klein.test.test_sqlite -*-
+"""
+Persistent session storage in an SQLite database.
+"""
+
+import pickle
+import sqlite3
+from binascii import hexlify
+from collections import OrderedDict
+from os import urandom
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+import attr
+from attr import Factory
+
+from twisted.internet.defer import Deferred, fail, succeed
+from twisted.internet.interfaces import (
+    IDelayedCall,
+    IReactorCore,
+    IReactorThreads,
+)
+from twisted.internet.threads import deferToThreadPool
+from twisted.python import log
+from twisted.python.threadpool import ThreadPool
+
+from zope.interface import implementer
+
+from klein.interfaces import ISessionStore, NoSuchSession, SessionMechanism
+
+from ._memory import (
+    MemorySession,
+    _MemoryAuthorizerFunction,
+    _authFn,
+    _authorizerTable,
+    _defaultClock,
+    _noAuthorization,
+)
+
+T = TypeVar("T")
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS klein_session (
+        identifier TEXT NOT NULL,
+        confidential INTEGER NOT NULL,
+        mechanism TEXT NOT NULL,
+        expires REAL,
+        components BLOB NOT NULL,
+        PRIMARY KEY (identifier, confidential)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS klein_session_expires
+        ON klein_session (expires)
+    """,
+]
+
+# (identifier, confidential, mechanism, expires, components)
+_SessionRow = Tuple[str, int, str, Optional[float], bytes]
+
+# (isConfidential, identifier)
+_SessionKey = Tuple[bool, str]
+
+
+def _createSchema(connection: sqlite3.Connection) -> None:
+    """
+    Create the tables and indexes used by L{SQLiteSessionStore}, if they do
+    not already exist.
+    """
+    for statement in _SCHEMA:
+        connection.execute(statement)
+
+
+@attr.s
+class _ThreadedConnection:
+    """
+    An SQLite connection that is only ever used from the single thread of a
+    dedicated thread pool, so that queries never block the reactor.
+
+    @ivar _path: The database path, or C{":memory:"}.
+
+    @ivar _reactor: The reactor to deliver results to.
+
+    @ivar _pool: A thread pool with exactly one thread.
+    """
+
+    _path = attr.ib(type=str)
+    _reactor = attr.ib(type=IReactorThreads)
+    _pool = attr.ib(type=ThreadPool)
+    _connection = attr.ib(
+        type=Optional[sqlite3.Connection], default=None, init=False
+    )
+
+    @classmethod
+    def open(cls, path: str, reactor: IReactorThreads) -> "_ThreadedConnection":
+        """
+        Create a L{_ThreadedConnection} to the database at C{path} and start
+        its thread pool.
+        """
+        pool = ThreadPool(minthreads=1, maxthreads=1, name="klein-sqlite")
+        pool.start()
+        return cls(path, reactor, pool)
+
+    def _inThread(self, work: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run C{work} in a transaction, opening the connection first if this is
+        the first piece of work.
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path)
+        with self._connection:
+            return work(self._connection)
+
+    def runWithConnection(
+        self, work: Callable[[sqlite3.Connection], Any]
+    ) -> Deferred:
+        """
+        Run C{work} in a transaction in the database thread.
+
+        @return: a L{Deferred} firing with the result of C{work}.
+        """
+        return deferToThreadPool(
+            self._reactor, self._pool, self._inThread, work
+        )
+
+    def close(self) -> Deferred:
+        """
+        Close the connection and stop the thread pool.  Closing an
+        already-closed connection does nothing.
+        """
+        if not self._pool.started:
+            return succeed(None)
+
+        def closeConnection() -> None:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+        d = deferToThreadPool(self._reactor, self._pool, closeConnection)
+        d.addBoth(lambda result: (self._pool.stop(), result)[1])
+        return d
+
+
+@implementer(ISessionStore)
+@attr.s
+class SQLiteSessionStore:
+    """
+    An L{ISessionStore} which persists sessions, including their
+    L{Componentized} data, to an SQLite database, so that they survive
+    restarts of the process.
+
+    Create one with L{SQLiteSessionStore.open}.
+
+    Sessions are L{MemorySession} objects, authorized by an
+    C{authorizationCallback} exactly as with a
+    L{klein.storage.memory.MemorySessionStore}.  The data of a session is
+    pickled, so any components you set on it must be picklable.
+
+    To keep database work off the request path:
+
+        - queries run in a dedicated database thread,
+
+        - recently-used sessions are kept in an in-process cache of up to
+          C{cacheSize} sessions, so loading them needs no query, and
+
+        - writes are buffered for C{flushDelay} seconds and then written
+          together in a single transaction.  Call
+          L{SQLiteSessionStore.saveSession} after modifying a session's data
+          to have it written back, and L{SQLiteSessionStore.close} (or
+          L{SQLiteSessionStore.flush}) before shutting down to avoid losing
+          buffered writes.  A store created with L{SQLiteSessionStore.open}
+          does so itself when its reactor shuts down, if it has not been
+          closed already.
+
+    @ivar maxAge: The maximum lifetime of a session, in seconds, or L{None}.
+    """
+
+    _connection = attr.ib(type=_ThreadedConnection)
+    authorizationCallback = attr.ib(type=_authFn, default=_noAuthorization)
+    maxAge = attr.ib(type=Optional[float], default=None, kw_only=True)
+    cacheSize = attr.ib(type=int, default=1000, kw_only=True)
+    flushDelay = attr.ib(type=float, default=0.1, kw_only=True)
+    _clock = attr.ib(type=Any, default=Factory(_defaultClock), kw_only=True)
+    _cache = attr.ib(
+        type="OrderedDict[_SessionKey, Tuple[MemorySession, float]]",
+        default=Factory(OrderedDict),
+        init=False,
+        repr=False,
+    )
+    _pendingWrites = attr.ib(
+        type=Dict[_SessionKey, Tuple[MemorySession, float]],
+        default=Factory(dict),
+        init=False,
+        repr=False,
+    )
+    _flushCall = attr.ib(
+        type=Optional[IDelayedCall], default=None, init=False, repr=False
+    )
+    _shutdownTrigger = attr.ib(
+        type=Optional[Tuple[IReactorCore, Any]],
+        default=None,
+        init=False,
+        repr=False,
+    )
+
+    def __attrs_post_init__(self) -> None:
+        # The database thread runs work in order, so the schema is created
+        # before any other query runs.
+        self._connection.runWithConnection(_createSchema).addErrback(
+            log.err, "Could not create the klein session schema."
+        )
+
+    @classmethod
+    def open(
+        cls,
+        path: str = ":memory:",
+        authorizers: Iterable[_MemoryAuthorizerFunction] = (),
+        reactor: Optional[IReactorThreads] = None,
+        **kw: Any,
+    ) -> "SQLiteSessionStore":
+        """
+        Open a session store backed by the SQLite database at C{path}.
+
+        @param path: The path of the database file, or C{":memory:"} for a
+            database that lasts only as long as the store.
+
+        @param authorizers: Callbacks decorated with
+            L{klein.storage.memory.declareMemoryAuthorizer} which authorize
+            interfaces for sessions in this store.
+
+        @param reactor: The reactor to use for threads and timing; by default,
+            the global reactor.
+
+        @param kw: Additional keyword arguments, such as C{maxAge}, to pass
+            along to L{SQLiteSessionStore}.
+        """
+        if reactor is None:
+            reactor = cast(IReactorThreads, _defaultClock())
+        kw.setdefault("clock", reactor)
+        store = cls(
+            _ThreadedConnection.open(path, reactor),
+            _authorizerTable(authorizers),
+            **kw,
+        )
+        # Like adbapi.ConnectionPool, don't let the database thread keep the
+        # process alive, or buffered writes be lost, when the reactor stops.
+        core = cast(IReactorCore, reactor)
+        store._shutdownTrigger = (
+            core,
+            core.addSystemEventTrigger("during", "shutdown", store._shutdown),
+        )
+        return store
+
+    def _remember(
+        self, key: _SessionKey, session: MemorySession, expires: float
+    ) -> None:
+        """
+        Add a session to the cache, evicting the least-recently-used session
+        if the cache is full.
+        """
+        self._cache[key] = (session, expires)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cacheSize:
+            self._cache.popitem(last=False)
+
+    def _expiry(self) -> float:
+        """
+        Compute the expiry time for a session created now.
+        """
+        if self.maxAge is None:
+            return float("inf")
+        return self._clock.seconds() + self.maxAge
+
+    def saveSession(self, session: MemorySession) -> None:
+        """
+        Arrange for C{session}, and its current data, to be written to the
+        database with the next batch of writes.
+        """
+        key = (session.isConfidential, session.identifier)
+        cached = self._cache.get(key)
+        expires = self._expiry() if cached is None else cached[1]
+        self._pendingWrites[key] = (session, expires)
+        if self._flushCall is None:
+            self._flushCall = self._clock.callLater(
+                self.flushDelay, self._scheduledFlush
+            )
+
+    def _scheduledFlush(self) -> None:
+        """
+        Flush the buffered writes after C{flushDelay}, logging any failure,
+        since nothing else is waiting on the result.
+        """
+        self.flush().addErrback(
+            log.err, "Could not write klein sessions to the database."
+        )
+
+    def flush(self) -> Deferred:
+        """
+        Write all buffered sessions to the database in a single transaction.
+
+        @return: a L{Deferred} that fires when the sessions are written.
+        """
+        if self._flushCall is not None:
+            if self._flushCall.active():
+                self._flushCall.cancel()
+            self._flushCall = None
+        rows: List[_SessionRow] = [
+            (
+                session.identifier,
+                int(session.isConfidential),
+                session.authenticatedBy.name,
+                None if expires == float("inf") else expires,
+                pickle.dumps(session._components),
+            )
+            for session, expires in self._pendingWrites.values()
+        ]
+        self._pendingWrites.clear()
+        if not rows:
+            return succeed(None)
+
+        def write(connection: sqlite3.Connection) -> None:
+            connection.executemany(
+                "INSERT OR REPLACE INTO klein_session "
+                "(identifier, confidential, mechanism, expires, components) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+        return self._connection.runWithConnection(write)
+
+    def newSession(
+        self, isConfidential: bool, authenticatedBy: SessionMechanism
+    ) -> Deferred:
+        identifier = hexlify(urandom(32)).decode("ascii")
+        session = MemorySession(
+            identifier,
+            isConfidential,
+            authenticatedBy,
+            self.authorizationCallback,
+        )
+        self._remember((isConfidential, identifier), session, self._expiry())
+        self.saveSession(session)
+        return succeed(session)
+
+    def loadSession(
+        self,
+        identifier: str,
+        isConfidential: bool,
+        authenticatedBy: SessionMechanism,
+    ) -> Deferred:
+        key = (isConfidential, identifier)
+        now = self._clock.seconds()
+        cached = self._cache.get(key) or self._pendingWrites.get(key)
+        if cached is not None:
+            session, expires = cached
+            if now < expires:
+                self._remember(key, session, expires)
+                return succeed(session)
+            return self._noSuchSession(identifier)
+
+        def read(connection: sqlite3.Connection) -> Optional[Tuple]:
+            return cast(
+                Optional[Tuple],
+                connection.execute(
+                    "SELECT mechanism, expires, components FROM klein_session "
+                    "WHERE identifier = ? AND confidential = ? "
+                    "AND (expires IS NULL OR expires > ?)",
+                    (identifier, int(isConfidential), now),
+                ).fetchone(),
+            )
+
+        def loaded(row: Optional[Tuple]) -> Any:
+            if row is None:
+                return self._noSuchSession(identifier)
+            mechanism, expires, components = row
+            session = MemorySession(
+                identifier,
+                isConfidential,
+                SessionMechanism.lookupByName(mechanism),
+                self.authorizationCallback,
+                pickle.loads(components),
+            )
+            self._remember(
+                key, session, float("inf") if expires is None else expires
+            )
+            return session
+
+        return self._connection.runWithConnection(read).addCallback(loaded)
+
+    def _noSuchSession(self, identifier: str) -> Deferred:
+        return fail(
+            NoSuchSession(
+                "Session not found in SQLite store {id!r}".format(id=identifier)
+            )
+        )
+
+    def sentInsecurely(self, tokens: Iterable[str]) -> None:
+        return
+
+    def expireSessions(self) -> Deferred:
+        """
+        Delete all sessions whose maximum age has passed from the database.
+
+        @return: a L{Deferred} firing with the number of sessions deleted.
+        """
+        now = self._clock.seconds()
+        for key, (session, expires) in list(self._cache.items()):
+            if expires <= now:
+                del self._cache[key]
+
+        def delete(connection: sqlite3.Connection) -> int:
+            return connection.execute(
+                "DELETE FROM klein_session WHERE expires <= ?", (now,)
+            ).rowcount
+
+        return self._connection.runWithConnection(delete)
+
+    def _shutdown(self) -> Deferred:
+        """
+        Close this store as the reactor shuts down; the system event trigger
+        which calls this has already been removed by firing it.
+        """
+        self._shutdownTrigger = None
+        return self.close()
+
+    def close(self) -> Deferred:
+        """
+        Write any buffered sessions to the database, then close it.
+
+        @return: a L{Deferred} that fires when the database is closed.
+        """
+        if self._shutdownTrigger is not None:
+            reactor, trigger = self._shutdownTrigger
+            self._shutdownTrigger = None
+            reactor.removeSystemEventTrigger(trigger)
+        d = self.flush()
+        d.addBoth(lambda result: self._connection.close())
+        return d
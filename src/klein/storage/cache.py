@@ -0,0 +1,6 @@
+from ._cache import AuthorizationCache, AuthorizationCachingStore
+
+__all__ = [
+    "AuthorizationCache",
+    "AuthorizationCachingStore",
+]
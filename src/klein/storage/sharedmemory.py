@@ -0,0 +1,6 @@
+from ._sharedmemory import SessionStoreFull, SharedMemorySessionStore
+
+__all__ = [
+    "SessionStoreFull",
+    "SharedMemorySessionStore",
+]
@@ -0,0 +1,5 @@
+from ._sqlite import SQLiteSessionStore
+
+__all__ = [
+    "SQLiteSessionStore",
+]
@@ -0,0 +1,176 @@
+"""
+Tests for L{klein.storage.cache}.
+"""
+
+from typing import Any, List
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from zope.interface import Interface, alsoProvides
+from zope.interface.verify import verifyObject
+
+from klein.interfaces import ISession, ISessionStore, SessionMechanism
+from klein.storage.cache import AuthorizationCache, AuthorizationCachingStore
+from klein.storage.memory import MemorySessionStore, declareMemoryAuthorizer
+from klein.storage.sharedmemory import SharedMemorySessionStore
+
+
+class IFoo(Interface):
+    """
+    Testing interface 1.
+    """
+
+
+class IBar(Interface):
+    """
+    Testing interface 2.
+    """
+
+
+class CachingStoreTests(SynchronousTestCase):
+    """
+    Tests for L{AuthorizationCachingStore}.
+    """
+
+    def setUp(self) -> None:
+        self.calls: List[Any] = []
+        self.clock = Clock()
+
+        @declareMemoryAuthorizer(IFoo)
+        def fooMe(interface: Any, session: Any, componentized: Any) -> int:
+            self.calls.append(interface)
+            return 1
+
+        @declareMemoryAuthorizer(IBar)
+        def barMe(interface: Any, session: Any, componentized: Any) -> None:
+            self.calls.append(interface)
+            return None
+
+        self.memory = MemorySessionStore.fromAuthorizers([fooMe, barMe])
+        self.cache = AuthorizationCache(ttl=10, clock=self.clock)
+
+    def load(self, store: AuthorizationCachingStore, identifier: str) -> Any:
+        """
+        Load the session identified by C{identifier} from C{store}, as a new
+        request would.
+        """
+        return self.successResultOf(
+            store.loadSession(identifier, True, SessionMechanism.Header)
+        )
+
+    def test_interfaceCompliance(self) -> None:
+        """
+        Verify that the store and its sessions comply with the relevant
+        interfaces.
+        """
+        store = AuthorizationCachingStore(self.memory)
+        verifyObject(ISessionStore, store)
+        verifyObject(
+            ISession,
+            self.successResultOf(
+                store.newSession(True, SessionMechanism.Header)
+            ),
+        )
+
+    def test_wrappedSession(self) -> None:
+        """
+        A L{CachingSession} passes component lookups and its data through to
+        the session it wraps, which L{AuthorizationCachingStore.saveSession}
+        saves with the wrapped store.
+        """
+        path = self.mktemp()
+        shared = SharedMemorySessionStore.open(path, slots=8, clock=self.clock)
+        self.addCleanup(shared.close)
+        store = AuthorizationCachingStore(shared, self.cache)
+        session = self.successResultOf(
+            store.newSession(True, SessionMechanism.Header)
+        )
+        alsoProvides(session.session, IFoo)
+        self.assertIs(IFoo(session), session.session)
+        self.assertIs(ISession(session), session)
+        self.assertIsNone(IBar(session, None))
+
+        session._components.setComponent(IBar, "data")
+        store.saveSession(session)
+        other = SharedMemorySessionStore.open(path, clock=self.clock)
+        self.addCleanup(other.close)
+        loaded = self.successResultOf(
+            other.loadSession(session.identifier, True, SessionMechanism.Header)
+        )
+        self.assertEqual(loaded._components.getComponent(IBar), "data")
+
+    def test_perRequestMemo(self) -> None:
+        """
+        Without a shared cache, a session authorizes each interface only once
+        per load, including interfaces it is not authorized for.
+        """
+        store = AuthorizationCachingStore(self.memory)
+        session = self.successResultOf(
+            store.newSession(True, SessionMechanism.Header)
+        )
+        for _ in range(2):
+            self.assertEqual(
+                self.successResultOf(session.authorize([IFoo, IBar])),
+                {IFoo: 1},
+            )
+        self.assertEqual(self.calls, [IFoo, IBar])
+
+        again = self.load(store, session.identifier)
+        self.successResultOf(again.authorize([IFoo]))
+        self.assertEqual(self.calls, [IFoo, IBar, IFoo])
+
+    def test_sharedCache(self) -> None:
+        """
+        With an L{AuthorizationCache}, results are shared between loads of
+        the same session until they expire.
+        """
+        store = AuthorizationCachingStore(self.memory, self.cache)
+        session = self.successResultOf(
+            store.newSession(True, SessionMechanism.Header)
+        )
+        self.successResultOf(session.authorize([IFoo, IBar]))
+        self.assertEqual(
+            self.successResultOf(
+                self.load(store, session.identifier).authorize([IFoo, IBar])
+            ),
+            {IFoo: 1},
+        )
+        self.assertEqual(self.calls, [IFoo, IBar])
+        self.clock.advance(10)
+        self.successResultOf(
+            self.load(store, session.identifier).authorize([IFoo])
+        )
+        self.assertEqual(self.calls, [IFoo, IBar, IFoo])
+
+    def test_invalidate(self) -> None:
+        """
+        L{AuthorizationCache.invalidate} forgets the cached results for the
+        given interfaces of a session, or all of them.
+        """
+        store = AuthorizationCachingStore(self.memory, self.cache)
+        session = self.successResultOf(
+            store.newSession(True, SessionMechanism.Header)
+        )
+        self.successResultOf(session.authorize([IFoo, IBar]))
+        self.cache.invalidate(session.identifier, [IBar])
+        self.successResultOf(
+            self.load(store, session.identifier).authorize([IFoo, IBar])
+        )
+        self.assertEqual(self.calls, [IFoo, IBar, IBar])
+        self.cache.invalidate(session.identifier)
+        self.successResultOf(
+            self.load(store, session.identifier).authorize([IFoo, IBar])
+        )
+        self.assertEqual(self.calls, [IFoo, IBar, IBar, IFoo, IBar])
+
+    def test_maxEntries(self) -> None:
+        """
+        L{AuthorizationCache} discards the least-recently-used result when it
+        holds more than C{maxEntries}.
+        """
+        cache = AuthorizationCache(maxEntries=1, clock=self.clock)
+        cache.put("a", IFoo, 1)
+        cache.put("a", IBar, 2)
+        self.assertEqual(cache.get("a", IBar), 2)
+        self.assertIsNot(cache.get("a", IFoo), 1)
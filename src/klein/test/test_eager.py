@@ -0,0 +1,100 @@
+"""
+Tests for L{klein._eager}.
+"""
+
+from typing import Any, Generator
+
+from twisted.internet.defer import CancelledError, Deferred, fail, succeed
+from twisted.trial.unittest import SynchronousTestCase
+
+from .._eager import eagerly
+
+
+@eagerly
+def addAll(*values: Any) -> Generator:
+    """
+    Add together the results of all the given values, some of which may be
+    L{Deferred}s.
+    """
+    total = 0
+    for value in values:
+        total += yield value
+    return total
+
+
+class EagerlyTests(SynchronousTestCase):
+    """
+    Tests for L{eagerly}.
+    """
+
+    def test_synchronous(self) -> None:
+        """
+        A generator which only yields values, or L{Deferred}s which have
+        already fired, runs to completion immediately and its result is
+        returned directly.
+        """
+        self.assertEqual(addAll(1, succeed(2), 3), 6)
+
+    def test_synchronousFailure(self) -> None:
+        """
+        An exception raised by the generator, or the failure of a L{Deferred}
+        which has already fired, is raised directly if the generator never
+        had to wait.
+        """
+        self.assertRaises(
+            ZeroDivisionError, addAll, 1, fail(ZeroDivisionError())
+        )
+        self.assertRaises(TypeError, addAll, 1, "two")
+
+    def test_caughtFailure(self) -> None:
+        """
+        The failure of a yielded L{Deferred} is raised inside the generator,
+        where it may be caught.
+        """
+
+        @eagerly
+        def recover() -> Generator:
+            try:
+                yield fail(ZeroDivisionError())
+            except ZeroDivisionError:
+                return "recovered"
+
+        self.assertEqual(recover(), "recovered")
+
+    def test_suspended(self) -> None:
+        """
+        If the generator yields a L{Deferred} which has not fired, a
+        L{Deferred} is returned which fires with the generator's result once
+        it finishes.
+        """
+        first: Deferred = Deferred()
+        second: Deferred = Deferred()
+        d = addAll(1, first, second, succeed(4))
+        self.assertIsInstance(d, Deferred)
+        self.assertNoResult(d)
+        first.callback(2)
+        self.assertNoResult(d)
+        second.callback(3)
+        self.assertEqual(self.successResultOf(d), 10)
+
+    def test_suspendedFailure(self) -> None:
+        """
+        If the generator fails after waiting, the returned L{Deferred} fails.
+        """
+        waiting: Deferred = Deferred()
+        d = addAll(1, waiting, "three")
+        waiting.callback(2)
+        self.failureResultOf(d, TypeError)
+
+    def test_cancel(self) -> None:
+        """
+        Cancelling the returned L{Deferred} cancels the L{Deferred} that the
+        generator is waiting for, and the resulting failure is raised inside
+        the generator.
+        """
+        cancelled = []
+        waiting: Deferred = Deferred(cancelled.append)
+        d = addAll(1, waiting, 3)
+        d.cancel()
+        self.assertEqual(cancelled, [waiting])
+        self.failureResultOf(d, CancelledError)
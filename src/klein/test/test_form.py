@@ -1,4 +1,4 @@
-from typing import Any, List, Tuple, cast
+from typing import Any, Iterable, List, Optional, Tuple, cast
 from xml.etree import ElementTree
 
 import attr
@@ -7,22 +7,49 @@ from treq import content
 from treq.testing import StubTreq
 
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import Clock
 from twisted.python.compat import nativeString
+from twisted.python.components import Componentized
 from twisted.trial.unittest import SynchronousTestCase
 from twisted.web.iweb import IRequest
-from twisted.web.template import Element, TagLoader, renderer, tags
+from twisted.web.template import (
+    Element,
+    Tag,
+    TagLoader,
+    flattenString,
+    renderer,
+    tags,
+)
 
-from klein import Field, Form, Klein, RenderableForm, Requirer, SessionProcurer
+from klein import (
+    Field,
+    FieldValues,
+    Form,
+    Klein,
+    RenderableForm,
+    Requirer,
+    SessionProcurer,
+    SignedCSRFTokens,
+)
 from klein.interfaces import (
+    EarlyExit,
+    ICSRFTokens,
     ISession,
     ISessionStore,
     NoSuchSession,
     SessionMechanism,
     ValidationError,
+    ValueAbsent,
 )
 from klein.storage.memory import MemorySessionStore
 
-from .._form import textConverter
+from .._form import (
+    IForm,
+    IValidationFailureHandler,
+    ParsedBody,
+    textConverter,
+)
+from .test_resource import requestMock
 
 
 class DanglingField(Field):
@@ -39,6 +66,7 @@ class DanglingField(Field):
 class TestObject:
     sessionStore = attr.ib(type=ISessionStore)
     calls = attr.ib(attr.Factory(list), type=List)
+    csrfTokens = attr.ib(type=Optional[ICSRFTokens], default=None)
 
     router = Klein()
     requirer = Requirer()
@@ -49,7 +77,9 @@ class TestObject:
         try:
             yield (
                 SessionProcurer(
-                    self.sessionStore, secureTokenHeader=b"X-Test-Session"
+                    self.sessionStore,
+                    secureTokenHeader=b"X-Test-Session",
+                    csrfTokens=self.csrfTokens,
                 ).procureSession(request)
             )
         except NoSuchSession:
@@ -463,6 +493,110 @@ class TestForms(SynchronousTestCase):
         self.assertEqual(self.successResultOf(content(response)), b"yay")
         self.assertEqual(to.calls, [("hello", 1234)])
 
+    def test_compiledValidation(self) -> None:
+        """
+        L{Form.populateRequestValues} validates every field in one pass,
+        converting present values, using defaults for absent optional ones,
+        and recording errors for absent required ones, and respects
+        L{Field} subclasses which override C{extractValue} or
+        C{validateValue}.
+        """
+
+        class Shouting(Field):
+            def validateValue(self, value: Any) -> Any:
+                return super().validateValue(value).upper()
+
+        class Constant(Field):
+            def extractValue(self, request: IRequest) -> Any:
+                return "constant"
+
+        fields = [
+            Field.number(kind=int).maybeNamed("count"),
+            Field.text(required=False, default="dflt").maybeNamed("optional"),
+            Field.text().maybeNamed("absent"),
+            Shouting(textConverter, "text").maybeNamed("shout"),
+            Constant(textConverter, "text").maybeNamed("constant"),
+            Field.number(maximum=3).maybeNamed("big"),
+        ]
+        failures: List[FieldValues] = []
+
+        def failed(request: IRequest, values: FieldValues) -> str:
+            failures.append(values)
+            return "failed"
+
+        components = Componentized()
+        components.setComponent(IValidationFailureHandler, failed)
+        request = requestMock(b"/?count=3&shout=hi&constant=no&big=4")
+        form = Form(fields)
+        exit = self.assertRaises(
+            EarlyExit, form.populateRequestValues, components, None, request
+        )
+        self.assertEqual(exit.alternateReturnValue, "failed")
+        [values] = failures
+        self.assertEqual(
+            values.arguments,
+            {
+                "count": 3,
+                "optional": "dflt",
+                "shout": "HI",
+                "constant": "constant",
+            },
+        )
+        self.assertEqual(
+            {
+                field.pythonArgumentName: error.message
+                for field, error in values.validationErrors.items()
+            },
+            {
+                "absent": "a value was required but none was supplied",
+                "big": "value must be <=3",
+            },
+        )
+        self.assertIsInstance(values.validationErrors[fields[2]], ValueAbsent)
+
+    def test_jsonParsedOnce(self) -> None:
+        """
+        A JSON request body is parsed only once, however many fields look up
+        their values in it.
+        """
+        request = requestMock(
+            b"/",
+            method=b"POST",
+            body=b'{"name": "hello", "value": 1}',
+            headers={b"content-type": [b"application/json"]},
+        )
+        body = ParsedBody.fromRequest(request)
+        self.assertEqual(body.json, {"name": "hello", "value": 1})
+        request.content = None
+        self.assertIs(ParsedBody.fromRequest(request), body)
+        self.assertEqual(
+            Field.text().maybeNamed("name").extractValue(request), "hello"
+        )
+        self.assertIs(body.lookup("missing", b"missing"), None)
+
+    def test_jsonBodyTooLarge(self) -> None:
+        """
+        A JSON request body larger than the form's C{maxJSONBodySize} is
+        rejected with a 413 status.
+        """
+        mem = MemorySessionStore()
+        session = self.successResultOf(
+            mem.newSession(True, SessionMechanism.Header)
+        )
+        to = TestObject(mem)
+        form = IForm(to.handler.injectionComponents)
+        self.patch(form, "maxJSONBodySize", 10)
+        stub = StubTreq(to.router.resource())
+        response = self.successResultOf(
+            stub.post(
+                "https://localhost/handle",
+                json=dict(name="hello", value="1234"),
+                headers={"X-Test-Session": session.identifier},
+            )
+        )
+        self.assertEqual(response.code, 413)
+        self.assertEqual(to.calls, [])
+
     def test_missingOptionalParameterJSON(self) -> None:
         """
         If a required Field is missing from the JSON body, its default value is
@@ -622,6 +756,110 @@ class TestForms(SynchronousTestCase):
         )
         self.assertEqual(protectionField[0].attrib["value"], session.identifier)
 
+    def test_renderingCachedMarkup(self) -> None:
+        """
+        A form's markup is built only once for each method, enctype and
+        encoding, and each rendering fills in its own CSRF token and field
+        values and errors.
+        """
+        mem = MemorySessionStore()
+        one = self.successResultOf(
+            mem.newSession(True, SessionMechanism.Cookie)
+        )
+        two = self.successResultOf(
+            mem.newSession(True, SessionMechanism.Cookie)
+        )
+        name = Field.text().maybeNamed("name")
+        form = Form([name])
+
+        def render(
+            session: ISession, method: str = "POST", **kw: Any
+        ) -> ElementTree.Element:
+            renderable = RenderableForm(
+                form, session, "/act", method, "enctype", "utf-8", **kw
+            )
+            return ElementTree.fromstring(
+                self.successResultOf(flattenString(None, renderable))
+            )
+
+        first = render(one, prevalidationValues={name: "<first>"})
+        [template] = form.templates.values()
+        second = render(
+            two, validationErrors={name: ValidationError("bad name")}
+        )
+        self.assertEqual(list(form.templates.values()), [template])
+
+        def summary(dom: ElementTree.Element) -> Tuple[Any, ...]:
+            return (
+                dom.find(".//*[@name='name']").attrib["value"],
+                [error.text for error in dom.iter("div")],
+                dom.find(".//*[@name='__csrf_protection__']").attrib["value"],
+            )
+
+        self.assertEqual(summary(first), ("<first>", [], one.identifier))
+        self.assertEqual(summary(second), ("", ["bad name"], two.identifier))
+        getForm = render(one, method="GET")
+        self.assertEqual(len(form.templates), 2)
+        self.assertEqual(
+            getForm.findall(".//*[@name='__csrf_protection__']"), []
+        )
+
+    def test_renderingCachedMarkupAction(self) -> None:
+        """
+        A form's markup is shared between renderings with different actions,
+        such as those of forms re-rendered at the URLs they were posted to,
+        and each rendering has its own action.
+        """
+        mem = MemorySessionStore()
+        session = self.successResultOf(
+            mem.newSession(True, SessionMechanism.Cookie)
+        )
+        form = Form([Field.text().maybeNamed("name")])
+        for number in range(10):
+            action = f"/items/{number}"
+            renderable = RenderableForm(
+                form, session, action, "POST", "enctype", "utf-8"
+            )
+            dom = ElementTree.fromstring(
+                self.successResultOf(flattenString(None, renderable))
+            )
+            self.assertEqual(dom.attrib["action"], action)
+            self.assertEqual(len(form.templates), 1)
+
+    def test_renderingCustomTags(self) -> None:
+        """
+        A L{Field} subclass which overrides C{asTags} is rendered with its own
+        markup, including its value and error, each time the form is.
+        """
+
+        class TextArea(Field):
+            def asTags(self) -> Iterable[Tag]:
+                yield tags.textarea(name=self.formFieldName)(
+                    self.value, self.error.message if self.error else ""
+                )
+
+        mem = MemorySessionStore()
+        session = self.successResultOf(
+            mem.newSession(True, SessionMechanism.Cookie)
+        )
+        area = TextArea(textConverter, "text").maybeNamed("area")
+        form = Form([area])
+
+        def render(**kw: Any) -> ElementTree.Element:
+            renderable = RenderableForm(
+                form, session, "/act", "POST", "enctype", "utf-8", **kw
+            )
+            return ElementTree.fromstring(
+                self.successResultOf(flattenString(None, renderable))
+            )
+
+        first = render(prevalidationValues={area: "one "})
+        second = render(validationErrors={area: ValidationError("bad")})
+        self.assertEqual(len(form.templates), 1)
+        self.assertEqual(first.find(".//textarea").text, "one ")
+        self.assertEqual(second.find(".//textarea").text, "bad")
+        self.assertEqual(second.findall(".//input[@name='area']"), [])
+
     def test_renderLookupError(self) -> None:
         """
         RenderableForm raises L{MissingRenderMethod} if anything attempts to
@@ -736,6 +974,73 @@ class TestForms(SynchronousTestCase):
         self.assertEqual(response.code, 403)
         self.assertIn(b"CSRF", self.successResultOf(content(response)))
 
+    def test_signedTokens(self) -> None:
+        """
+        L{SignedCSRFTokens} issues tokens which are valid only for the session
+        they were issued to, and only for C{maxAge} seconds.
+        """
+        clock = Clock()
+        tokens = SignedCSRFTokens(b"secret", maxAge=100, clock=clock)
+        mem = MemorySessionStore()
+        one = self.successResultOf(
+            mem.newSession(True, SessionMechanism.Cookie)
+        )
+        two = self.successResultOf(
+            mem.newSession(True, SessionMechanism.Cookie)
+        )
+        token = tokens.tokenFor(one)
+        self.assertNotIn(one.identifier, token)
+        self.assertTrue(tokens.isValid(one, token))
+        self.assertFalse(tokens.isValid(two, token))
+        self.assertFalse(
+            SignedCSRFTokens(b"other", clock=clock).isValid(one, token)
+        )
+        for bad in [
+            "",
+            one.identifier,
+            "nonsense.",
+            token + "\N{SNOWMAN}",
+            "\N{SUPERSCRIPT TWO}." + token.partition(".")[2],
+        ]:
+            self.assertFalse(tokens.isValid(one, bad))
+        clock.advance(100)
+        self.assertFalse(tokens.isValid(one, token))
+
+    def test_cookieWithSignedToken(self) -> None:
+        """
+        A form rendered for a procurer with C{csrfTokens} includes a signed
+        token, which protects the form in place of the session identifier.
+        """
+        mem = MemorySessionStore()
+        tokens = SignedCSRFTokens(b"secret")
+        to = TestObject(mem, csrfTokens=tokens)
+        stub = StubTreq(to.router.resource())
+        response = self.successResultOf(stub.get("https://localhost/render"))
+        cookie = response.cookies()["Klein-Secure-Session"]
+        [field] = ElementTree.fromstring(
+            self.successResultOf(content(response))
+        ).findall(".//*[@name='__csrf_protection__']")
+        token = field.attrib["value"]
+        self.assertNotEqual(token, cookie)
+
+        def post(token: str) -> Any:
+            return self.successResultOf(
+                stub.post(
+                    "https://localhost/handle",
+                    data=dict(
+                        name="hello", value="1", __csrf_protection__=token
+                    ),
+                    cookies={"Klein-Secure-Session": cookie},
+                )
+            )
+
+        self.assertEqual(post(cookie).code, 403)
+        for malformed in ["\N{SUPERSCRIPT TWO}.abc", "9" * 5000 + ".abc"]:
+            self.assertEqual(post(malformed).code, 403)
+        self.assertEqual(to.calls, [])
+        self.assertEqual(post(token).code, 200)
+        self.assertEqual(to.calls, [("hello", 1)])
+
     def test_cookieWithToken(self) -> None:
         """
         A cookie-authenticated, CRSF-protected form will call the form as
@@ -0,0 +1,174 @@
+"""
+Tests for L{klein._json}.
+"""
+
+import json
+
+from twisted.internet.defer import Deferred, succeed
+from twisted.trial.unittest import SynchronousTestCase
+
+from .test_resource import _render, requestMock
+from .. import Klein, StreamingJSON
+
+
+class StreamingJSONTests(SynchronousTestCase):
+    """
+    Tests for L{StreamingJSON}.
+    """
+
+    def test_route(self) -> None:
+        """
+        A L{StreamingJSON} returned from a route is written to the request as
+        JSON, formatted as L{json.dumps} formats it.
+        """
+        value = {
+            "list": [1, 2.5, None, True, "text \N{SNOWMAN}"],
+            "tuple": (),
+            "empty": {},
+            3: {"nested": ["deep"]},
+        }
+        app = Klein()
+
+        @app.route("/")
+        def route(request):
+            return StreamingJSON(value)
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(app.resource(), request))
+        self.assertEqual(
+            request.getWrittenData(), json.dumps(value).encode("utf-8")
+        )
+        request.setHeader.assert_any_call(b"content-type", b"application/json")
+
+    def test_deferred(self) -> None:
+        """
+        L{Deferred}s and coroutines within the value are waited on when
+        encoding reaches them, after the JSON before them has been written.
+        """
+
+        async def coroutine():
+            return ["from coroutine"]
+
+        waiting: Deferred = Deferred()
+        request = requestMock(b"/")
+        StreamingJSON(
+            {"ready": succeed(1), "waiting": waiting, "last": coroutine()}
+        ).render(request)
+        self.assertEqual(request.getWrittenData(), b'{"ready": 1, "waiting": ')
+        self.assertFalse(request.finished)
+
+        waiting.callback([2])
+        self.assertEqual(
+            request.getWrittenData(),
+            b'{"ready": 1, "waiting": [2], "last": ["from coroutine"]}',
+        )
+        self.assertTrue(request.finished)
+
+    def test_iterables(self) -> None:
+        """
+        Generators and asynchronous iterables are encoded as arrays, pulling
+        each item only as encoding reaches it.
+        """
+        waiting: Deferred = Deferred()
+        pulled = []
+
+        async def source():
+            pulled.append(1)
+            yield await waiting
+            pulled.append(2)
+            yield "last"
+
+        async def empty():
+            for item in []:
+                yield item
+
+        request = requestMock(b"/")
+        StreamingJSON(
+            {
+                "generator": (n for n in [1, succeed(2)]),
+                "source": source(),
+                "empty": [empty(), (n for n in [])],
+            }
+        ).render(request)
+        self.assertEqual(
+            request.getWrittenData(), b'{"generator": [1, 2], "source": '
+        )
+        self.assertEqual(pulled, [1])
+
+        waiting.callback("first")
+        self.assertEqual(
+            request.getWrittenData(),
+            b'{"generator": [1, 2], "source": ["first", "last"], '
+            b'"empty": [[], []]}',
+        )
+        self.assertEqual(pulled, [1, 2])
+
+    def test_default(self) -> None:
+        """
+        Objects which are not JSON serializable are passed to C{default}, and
+        its results are encoded in their place.
+        """
+        request = requestMock(b"/")
+        StreamingJSON([{1, 2}], sorted).render(request)
+        self.assertEqual(request.getWrittenData(), b"[[1, 2]]")
+
+    def test_backpressure(self) -> None:
+        """
+        No more JSON is written to the request while it has paused its
+        producer.
+        """
+        request = requestMock(b"/")
+        StreamingJSON(["a", "b", "c"], chunkSize=1).render(request)
+        # requestMock resumes the producer as soon as it's registered, so
+        # everything is written; now try again, pausing part way through.
+        self.assertEqual(request.getWrittenData(), b'["a", "b", "c"]')
+
+        waiting: Deferred = Deferred()
+        request = requestMock(b"/")
+        StreamingJSON([waiting, "b", "c"], chunkSize=1).render(request)
+        request.producer.pauseProducing()
+        waiting.callback("a")
+        self.assertEqual(request.getWrittenData(), b"[")
+        self.assertFalse(request.finished)
+
+        request.producer.resumeProducing()
+        self.assertEqual(request.getWrittenData(), b'["a", "b", "c"]')
+        self.assertTrue(request.finished)
+
+    def test_stopped(self) -> None:
+        """
+        Once the request stops its producer, because its connection was lost,
+        no more JSON is written to it.
+        """
+        waiting: Deferred = Deferred()
+        request = requestMock(b"/")
+        StreamingJSON([waiting, "b"], chunkSize=1).render(request)
+        request.producer.stopProducing()
+        waiting.callback("a")
+        self.assertEqual(request.getWrittenData(), b"[")
+        self.assertFalse(request.finished)
+
+    def test_failureBeforeWriting(self) -> None:
+        """
+        If encoding fails before anything has been written, the response has
+        a 500 status.
+        """
+        request = requestMock(b"/")
+        StreamingJSON({"unserializable": object()}).render(request)
+        self.assertEqual(len(self.flushLoggedErrors(TypeError)), 1)
+        request.setResponseCode.assert_called_with(500)
+        self.assertTrue(request.finished)
+
+    def test_failureAfterWriting(self) -> None:
+        """
+        If encoding fails after the response has begun, the connection is
+        closed so the client can tell that the response is incomplete.
+        """
+        waiting: Deferred = Deferred()
+        request = requestMock(b"/")
+        StreamingJSON([waiting]).render(request)
+        waiting.errback(ZeroDivisionError())
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+        self.assertEqual(request.getWrittenData(), b"[")
+        self.assertTrue(request.channel.transport.disconnected)
+        self.assertFalse(request.finished)
@@ -1,11 +1,17 @@
 from typing import Any
 
+from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
 
 from zope.interface import Interface
 from zope.interface.verify import verifyObject
 
-from klein.interfaces import ISession, ISessionStore, SessionMechanism
+from klein.interfaces import (
+    ISession,
+    ISessionStore,
+    NoSuchSession,
+    SessionMechanism,
+)
 from klein.storage.memory import MemorySessionStore, declareMemoryAuthorizer
 
 
@@ -75,3 +81,157 @@ class MemoryTests(SynchronousTestCase):
             self.successResultOf(session.authorize([IBar, IFoo])),
             {IFoo: 1, IBar: 2},
         )
+
+
+class MemoryExpiryTests(SynchronousTestCase):
+    """
+    Tests for bounding the lifetime and number of sessions in a
+    L{MemorySessionStore}.
+    """
+
+    def newSession(self, store: MemorySessionStore) -> ISession:
+        """
+        Create a new session in C{store}.
+        """
+        session: ISession = self.successResultOf(
+            store.newSession(True, SessionMechanism.Header)
+        )
+        return session
+
+    def assertLoads(self, store: MemorySessionStore, session: ISession) -> None:
+        """
+        C{session} can be loaded from C{store}.
+        """
+        self.assertIs(
+            self.successResultOf(
+                store.loadSession(
+                    session.identifier, True, SessionMechanism.Header
+                )
+            ),
+            session,
+        )
+
+    def assertNoSession(
+        self, store: MemorySessionStore, session: ISession
+    ) -> None:
+        """
+        C{session} can no longer be loaded from C{store}.
+        """
+        self.failureResultOf(
+            store.loadSession(
+                session.identifier, True, SessionMechanism.Header
+            ),
+            NoSuchSession,
+        )
+
+    def test_maxAge(self) -> None:
+        """
+        A session created in a store with a C{maxAge} cannot be loaded once
+        that many seconds have elapsed, even if it was loaded in the meantime.
+        """
+        clock = Clock()
+        store = MemorySessionStore(maxAge=10, clock=clock)
+        session = self.newSession(store)
+        clock.advance(9)
+        self.assertLoads(store, session)
+        clock.advance(1)
+        self.assertNoSession(store, session)
+
+    def test_idleTimeout(self) -> None:
+        """
+        A session in a store with an C{idleTimeout} expires if it is not loaded
+        for that many seconds; loading it extends its life.
+        """
+        clock = Clock()
+        store = MemorySessionStore(idleTimeout=10, clock=clock)
+        session = self.newSession(store)
+        for _ in range(3):
+            clock.advance(9)
+            self.assertLoads(store, session)
+        clock.advance(10)
+        self.assertNoSession(store, session)
+
+    def test_idleTimeoutBoundedByMaxAge(self) -> None:
+        """
+        Loading a session does not extend its life beyond C{maxAge}.
+        """
+        clock = Clock()
+        store = MemorySessionStore(maxAge=15, idleTimeout=10, clock=clock)
+        session = self.newSession(store)
+        clock.advance(9)
+        self.assertLoads(store, session)
+        clock.advance(6)
+        self.assertNoSession(store, session)
+
+    def test_maxSessions(self) -> None:
+        """
+        When creating a session would exceed C{maxSessions}, the
+        least-recently-used session is discarded.
+        """
+        store = MemorySessionStore(maxSessions=2, clock=Clock())
+        first = self.newSession(store)
+        second = self.newSession(store)
+        self.assertLoads(store, first)
+        third = self.newSession(store)
+        self.assertNoSession(store, second)
+        self.assertLoads(store, first)
+        self.assertLoads(store, third)
+
+    def test_maxSessionsBoundsExpiry(self) -> None:
+        """
+        The entries kept to expire sessions are bounded by C{maxSessions}, even
+        when many more sessions than that are created and evicted before any
+        of them expire.
+        """
+        store = MemorySessionStore(maxAge=3600, maxSessions=100, clock=Clock())
+        sessions = [self.newSession(store) for _ in range(10000)]
+        self.assertEqual(len(store._recency), 100)
+        self.assertLessEqual(len(store._expiryHeap), 2 * 100 + 16)
+        self.assertNoSession(store, sessions[0])
+        self.assertLoads(store, sessions[-1])
+
+    def test_expireSessions(self) -> None:
+        """
+        L{MemorySessionStore.expireSessions} forgets only those sessions whose
+        deadlines have passed, and reports how many there were.
+        """
+        clock = Clock()
+        store = MemorySessionStore(idleTimeout=10, clock=clock)
+        idle = self.newSession(store)
+        busy = self.newSession(store)
+        clock.advance(5)
+        self.assertLoads(store, busy)
+        clock.advance(5)
+        self.assertEqual(store.expireSessions(), 1)
+        self.assertEqual(store._secureStorage, {busy.identifier: busy})
+        self.assertNoSession(store, idle)
+        clock.advance(5)
+        self.assertEqual(store.expireSessions(), 1)
+        self.assertEqual(store._secureStorage, {})
+        self.assertEqual(store._expiryHeap, [])
+
+    def test_startExpiring(self) -> None:
+        """
+        L{MemorySessionStore.startExpiring} periodically expires sessions
+        using the store's clock until L{MemorySessionStore.stopExpiring} is
+        called.
+        """
+        clock = Clock()
+        store = MemorySessionStore(maxAge=10, clock=clock)
+        store.startExpiring(30)
+        self.newSession(store)
+        clock.advance(30)
+        self.assertEqual(store._secureStorage, {})
+        self.newSession(store)
+        store.stopExpiring()
+        clock.advance(30)
+        self.assertEqual(len(store._secureStorage), 1)
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+    def test_fromAuthorizersOptions(self) -> None:
+        """
+        L{MemorySessionStore.fromAuthorizers} passes additional keyword
+        arguments along to L{MemorySessionStore}.
+        """
+        store = MemorySessionStore.fromAuthorizers([], maxSessions=5)
+        self.assertEqual(store.maxSessions, 5)
@@ -0,0 +1,206 @@
+"""
+Tests for L{klein._metrics}.
+"""
+
+from typing import List
+
+from twisted.internet.defer import Deferred
+from twisted.trial.unittest import SynchronousTestCase
+
+from zope.interface.verify import verifyObject
+
+from .test_resource import _render, requestMock
+from .. import Klein, LatencyHistogram, PrometheusResource, RouteMetrics
+from .. import _metrics
+from ..interfaces import IRouteMetrics
+
+
+class LatencyHistogramTests(SynchronousTestCase):
+    """
+    Tests for L{LatencyHistogram}.
+    """
+
+    def test_bounds(self) -> None:
+        """
+        The bounds of the buckets grow geometrically from C{lowest} until they
+        cover C{highest}.
+        """
+        histogram = LatencyHistogram(lowest=1.0, highest=4.0)
+        self.assertEqual(histogram.bounds, [2 ** (i / 4) for i in range(9)])
+        self.assertEqual(len(histogram.counts), 10)
+
+    def test_record(self) -> None:
+        """
+        Each duration is counted in the first bucket whose bound is at least
+        as large as it, or the last, and added to the sum.
+        """
+        histogram = LatencyHistogram(
+            lowest=1.0, highest=2.0, bucketsPerDoubling=1
+        )
+        for duration in [0.5, 1.0, 1.5, 3.0]:
+            histogram.record(duration)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 6.0)
+
+    def test_quantile(self) -> None:
+        """
+        L{LatencyHistogram.quantile} estimates a quantile as the bound of the
+        bucket containing it.
+        """
+        histogram = LatencyHistogram(
+            lowest=1.0, highest=4.0, bucketsPerDoubling=1
+        )
+        self.assertIsNone(histogram.quantile(0.5))
+        for duration in [0.5, 1.5, 1.5, 3.0, 10.0]:
+            histogram.record(duration)
+        self.assertEqual(histogram.quantile(0), 1.0)
+        self.assertEqual(histogram.quantile(0.5), 2.0)
+        self.assertEqual(histogram.quantile(0.8), 4.0)
+        self.assertEqual(histogram.quantile(1), float("inf"))
+
+
+class RouteMetricsTests(SynchronousTestCase):
+    """
+    Tests for L{RouteMetrics} and the C{metrics} attribute of L{Klein}.
+    """
+
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.patch(_metrics, "perf_counter", lambda: self.now)
+        self.metrics = RouteMetrics()
+        self.app = Klein()
+        self.app.metrics = self.metrics
+        self.waiting: Deferred = Deferred()
+
+        @self.app.route("/wait")
+        def wait(request):
+            self.now += 1.0
+            return self.waiting
+
+        @self.app.route("/fail")
+        def failing(request):
+            1 / 0
+
+    def test_interface(self) -> None:
+        """
+        L{RouteMetrics} provides L{IRouteMetrics}.
+        """
+        self.assertTrue(verifyObject(IRouteMetrics, self.metrics))
+
+    def test_disabled(self) -> None:
+        """
+        By default, a L{Klein} has no C{metrics}.
+        """
+        self.assertIsNone(Klein().metrics)
+
+    def test_timing(self) -> None:
+        """
+        The time to match each request's route, the time until the route's
+        handler's result is ready, and the total time until the request
+        finishes are recorded by endpoint.
+        """
+        request = requestMock(b"/wait")
+        d = _render(self.app.resource(), request)
+        self.now += 2.0
+        self.waiting.callback(b"done")
+        self.successResultOf(d)
+
+        [(endpoint, metrics)] = self.metrics.endpoints.items()
+        self.assertEqual(endpoint, "wait")
+        self.assertEqual((metrics.requests, metrics.failures), (1, 0))
+        self.assertEqual(metrics.matchTime.sum, 0.0)
+        self.assertEqual(metrics.handlerTime.sum, 3.0)
+        self.assertEqual(metrics.totalTime.sum, 3.0)
+
+    def test_failures(self) -> None:
+        """
+        Requests which fail, including those which match no route, are
+        counted as failures; those which match no route are recorded without
+        an endpoint or a handler time.
+        """
+        for path in [b"/fail", b"/missing"]:
+            request = requestMock(path)
+            self.successResultOf(_render(self.app.resource(), request))
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+
+        failing = self.metrics.endpoints["failing"]
+        self.assertEqual((failing.requests, failing.failures), (1, 1))
+        self.assertEqual(failing.handlerTime.count, 1)
+        missing = self.metrics.endpoints[None]
+        self.assertEqual((missing.requests, missing.failures), (1, 1))
+        self.assertEqual(missing.handlerTime.count, 0)
+        self.assertEqual(missing.totalTime.count, 1)
+
+    def test_bound(self) -> None:
+        """
+        A L{Klein} bound to an instance records its requests to the same
+        C{metrics}.
+        """
+
+        class Application:
+            app = self.app
+
+        self.assertIs(Application().app.metrics, self.metrics)
+
+
+class PrometheusResourceTests(SynchronousTestCase):
+    """
+    Tests for L{PrometheusResource}.
+    """
+
+    def render(self, metrics: RouteMetrics) -> List[str]:
+        request = requestMock(b"/")
+        self.successResultOf(_render(PrometheusResource(metrics), request))
+        request.setHeader.assert_any_call(
+            b"content-type", b"text/plain; version=0.0.4; charset=utf-8"
+        )
+        return request.getWrittenData().decode("utf-8").splitlines()
+
+    def test_empty(self) -> None:
+        """
+        With no requests recorded, only the descriptions of the metrics are
+        written.
+        """
+        lines = self.render(RouteMetrics())
+        self.assertEqual(
+            [line.split()[2] for line in lines if line.startswith("# TYPE")],
+            [
+                "klein_requests_total",
+                "klein_request_failures_total",
+                "klein_match_seconds",
+                "klein_handler_seconds",
+                "klein_request_seconds",
+            ],
+        )
+        self.assertEqual([line for line in lines if line[0] != "#"], [])
+
+    def test_format(self) -> None:
+        """
+        Counters and histograms are written for each endpoint, with quoted
+        labels, and histogram buckets counted cumulatively.
+        """
+        metrics = RouteMetrics()
+        metrics.recordRequest('a "quoted"\\name', 0.5, 1.0, 2.0, True)
+        metrics.recordRequest(None, 0.5, None, 0.5, True)
+        lines = self.render(metrics)
+        label = '{endpoint="a \\"quoted\\"\\\\name"}'
+        self.assertIn(f"klein_requests_total{label} 1", lines)
+        self.assertIn(f"klein_request_failures_total{label} 1", lines)
+        self.assertIn('klein_requests_total{endpoint=""} 1', lines)
+        self.assertIn(f"klein_request_seconds_sum{label} 2.0", lines)
+        self.assertIn(f"klein_request_seconds_count{label} 1", lines)
+        self.assertIn('klein_handler_seconds_count{endpoint=""} 0', lines)
+
+        buckets = [
+            line
+            for line in lines
+            if line.startswith("klein_match_seconds_bucket")
+            and line.split("{")[1].startswith('endpoint=""')
+        ]
+        counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual((counts[0], counts[-1]), (0, 1))
+        self.assertEqual(
+            buckets[-1], 'klein_match_seconds_bucket{endpoint="",le="+Inf"} 1'
+        )
@@ -11,7 +11,8 @@ import attr
 
 from hypothesis import given, settings, strategies as st
 
-from twisted.internet.defer import Deferred, succeed
+from twisted.internet.defer import CancelledError, Deferred, fail, succeed
+from twisted.internet.task import Clock
 from twisted.trial.unittest import (
     SynchronousTestCase,
     TestCase as AsynchronousTestCase,
@@ -20,8 +21,14 @@ from twisted.web.error import FlattenerError, MissingRenderMethod
 from twisted.web.template import slot, tags
 
 from .test_resource import _render, requestMock
-from .. import Klein, Plating
-from .._plating import ATOM_TYPES, PlatedElement, resolveDeferredObjects
+from .. import FragmentCache, Klein, Plating
+from .._plating import (
+    ATOM_TYPES,
+    PlatedElement,
+    _preflatten,
+    _prefersJSON,
+    resolveDeferredObjects,
+)
 
 
 page = Plating(
@@ -307,6 +314,81 @@ class ResolveDeferredObjectsTests(SynchronousTestCase):
 
         self.assertEqual(self.successResultOf(resolved), jsonObject)
 
+    def test_deferredFree(self):
+        """
+        An object containing no L{Deferred}s resolves immediately to itself,
+        and only the containers with L{Deferred}s within them are copied.
+        """
+        static = {"a": [1, 2.5, None], "b": ("x", True)}
+        self.assertIs(
+            self.successResultOf(resolveDeferredObjects(static)), static
+        )
+
+        mixed = {"static": static, "deferred": [succeed(1)]}
+        resolved = self.successResultOf(resolveDeferredObjects(mixed))
+        self.assertEqual(resolved, {"static": static, "deferred": [1]})
+        self.assertIs(resolved["static"], static)
+
+    def test_concurrent(self):
+        """
+        All of the L{Deferred}s within an object are waited on at once, so
+        a L{Deferred} may be resolved by one that comes later.
+        """
+        first: Deferred = Deferred()
+        second: Deferred = Deferred()
+        second.addCallback(lambda value: first.callback(value + 1) or value)
+        resolved = resolveDeferredObjects({"first": [first], "second": second})
+        second.callback(1)
+        self.assertEqual(
+            self.successResultOf(resolved), {"first": [2], "second": 1}
+        )
+
+    def test_firstFailure(self):
+        """
+        If any L{Deferred} within an object fails, the result fails with the
+        first failure, and the L{Deferred}s which have not fired yet are
+        cancelled.
+        """
+        cancelled = []
+        failing: Deferred = Deferred()
+        nested: Deferred = Deferred(cancelled.append)
+        outstanding: Deferred = Deferred(cancelled.append)
+        resolved = resolveDeferredObjects(
+            {
+                "outstanding": outstanding,
+                "failing": [failing],
+                "nested": succeed([nested]),
+            }
+        )
+        failing.errback(ZeroDivisionError())
+        self.failureResultOf(resolved, ZeroDivisionError)
+        self.assertEqual(cancelled, [outstanding, nested])
+
+    def test_cancel(self):
+        """
+        Cancelling the result cancels all of the L{Deferred}s within the
+        object which have not fired yet.
+        """
+        cancelled = []
+        outstanding: Deferred = Deferred(cancelled.append)
+        resolved = resolveDeferredObjects([succeed(1), [outstanding]])
+        resolved.cancel()
+        self.assertEqual(cancelled, [outstanding])
+        self.failureResultOf(resolved, CancelledError)
+
+    def test_coroutine(self):
+        """
+        Coroutines within an object are run, and resolve to their results.
+        """
+
+        async def value():
+            return [await succeed("value")]
+
+        self.assertEqual(
+            self.successResultOf(resolveDeferredObjects({"key": value()})),
+            {"key": ["value"]},
+        )
+
     def test_unserializableObject(self):
         """
         An object that cannot be serialized causes the L{Deferred} to
@@ -327,6 +409,88 @@ class ResolveDeferredObjectsTests(SynchronousTestCase):
         self.assertIn("ConsistentRepr() not JSON serializable", str(exception))
 
 
+class PreflattenTests(SynchronousTestCase):
+    """
+    Tests for L{_preflatten}.
+    """
+
+    def test_static(self):
+        """
+        A template with no slots or render directives is flattened entirely.
+        """
+        self.assertEqual(
+            _preflatten(tags.div(tags.p("a & b"), id="x")),
+            [b'<div id="x"><p>a &amp; b</p></div>'],
+        )
+
+    def test_holes(self):
+        """
+        Slots and tags with render directives are left to be flattened for
+        each request, between the flattened markup around them.
+        """
+        title = slot("title")
+        rendered = tags.div(render="renderer")
+        self.assertEqual(
+            _preflatten(
+                tags.html(
+                    tags.head(tags.title(title)),
+                    tags.body(tags.transparent(rendered), "!"),
+                )
+            ),
+            [
+                b"<html><head><title>",
+                title,
+                b"</title></head><body>",
+                rendered,
+                b"!</body></html>",
+            ],
+        )
+
+    def test_dynamicAttribute(self):
+        """
+        A tag with a slot in one of its attributes is left to be flattened for
+        each request, along with its children.
+        """
+        tag = tags.a("static", href=slot("url"))
+        self.assertEqual(_preflatten(tags.p(tag)), [b"<p>", tag, b"</p>"])
+
+
+class PrefersJSONTests(SynchronousTestCase):
+    """
+    Tests for L{_prefersJSON}.
+    """
+
+    def test_prefersJSON(self):
+        """
+        JSON is preferred when the most specific media range matching it has
+        a higher quality than the most specific one matching HTML.
+        """
+        for accept in [
+            b"application/json",
+            b"Application/JSON; charset=utf-8",
+            b"text/html;q=0.5, application/json",
+            b"application/*, text/*;q=0.9",
+            b"*/*, text/html;q=0",
+        ]:
+            self.assertTrue(_prefersJSON(accept), accept)
+
+    def test_prefersHTML(self):
+        """
+        HTML is preferred when it has the same or a higher quality than JSON,
+        including when neither is acceptable.
+        """
+        for accept in [
+            b"text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            b"*/*",
+            b"application/json;q=0.5, text/html",
+            b"application/json;q=0, */*",
+            b"image/png",
+            b"application/json;q=bogus",
+            b"",
+        ]:
+            self.assertFalse(_prefersJSON(accept), accept)
+
+
 class PlatingTests(AsynchronousTestCase):
     """
     Tests for L{Plating}.
@@ -365,6 +529,29 @@ class PlatingTests(AsynchronousTestCase):
         self.assertIn(b"<span>test-data-present</span>", written)
         self.assertIn(b"<title>default title unchanged</title>", written)
 
+    def test_template_reused(self):
+        """
+        Each request for a L{Plating.routed} route is rendered from the same
+        template, which rendering does not modify.
+        """
+
+        @page.routed(
+            self.app.route("/<value>"),
+            tags.ul(tags.li(slot("item"), render="items:list")),
+        )
+        def plateMe(request, value):
+            return {"title": value, "items": [value, value]}
+
+        request, first = self.get(b"/first")
+        request, second = self.get(b"/second")
+
+        self.assertIn(b"<title>first</title>", first)
+        self.assertIn(b"<ul><li>first</li><li>first</li></ul>", first)
+        self.assertIn(b"<title>second</title>", second)
+        self.assertIn(b"<ul><li>second</li><li>second</li></ul>", second)
+        self.assertNotIn(b"first", second)
+        self.assertTrue(first.startswith(b"<!DOCTYPE html>\n<html>"))
+
     def test_selfhood(self):
         """
         Rendering a L{Plating.routed} decorated route on a method still results
@@ -430,6 +617,57 @@ class PlatingTests(AsynchronousTestCase):
             json.loads(written.decode("utf-8")),
         )
 
+    def test_template_json_error_handled(self):
+        """
+        If a L{Deferred} returned by a L{Plating.routed} route fails when
+        JSON is requested, the failure reaches the app's error handlers
+        before any of the response has been written.
+        """
+
+        class Missing(Exception):
+            pass
+
+        @page.routed(self.app.route("/"), tags.span(slot("ok")))
+        def plateMe(request):
+            return {"ok": fail(Missing())}
+
+        @self.app.handle_errors(Missing)
+        def missing(request, failure):
+            request.setResponseCode(404)
+            return b"not found"
+
+        request, written = self.get(b"/?json=true")
+        self.assertEqual(request.code, 404)
+        self.assertEqual(written, b"not found")
+
+    def test_template_accept(self):
+        """
+        A L{Plating.routed} route responds with JSON if the request's
+        C{Accept} header prefers it, and otherwise with HTML; either way, the
+        response varies by C{Accept}.
+        """
+
+        @page.routed(self.app.route("/"), tags.span(slot("ok")))
+        def plateMe(request):
+            return {"ok": "some-data"}
+
+        request = requestMock(b"/", headers={b"Accept": [b"application/json"]})
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(
+            json.loads(request.getWrittenData().decode("utf-8")),
+            {"ok": "some-data", "title": "default title unchanged"},
+        )
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"vary"), [b"Accept"]
+        )
+
+        request = requestMock(b"/", headers={b"Accept": [b"text/html, */*"]})
+        self.successResultOf(_render(self.kr, request))
+        self.assertIn(b"<span>some-data</span>", request.getWrittenData())
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"vary"), [b"Accept"]
+        )
+
     def test_template_numbers(self):
         """
         Data returned from a plated method may include numeric types (integers,
@@ -477,6 +715,60 @@ class PlatingTests(AsynchronousTestCase):
         self.assertIn(b"<ul><li>1</li><li>2</li><li>3</li></ul>", written)
         self.assertIn(b"<title>default title unchanged</title>", written)
 
+    def test_render_list_incremental(self):
+        """
+        The C{:list} renderer accepts asynchronous iterables and iterables of
+        L{Deferred}s, pulling each item only once the rows before it have been
+        written, and only while the request wants more.
+        """
+        rows = [Deferred() for ignored in range(3)]
+        pulled = []
+
+        async def source():
+            for row in rows:
+                pulled.append(row)
+                yield await row
+
+        @page.routed(
+            self.app.route("/"),
+            [
+                tags.ul(tags.li(slot("item"), render="source:list")),
+                tags.ol(tags.li(slot("item"), render="deferreds:list")),
+            ],
+        )
+        def rsrc(request):
+            return {
+                "source": source(),
+                "deferreds": (value for value in [succeed(1), succeed(2)]),
+            }
+
+        request = requestMock(b"/")
+        finished = _render(self.kr, request)
+        self.assertTrue(request.getWrittenData().endswith(b"<ul>"))
+
+        rows[0].callback("first")
+        self.assertTrue(
+            request.getWrittenData().endswith(b"<ul><li>first</li>")
+        )
+        request.producer.pauseProducing()
+        rows[1].callback("second")
+        rows[2].callback("third")
+        self.assertEqual(len(pulled), 2)
+        self.assertTrue(
+            request.getWrittenData().endswith(
+                b"<ul><li>first</li><li>second</li>"
+            )
+        )
+        self.assertNoResult(finished)
+
+        request.producer.resumeProducing()
+        self.successResultOf(finished)
+        self.assertIn(
+            b"<ul><li>first</li><li>second</li><li>third</li></ul>"
+            b"<ol><li>1</li><li>2</li></ol>",
+            request.getWrittenData(),
+        )
+
     def test_widget_function(self):
         """
         A function decorated with L{Plating.wigeted} can be directly
@@ -498,6 +790,33 @@ class PlatingTests(AsynchronousTestCase):
         request, written = self.get(b"/")
         self.assertIn(b'<div id="rendermethod">some text!</div>', written)
 
+    def test_renderMethodCached(self):
+        """
+        The render methods of the elements created by a L{Plating} are
+        created once for each type of bound instance and shared between the
+        elements, until another render method is registered.
+        """
+        plating = Plating(tags=tags.div())
+
+        @plating.renderMethod
+        def renderer(request, tag):
+            return tag("rendered")
+
+        def lookup(instance, name):
+            element = plating._elementify(instance, {"items": [1]})
+            return element.lookupRenderMethod(name).__func__
+
+        first = lookup(None, "renderer")
+        self.assertIs(lookup(None, "renderer"), first)
+        self.assertIsNot(lookup(InstanceWidget(), "renderer"), first)
+        self.assertIs(lookup(None, "items:list"), lookup(None, "items:list"))
+
+        @plating.renderMethod
+        def another(request, tag):
+            return tag
+
+        self.assertIsNot(lookup(None, "renderer"), first)
+
     def test_widget_html(self):
         """
         When L{Plating.widgeted} is applied as a decorator, it gives the
@@ -584,6 +903,84 @@ class PlatingTests(AsynchronousTestCase):
             },
         )
 
+    def test_widget_cached(self):
+        """
+        A widget decorated with L{Plating.widgeted} and a L{FragmentCache}
+        is rendered once for each set of arguments, and its cached rendering
+        is used in its place, both in HTML and in JSON.
+        """
+        calls = []
+        cache = FragmentCache(clock=Clock())
+
+        @element.widgeted(cache=cache)
+        def cachedWidget(a, b):
+            calls.append((a, b))
+            return {"a": a, "b": succeed(b)}
+
+        navigation = Plating(
+            tags=tags.html(
+                tags.body(slot("nav"), tags.div(slot(Plating.CONTENT)))
+            ),
+        )
+
+        @navigation.routed(self.app.route("/"), tags.p(slot("nested")))
+        def rsrc(request):
+            return {
+                "nav": cachedWidget.widget(1, b="two"),
+                "nested": cachedWidget.widget(1, b="two"),
+            }
+
+        for ignored in range(2):
+            request, written = self.get(b"/")
+            self.assertEqual(
+                written,
+                b"<!DOCTYPE html>\n<html><body>"
+                b"<div><span>a: 1</span><span>b: two</span></div>"
+                b"<div><p><div><span>a: 1</span><span>b: two</span></div></p>"
+                b"</div></body></html>",
+            )
+            request, written = self.get(b"/?json=1")
+            self.assertEqual(
+                json.loads(written.decode("utf-8")),
+                {"nav": {"a": 1, "b": "two"}, "nested": {"a": 1, "b": "two"}},
+            )
+        self.assertEqual(calls, [(1, "two")])
+
+        cachedWidget.widget(3, b="four")
+        self.assertEqual(calls, [(1, "two"), (3, "four")])
+        cachedWidget.widget(["unhashable"], b="four")
+        cachedWidget.widget(["unhashable"], b="four")
+        self.assertEqual(calls[2:], [(["unhashable"], "four")] * 2)
+
+    def test_widget_cache_bounds(self):
+        """
+        A L{FragmentCache} forgets fragments once their time to live has
+        passed, and the least-recently-used fragment once it is full.
+        """
+        clock = Clock()
+        cache = FragmentCache(ttl=10, maxEntries=2, clock=clock)
+        calls = []
+
+        @element.widgeted(cache=cache)
+        def cachedWidget(a):
+            calls.append(a)
+            return {"a": a, "b": a}
+
+        cachedWidget.widget(1)
+        clock.advance(5)
+        cachedWidget.widget(1)
+        self.assertEqual(calls, [1])
+        clock.advance(5)
+        cachedWidget.widget(1)
+        self.assertEqual(calls, [1, 1])
+
+        cachedWidget.widget(2)
+        cachedWidget.widget(1)
+        cachedWidget.widget(3)
+        cachedWidget.widget(1)
+        cachedWidget.widget(2)
+        self.assertEqual(calls, [1, 1, 2, 3, 2])
+
     def test_prime_directive_return(self):
         """
         Nothing within these Articles Of Federation shall authorize the United
@@ -1,17 +1,28 @@
-from typing import Iterable, List, Tuple, cast
+from typing import Any, Dict, Iterable, List, Tuple, cast
 
 from hyperlink import DecodedURL
 
 from treq.testing import StubTreq
 
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionLost
+from twisted.python.components import Componentized
+from twisted.python.failure import Failure
 from twisted.trial.unittest import SynchronousTestCase
 from twisted.web.http_headers import Headers
 from twisted.web.iweb import IRequest
 
-from zope.interface import Interface
+from zope.interface import Interface, implementer
 
 from klein import Klein, RequestComponent, RequestURL, Requirer, Response
-from klein.interfaces import IRequiredParameter
+from klein._requirer import InjectionPlan, RequestLifecycle
+from klein.interfaces import (
+    EarlyExit,
+    IDependencyInjector,
+    IRequestLifecycle,
+    IRequiredParameter,
+)
+from klein.test.test_resource import _render, requestMock
 
 
 class BadlyBehavedHeaders(Headers):
@@ -83,6 +94,48 @@ def someHeaders() -> Response:
     )
 
 
+constantResponse = Response(
+    203, {b"x-constant": "constant", "x-constant-multi": ["a", b"b"]}, "body"
+)
+
+
+@requirer.require(router.route("/constant/response"))
+def constant() -> Response:
+    """
+    Return the same L{Response} object for every request.
+    """
+    return constantResponse
+
+
+@implementer(IRequiredParameter, IDependencyInjector)
+class Pending:
+    """
+    A required parameter whose values are L{Deferred}s that the test fires.
+    """
+
+    def __init__(self) -> None:
+        self.waiting: List[Deferred] = []
+        self.cancelled: List[Deferred] = []
+
+    def registerInjector(
+        self,
+        injectionComponents: Componentized,
+        parameterName: str,
+        requestLifecycle: IRequestLifecycle,
+    ) -> IDependencyInjector:
+        return self
+
+    def injectValue(
+        self, instance: Any, request: IRequest, routeParams: Dict[str, Any]
+    ) -> Deferred:
+        d: Deferred = Deferred(self.cancelled.append)
+        self.waiting.append(d)
+        return d
+
+    def finalize(self) -> None:
+        "Nothing to do upon finalization."
+
+
 class RequireURLTests(SynchronousTestCase):
     """
     Tests for RequestURL() required parameter.
@@ -160,6 +213,194 @@ class RequireComponentTests(SynchronousTestCase):
         self.assertEqual(response, "sample component")
 
 
+class InjectionPlanTests(SynchronousTestCase):
+    """
+    Tests for L{InjectionPlan}.
+    """
+
+    def test_introspection(self) -> None:
+        """
+        The plan of a route is available as the C{injectionPlan} attribute of
+        the decorated function, and describes each of its steps.
+        """
+        plan = needsComponent.injectionPlan  # type: ignore[attr-defined]
+        self.assertIsInstance(plan, InjectionPlan)
+        self.assertIs(plan.function, needsComponent)
+        self.assertFalse(plan.bound)
+        self.assertEqual(plan.prepareWaves, ((provideSample,),))
+        self.assertEqual(plan.parameterNames, ("component",))
+        self.assertEqual(
+            plan.describe().splitlines()[:2],
+            ["Plan for needsComponent:", "  prepare wave 1: provideSample"],
+        )
+        self.assertTrue(
+            plan.describe().splitlines()[2].startswith("  inject component: ")
+        )
+
+    def test_synchronousExecution(self) -> None:
+        """
+        If no step has to wait, executing a plan returns the route's result
+        directly.
+        """
+        plan = needsComponent.injectionPlan  # type: ignore[attr-defined]
+        request = Componentized()
+        self.assertEqual(
+            plan.execute(None, request, (), {}), "sample component"
+        )
+
+
+class ConcurrentInjectionTests(SynchronousTestCase):
+    """
+    Tests for concurrent injection of required parameters.
+    """
+
+    def setUp(self) -> None:
+        self.router = Klein()
+        self.first = Pending()
+        self.second = Pending()
+
+        @Requirer().require(
+            self.router.route("/"), first=self.first, second=self.second
+        )
+        def both(first: str, second: str) -> str:
+            return first + second
+
+    def test_concurrent(self) -> None:
+        """
+        All the injectors of a route are asked for their values before any of
+        them has to supply it, and the route receives all of the values.
+        """
+        treq = StubTreq(self.router.resource())
+        d = treq.get("https://example.com/")
+        self.assertEqual(len(self.first.waiting), 1)
+        self.assertEqual(len(self.second.waiting), 1)
+        self.second.waiting[0].callback("two")
+        treq.flush()
+        self.assertNoResult(d)
+        self.first.waiting[0].callback("one")
+        treq.flush()
+        response = self.successResultOf(d)
+        self.assertEqual(self.successResultOf(response.text()), "onetwo")
+
+    def test_firstFailureWins(self) -> None:
+        """
+        If several injectors fail, the failure of the first one in parameter
+        order is used.
+        """
+        treq = StubTreq(self.router.resource())
+        d = treq.get("https://example.com/")
+        self.second.waiting[0].errback(EarlyExit("second"))
+        self.first.waiting[0].errback(EarlyExit("first"))
+        treq.flush()
+        response = self.successResultOf(d)
+        self.assertEqual(self.successResultOf(response.text()), "first")
+
+    def test_disconnect(self) -> None:
+        """
+        If the client disconnects while an injector is supplying its value,
+        the L{Deferred} of that value is cancelled.
+        """
+        request = requestMock(b"/")
+        d = _render(self.router.resource(), request)
+        self.assertEqual(self.first.cancelled, [])
+        request.connectionLost(Failure(ConnectionLost()))
+        self.assertEqual(self.first.cancelled, self.first.waiting)
+        self.failureResultOf(d, ConnectionLost)
+
+
+class IOther(Interface):
+    """
+    Another interface for prepare hooks to provide.
+    """
+
+
+class RequestLifecycleTests(SynchronousTestCase):
+    """
+    Tests for L{RequestLifecycle}.
+    """
+
+    def setUp(self) -> None:
+        self.lifecycle = RequestLifecycle()
+        self.waiting: Dict[str, Deferred] = {}
+
+    def hook(self, name: str) -> Any:
+        def hook(request: IRequest) -> Deferred:
+            self.waiting[name] = Deferred()
+            return self.waiting[name]
+
+        hook.__qualname__ = name
+        return hook
+
+    def test_ordering(self) -> None:
+        """
+        Hooks run after the hooks providing what they require, regardless of
+        the order in which they were added, and independent hooks run
+        concurrently.
+        """
+        self.lifecycle.addPrepareHook(self.hook("needsBoth"), [ISample, IOther])
+        self.lifecycle.addPrepareHook(self.hook("other"), provides=[IOther])
+        self.lifecycle.addPrepareHook(self.hook("sample"), provides=[ISample])
+        d = self.lifecycle.runPrepareHooks(None, object())
+        self.assertEqual(sorted(self.waiting), ["other", "sample"])
+        self.waiting["sample"].callback(None)
+        self.assertNotIn("needsBoth", self.waiting)
+        self.waiting["other"].callback(None)
+        self.waiting["needsBoth"].callback(None)
+        self.successResultOf(d)
+
+    def test_after(self) -> None:
+        """
+        A hook runs after hooks providing what it must run C{after}, but it is
+        not an error if nothing provides it.
+        """
+        self.lifecycle.addPrepareHook(self.hook("late"), after=[ISample])
+        self.lifecycle.addPrepareHook(self.hook("early"), provides=[ISample])
+        d = self.lifecycle.runPrepareHooks(None, object())
+        self.assertEqual(list(self.waiting), ["early"])
+        self.waiting["early"].callback(None)
+        self.waiting["late"].callback(None)
+        self.successResultOf(d)
+
+        lifecycle = RequestLifecycle()
+        lifecycle.addPrepareHook(self.hook("alone"), after=[IOther])
+        lifecycle.finalize()
+
+    def test_unmetRequirement(self) -> None:
+        """
+        Requiring an interface which no hook provides is an error.
+        """
+        self.lifecycle.addPrepareHook(self.hook("needy"), requires=[ISample])
+        error = self.assertRaises(ValueError, self.lifecycle.finalize)
+        self.assertIn("needy", str(error))
+        self.assertIn("ISample", str(error))
+
+    def test_cycle(self) -> None:
+        """
+        Hooks whose requirements form a cycle are an error.
+        """
+        self.lifecycle.addPrepareHook(
+            self.hook("one"), requires=[ISample], provides=[IOther]
+        )
+        self.lifecycle.addPrepareHook(
+            self.hook("two"), requires=[IOther], provides=[ISample]
+        )
+        error = self.assertRaises(ValueError, self.lifecycle.finalize)
+        self.assertIn("one, two", str(error))
+
+    def test_errorAtDefinition(self) -> None:
+        """
+        L{Requirer.require} reports unmet requirements of prerequisites when
+        the route is defined.
+        """
+        requirer = Requirer()
+        requirer.prerequisite([IOther], [ISample])(provideSample)
+        self.assertRaises(
+            ValueError,
+            requirer.require(Klein().route("/"), url=RequestURL()),
+            requiresURL,
+        )
+
+
 class ResponseTests(SynchronousTestCase):
     """
     Tests for L{klein.Response}.
@@ -184,3 +425,50 @@ class ResponseTests(SynchronousTestCase):
             response.headers.getRawHeaders(b"X-Multi-Header"),
             [b"two", b"three"],
         )
+
+    def test_constantResponse(self) -> None:
+        """
+        A single L{Response} object may be returned for multiple requests; its
+        headers, which may be specified as either L{str} or L{bytes}, are
+        applied to each one.
+        """
+        treq = StubTreq(router.resource())
+        for _ in range(2):
+            response = self.successResultOf(
+                treq.get("https://example.com/constant/response")
+            )
+            self.assertEqual(response.code, 203)
+            self.assertEqual(
+                response.headers.getRawHeaders(b"X-Constant"), [b"constant"]
+            )
+            self.assertEqual(
+                response.headers.getRawHeaders(b"X-Constant-Multi"),
+                [b"a", b"b"],
+            )
+
+    def test_headersEncodedAtConstruction(self) -> None:
+        """
+        L{Response} encodes its headers when it is constructed, so that
+        applying it to a request does not need to do so again.
+        """
+        response = Response(headers={"x-text": "value", b"x-bytes": [b"1"]})
+        self.assertEqual(
+            response._encodedHeaders,
+            ((b"x-text", (b"value",)), (b"x-bytes", (b"1",))),
+        )
+
+    def test_headersAppliedAsLists(self) -> None:
+        """
+        L{Response} sets each header's values on a request as a new L{list},
+        as older versions of Twisted require.
+        """
+        response = Response(headers={"x-multi": ["a", "b"]})
+        applied: List[Any] = []
+        for _ in range(2):
+            request = requestMock(b"/")
+            request.responseHeaders.setRawHeaders = (
+                lambda name, values: applied.append(values)
+            )
+            response._applyToRequest(request)
+        self.assertEqual(applied, [[b"a", b"b"], [b"a", b"b"]])
+        self.assertIsNot(applied[0], applied[1])
@@ -2,11 +2,12 @@
 Tests for L{klein._session}.
 """
 
-from typing import List, Tuple, Type
+from typing import Any, Dict, Iterable, List, Tuple, Type
 
 from treq.testing import StubTreq
 
 from twisted.internet.defer import Deferred, inlineCallbacks, returnValue
+from twisted.internet.task import Clock
 from twisted.python.components import Componentized
 from twisted.trial.unittest import SynchronousTestCase
 from twisted.web.iweb import IRequest
@@ -14,7 +15,15 @@ from twisted.web.iweb import IRequest
 from zope.interface import Interface, implementer
 
 from klein import Authorization, Klein, Requirer, SessionProcurer
-from klein.interfaces import ISession, NoSuchSession, TooLateForCookies
+from klein.interfaces import (
+    IDependencyInjector,
+    IRequestLifecycle,
+    IRequiredParameter,
+    ISession,
+    NoSuchSession,
+    TooLateForCookies,
+)
+from klein.storage._memory import MemorySession
 from klein.storage.memory import MemorySessionStore, declareMemoryAuthorizer
 
 Sessions = List[ISession]
@@ -61,6 +70,46 @@ def memoryAuthorizer(
     return SimpleTest()
 
 
+@implementer(IRequiredParameter, IDependencyInjector)
+class RecordingParameter:
+    """
+    A required parameter which records the requests it is injected into.
+    """
+
+    def __init__(self) -> None:
+        self.injected: List[IRequest] = []
+
+    def registerInjector(
+        self,
+        injectionComponents: Componentized,
+        parameterName: str,
+        requestLifecycle: IRequestLifecycle,
+    ) -> IDependencyInjector:
+        return self
+
+    def injectValue(
+        self, instance: Any, request: IRequest, routeParams: Dict[str, Any]
+    ) -> str:
+        self.injected.append(request)
+        return "injected"
+
+    def finalize(self) -> None:
+        "Nothing to do upon finalization."
+
+
+class ReportingStore(MemorySessionStore):
+    """
+    A L{MemorySessionStore} that records calls to C{sentInsecurely}.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.reports: List[List[str]] = []
+
+    def sentInsecurely(self, tokens: Iterable[str]) -> None:
+        self.reports.append(list(tokens))
+
+
 def simpleSessionRouter() -> Tuple[Sessions, Errors, str, str, StubTreq]:
     """
     Construct a simple router.
@@ -100,6 +149,17 @@ def simpleSessionRouter() -> Tuple[Sessions, Errors, str, str, StubTreq]:
     def testDenied(nope: IDenyMe) -> str:
         return "bad"
 
+    @requirer.require(
+        router.route("/several"),
+        first=Authorization(ISimpleTest),
+        second=Authorization(ISimpleTest),
+        optional=Authorization(IDenyMe, required=False),
+    )
+    def testSeveral(
+        first: SimpleTest, second: SimpleTest, optional: IDenyMe
+    ) -> str:
+        return "ok: {} {} {}".format(first.doTest(), second.doTest(), optional)
+
     treq = StubTreq(router.resource())
     return sessions, exceptions, token, cookie, treq
 
@@ -254,3 +314,170 @@ class ProcurementTests(SynchronousTestCase):
             self.successResultOf(response.content()),
             b"klein.test.test_session.IDenyMe DENIED",
         )
+
+    def test_authorizationDeniedBeforeInjection(self) -> None:
+        """
+        When a required L{Authorization} is denied, none of the route's other
+        parameters are injected.
+        """
+        router = Klein()
+        requirer = Requirer()
+        procurer = SessionProcurer(MemorySessionStore())
+
+        @requirer.prerequisite([ISession])
+        def procure(request: IRequest) -> Deferred:
+            return procurer.procureSession(request)
+
+        recording = RecordingParameter()
+
+        @requirer.require(
+            router.route("/denied"),
+            first=recording,
+            nope=Authorization(IDenyMe),
+        )
+        def denied(first: str, nope: IDenyMe) -> str:
+            return "bad"
+
+        response = self.successResultOf(
+            StubTreq(router.resource()).get(
+                "https://unittest.example.com/denied"
+            )
+        )
+        self.assertEqual(
+            self.successResultOf(response.content()),
+            b"klein.test.test_session.IDenyMe DENIED",
+        )
+        self.assertEqual(recording.injected, [])
+
+    def test_authorizationBatched(self) -> None:
+        """
+        When a route requires several L{Authorization}s, the session is asked
+        to authorize all of their interfaces at once.
+        """
+        calls = []
+        authorize = MemorySession.authorize
+
+        def recordingAuthorize(
+            session: MemorySession, interfaces: Iterable[Type[Interface]]
+        ) -> Deferred:
+            calls.append(list(interfaces))
+            return authorize(session, interfaces)
+
+        self.patch(MemorySession, "authorize", recordingAuthorize)
+        sessions, exceptions, token, cookie, treq = simpleSessionRouter()
+        response = self.successResultOf(
+            treq.get("https://unittest.example.com/several")
+        )
+        self.assertEqual(
+            self.successResultOf(response.content()), b"ok: 3 3 None"
+        )
+        self.assertEqual(calls, [[ISimpleTest, IDenyMe]])
+
+
+class InsecureTransportTests(SynchronousTestCase):
+    """
+    Tests for L{klein.SessionProcurer}'s handling of requests sent over
+    insecure transports.
+    """
+
+    def procure(
+        self, sproc: SessionProcurer, url: str, **kw: object
+    ) -> ISession:
+        """
+        Procure a session with C{sproc} for a GET of C{url}.
+        """
+        sessions = []
+        router = Klein()
+
+        @router.route("/")
+        @inlineCallbacks
+        def route(request: IRequest) -> Deferred:
+            sessions.append((yield sproc.procureSession(request)))
+            returnValue(b"ok")
+
+        self.successResultOf(StubTreq(router.resource()).get(url, **kw))
+        [session] = sessions
+        return session
+
+    def test_tokensReported(self) -> None:
+        """
+        Session tokens sent in headers or cookies of an insecure request are
+        reported to the store.
+        """
+        store = ReportingStore()
+        sproc = SessionProcurer(store)
+        self.procure(
+            sproc,
+            "http://unittest.example.com/",
+            headers={"X-Auth-Token": "header-token"},
+            cookies={"Klein-Secure-Session": "cookie-token"},
+        )
+        self.assertEqual(store.reports, [[b"header-token", b"cookie-token"]])
+
+    def test_noTokensNoReport(self) -> None:
+        """
+        If an insecure request carries no session tokens, the store is not
+        told about it.
+        """
+        store = ReportingStore()
+        self.procure(SessionProcurer(store), "http://unittest.example.com/")
+        self.assertEqual(store.reports, [])
+
+    def test_batchedReports(self) -> None:
+        """
+        With an C{insecureReportClock}, tokens from several requests are
+        reported to the store together, off the request path.
+        """
+        store = ReportingStore()
+        clock = Clock()
+        sproc = SessionProcurer(store, insecureReportClock=clock)
+        for token in ["one", "two"]:
+            self.procure(
+                sproc,
+                "http://unittest.example.com/",
+                headers={"X-Auth-Token": token},
+            )
+        self.assertEqual(store.reports, [])
+        clock.advance(0)
+        self.assertEqual(store.reports, [[b"one", b"two"]])
+
+    def test_trustForwardedProto(self) -> None:
+        """
+        With C{trustForwardedProto}, a request forwarded by a proxy which
+        received it over HTTPS gets a secure session, and no tokens are
+        reported; without it, the header is ignored.
+        """
+        store = ReportingStore()
+        headers = {"X-Forwarded-Proto": "https"}
+        cookies = {"Klein-Secure-Session": "cookie-token"}
+        trusting = SessionProcurer(store, trustForwardedProto=True)
+        session = self.procure(
+            trusting,
+            "http://unittest.example.com/",
+            headers=headers,
+            cookies=cookies,
+        )
+        self.assertTrue(session.isConfidential)
+        self.assertEqual(store.reports, [])
+
+        session = self.procure(
+            SessionProcurer(store),
+            "http://unittest.example.com/",
+            headers=headers,
+            cookies=cookies,
+        )
+        self.assertFalse(session.isConfidential)
+        self.assertEqual(store.reports, [[b"cookie-token"]])
+
+    def test_forwardedProtoNotHTTPS(self) -> None:
+        """
+        With C{trustForwardedProto}, a request whose nearest proxy received it
+        over plain HTTP still gets an insecure session.
+        """
+        store = ReportingStore()
+        session = self.procure(
+            SessionProcurer(store, trustForwardedProto=True),
+            "http://unittest.example.com/",
+            headers={"X-Forwarded-Proto": "https, http"},
+        )
+        self.assertFalse(session.isConfidential)
@@ -0,0 +1,261 @@
+"""
+Tests for L{klein.storage.sharedmemory}.
+"""
+
+import fcntl
+import os
+import zlib
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from zope.interface import Interface, implementer
+from zope.interface.verify import verifyObject
+
+from klein.interfaces import (
+    ISession,
+    ISessionStore,
+    NoSuchSession,
+    SessionMechanism,
+)
+from klein.storage.sharedmemory import (
+    SessionStoreFull,
+    SharedMemorySessionStore,
+)
+
+
+class IPreference(Interface):
+    """
+    Interface for testing.
+    """
+
+
+@implementer(IPreference)
+class Preference:
+    """
+    A picklable component to store on a session.
+    """
+
+    def __init__(self, color: str) -> None:
+        self.color = color
+
+
+class SharedMemoryTests(SynchronousTestCase):
+    """
+    Tests for L{SharedMemorySessionStore}.
+    """
+
+    def setUp(self) -> None:
+        self.path = self.mktemp()
+        self.clock = Clock()
+
+    def openStore(self, **kw: object) -> SharedMemorySessionStore:
+        """
+        Open the store at C{self.path}, as another worker process would, and
+        close it when the test ends.
+        """
+        kw.setdefault("clock", self.clock)
+        store = SharedMemorySessionStore.open(self.path, **kw)
+        self.addCleanup(store.close)
+        return store
+
+    def test_interfaceCompliance(self) -> None:
+        """
+        Verify that the session store complies with the relevant interfaces.
+        """
+        store = self.openStore(slots=8)
+        verifyObject(ISessionStore, store)
+        verifyObject(
+            ISession,
+            self.successResultOf(
+                store.newSession(True, SessionMechanism.Header)
+            ),
+        )
+
+    def test_sharedBetweenStores(self) -> None:
+        """
+        A session created by one store, and data saved to it, can be loaded
+        by another store which maps the same file.
+        """
+        first = self.openStore(slots=8)
+        second = self.openStore()
+        session = self.successResultOf(
+            first.newSession(True, SessionMechanism.Cookie)
+        )
+        session._components.setComponent(IPreference, Preference("blue"))
+        first.saveSession(session)
+
+        loaded = self.successResultOf(
+            second.loadSession(
+                session.identifier, True, SessionMechanism.Cookie
+            )
+        )
+        self.assertEqual(loaded.identifier, session.identifier)
+        self.assertIs(loaded.authenticatedBy, SessionMechanism.Cookie)
+        self.assertEqual(
+            loaded._components.getComponent(IPreference).color, "blue"
+        )
+        self.failureResultOf(
+            second.loadSession(
+                session.identifier, False, SessionMechanism.Cookie
+            ),
+            NoSuchSession,
+        )
+
+    def test_full(self) -> None:
+        """
+        Creating more sessions than there are slots fails with
+        L{SessionStoreFull}; slots of expired sessions are reused.
+        """
+        store = self.openStore(slots=2, maxAge=10)
+        sessions = [
+            self.successResultOf(
+                store.newSession(True, SessionMechanism.Header)
+            )
+            for _ in range(2)
+        ]
+        self.failureResultOf(
+            store.newSession(True, SessionMechanism.Header), SessionStoreFull
+        )
+        self.clock.advance(10)
+        for session in sessions:
+            self.failureResultOf(
+                store.loadSession(
+                    session.identifier, True, SessionMechanism.Header
+                ),
+                NoSuchSession,
+            )
+        self.successResultOf(store.newSession(True, SessionMechanism.Header))
+
+    def test_expireSessions(self) -> None:
+        """
+        L{SharedMemorySessionStore.expireSessions} frees the slots of
+        sessions older than C{maxAge}.
+        """
+        store = self.openStore(slots=4, maxAge=10)
+        self.successResultOf(store.newSession(True, SessionMechanism.Header))
+        self.clock.advance(5)
+        young = self.successResultOf(
+            store.newSession(False, SessionMechanism.Cookie)
+        )
+        self.clock.advance(5)
+        self.assertEqual(store.expireSessions(), 1)
+        self.assertEqual(store.expireSessions(), 0)
+        self.successResultOf(
+            store.loadSession(young.identifier, False, SessionMechanism.Cookie)
+        )
+
+    def test_expireSessionsConcurrently(self) -> None:
+        """
+        L{SharedMemorySessionStore.expireSessions} does not hold the write
+        lock while it scans the table, so other processes may store sessions
+        meanwhile, and it does not free the slots they reuse.
+        """
+        store = self.openStore(slots=4, maxAge=10)
+        other = self.openStore()
+        for _ in range(4):
+            self.successResultOf(
+                store.newSession(True, SessionMechanism.Header)
+            )
+        self.clock.advance(10)
+        created = []
+        original = store._read
+
+        def readAndCreate(slot: int) -> object:
+            if slot == 3 and not created:
+                fcntl.flock(other._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(other._fd, fcntl.LOCK_UN)
+                created.append(
+                    self.successResultOf(
+                        other.newSession(True, SessionMechanism.Header)
+                    )
+                )
+            return original(slot)
+
+        store._read = readAndCreate  # type: ignore[assignment]
+        # The new session's home is slot 0, which has already been scanned.
+        self.patch(os, "urandom", lambda size: b"\0" * size)
+        self.assertEqual(store.expireSessions(), 3)
+        [session] = created
+        self.successResultOf(
+            store.loadSession(session.identifier, True, SessionMechanism.Header)
+        )
+
+    def test_probesBounded(self) -> None:
+        """
+        Once every slot has been used and freed, a lookup which misses and
+        the creation of a new session read only a bounded number of slots,
+        because L{SharedMemorySessionStore.expireSessions} empties the freed
+        slots that no lookup needs.
+        """
+        store = self.openStore(slots=512, maxAge=10)
+        for _ in range(2):
+            for _ in range(300):
+                self.successResultOf(
+                    store.newSession(True, SessionMechanism.Header)
+                )
+            self.clock.advance(10)
+            self.assertEqual(store.expireSessions(), 300)
+
+        reads = []
+        original = store._read
+
+        def countingRead(slot: int) -> object:
+            reads.append(slot)
+            return original(slot)
+
+        store._read = countingRead  # type: ignore[assignment]
+        self.failureResultOf(
+            store.loadSession("0" * 64, True, SessionMechanism.Header),
+            NoSuchSession,
+        )
+        self.assertEqual(len(reads), 1)
+        del reads[:]
+        self.successResultOf(store.newSession(True, SessionMechanism.Header))
+        self.assertEqual(len(reads), 1)
+
+    def test_probesCapped(self) -> None:
+        """
+        No lookup reads more than 128 slots, even if no slot is empty.
+        Identifiers which are not hexadecimal are hashed the same way in
+        every process.
+        """
+        store = self.openStore(slots=512)
+        for _ in range(512):
+            store.newSession(True, SessionMechanism.Header).addErrback(
+                lambda failure: failure.trap(SessionStoreFull)
+            )
+        reads = []
+        original = store._read
+
+        def countingRead(slot: int) -> object:
+            reads.append(slot)
+            return original(slot)
+
+        store._read = countingRead  # type: ignore[assignment]
+        self.failureResultOf(
+            store.loadSession("not hex", True, SessionMechanism.Header),
+            NoSuchSession,
+        )
+        self.assertLessEqual(len(reads), 128)
+        self.assertEqual(reads[0], zlib.crc32(b"not hex") % 512)
+
+    def test_dataTooLarge(self) -> None:
+        """
+        Saving a session whose data does not fit in a slot raises
+        L{ValueError}.
+        """
+        store = self.openStore(slots=2, slotSize=256)
+        session = self.successResultOf(
+            store.newSession(True, SessionMechanism.Header)
+        )
+        session._components.setComponent(IPreference, Preference("x" * 256))
+        self.assertRaises(ValueError, store.saveSession, session)
+
+    def test_notATable(self) -> None:
+        """
+        Opening a file which is not a session table raises L{ValueError}.
+        """
+        with open(self.path, "wb") as f:
+            f.write(b"\1" * 64)
+        self.assertRaises(ValueError, SharedMemorySessionStore.open, self.path)
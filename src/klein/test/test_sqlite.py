@@ -0,0 +1,244 @@
+"""
+Tests for L{klein.storage.sqlite}.
+"""
+
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+from twisted.internet import reactor
+from twisted.internet.defer import fail, inlineCallbacks
+from twisted.internet.task import Clock
+from twisted.python import log
+from twisted.trial.unittest import TestCase
+
+from zope.interface import Interface, implementer
+from zope.interface.verify import verifyObject
+
+from klein.interfaces import (
+    ISession,
+    ISessionStore,
+    NoSuchSession,
+    SessionMechanism,
+)
+from klein.storage.sqlite import SQLiteSessionStore
+
+
+class IPreference(Interface):
+    """
+    Interface for testing.
+    """
+
+
+@implementer(IPreference)
+class Preference:
+    """
+    A picklable component to store on a session.
+    """
+
+    def __init__(self, color: str) -> None:
+        self.color = color
+
+
+class ShutdownReactor:
+    """
+    The global reactor, except that system event triggers are recorded
+    rather than added to it.
+    """
+
+    def __init__(self) -> None:
+        self.triggers: List[Tuple[str, str, Any]] = []
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(reactor, name)
+
+    def addSystemEventTrigger(self, phase: str, event: str, f: Any) -> object:
+        trigger = (phase, event, f)
+        self.triggers.append(trigger)
+        return trigger
+
+    def removeSystemEventTrigger(self, trigger: Any) -> None:
+        self.triggers.remove(trigger)
+
+
+class SQLiteTests(TestCase):
+    """
+    Tests for L{SQLiteSessionStore}.
+    """
+
+    def openStore(self, path: str, **kw: object) -> SQLiteSessionStore:
+        """
+        Open a store at C{path} with a fake clock, closing it when the test
+        ends.
+        """
+        kw.setdefault("clock", Clock())
+        store = SQLiteSessionStore.open(path, **kw)
+        self.addCleanup(store.close)
+        return store
+
+    def test_interfaceCompliance(self) -> None:
+        """
+        Verify that the session store complies with the relevant interfaces.
+        """
+        store = self.openStore(":memory:")
+        verifyObject(ISessionStore, store)
+        verifyObject(
+            ISession,
+            self.successResultOf(
+                store.newSession(True, SessionMechanism.Header)
+            ),
+        )
+
+    @inlineCallbacks
+    def test_persistence(self) -> None:
+        """
+        Sessions and their data that are saved in one L{SQLiteSessionStore}
+        can be loaded from another one using the same database file.
+        """
+        path = self.mktemp()
+        first = self.openStore(path)
+        session = yield first.newSession(True, SessionMechanism.Cookie)
+        session._components.setComponent(IPreference, Preference("blue"))
+        first.saveSession(session)
+        yield first.close()
+
+        second = self.openStore(path)
+        loaded = yield second.loadSession(
+            session.identifier, True, SessionMechanism.Cookie
+        )
+        self.assertEqual(loaded.identifier, session.identifier)
+        self.assertIs(loaded.authenticatedBy, SessionMechanism.Cookie)
+        self.assertEqual(
+            loaded._components.getComponent(IPreference).color, "blue"
+        )
+        yield self.assertFailure(
+            second.loadSession(
+                session.identifier, False, SessionMechanism.Cookie
+            ),
+            NoSuchSession,
+        )
+
+    @inlineCallbacks
+    def test_cache(self) -> None:
+        """
+        Loading a session that was recently used returns the same object
+        without waiting on the database.
+        """
+        store = self.openStore(":memory:")
+        session = yield store.newSession(False, SessionMechanism.Cookie)
+        self.assertIs(
+            self.successResultOf(
+                store.loadSession(
+                    session.identifier, False, SessionMechanism.Cookie
+                )
+            ),
+            session,
+        )
+
+    @inlineCallbacks
+    def test_batchedWrites(self) -> None:
+        """
+        New sessions are written to the database together after
+        C{flushDelay} seconds, and can then be loaded even after they have
+        been evicted from the cache.
+        """
+        clock = Clock()
+        store = self.openStore(":memory:", clock=clock, cacheSize=1)
+        sessions = []
+        for _ in range(3):
+            sessions.append(
+                (yield store.newSession(True, SessionMechanism.Header))
+            )
+        self.assertEqual(len(store._pendingWrites), 3)
+        clock.advance(store.flushDelay)
+        self.assertEqual(store._pendingWrites, {})
+        yield store.flush()
+        for session in sessions:
+            loaded = yield store.loadSession(
+                session.identifier, True, SessionMechanism.Header
+            )
+            self.assertEqual(loaded.identifier, session.identifier)
+
+    @inlineCallbacks
+    def test_batchedWriteFails(self) -> None:
+        """
+        If writing a batch of sessions after C{flushDelay} seconds fails, the
+        failure is logged as such.
+        """
+        clock = Clock()
+        store = self.openStore(":memory:", clock=clock)
+        yield store.newSession(True, SessionMechanism.Header)
+        self.patch(
+            store._connection,
+            "runWithConnection",
+            lambda work: fail(sqlite3.OperationalError("database is locked")),
+        )
+        events: List[Dict[str, Any]] = []
+        log.addObserver(events.append)
+        self.addCleanup(log.removeObserver, events.append)
+        clock.advance(store.flushDelay)
+        self.assertEqual(
+            len(self.flushLoggedErrors(sqlite3.OperationalError)), 1
+        )
+        self.assertIn(
+            "Could not write klein sessions to the database.",
+            [event.get("why") for event in events],
+        )
+
+    @inlineCallbacks
+    def test_maxAge(self) -> None:
+        """
+        Sessions older than C{maxAge} cannot be loaded and are deleted by
+        L{SQLiteSessionStore.expireSessions}.
+        """
+        clock = Clock()
+        store = self.openStore(":memory:", clock=clock, maxAge=10)
+        session = yield store.newSession(True, SessionMechanism.Header)
+        yield store.flush()
+        clock.advance(10)
+        yield self.assertFailure(
+            store.loadSession(
+                session.identifier, True, SessionMechanism.Header
+            ),
+            NoSuchSession,
+        )
+        self.assertEqual((yield store.expireSessions()), 1)
+        yield self.assertFailure(
+            store.loadSession(
+                session.identifier, True, SessionMechanism.Header
+            ),
+            NoSuchSession,
+        )
+
+    @inlineCallbacks
+    def test_closedOnShutdown(self) -> None:
+        """
+        A store writes its buffered sessions and closes its database when its
+        reactor shuts down, so its thread does not keep the process alive.
+        """
+        path = self.mktemp()
+        shutdownReactor = ShutdownReactor()
+        store = self.openStore(path, reactor=shutdownReactor)
+        session = yield store.newSession(True, SessionMechanism.Header)
+        [(phase, event, shutdown)] = shutdownReactor.triggers
+        self.assertEqual((phase, event), ("during", "shutdown"))
+        del shutdownReactor.triggers[:]
+        yield shutdown()
+        self.assertFalse(store._connection._pool.started)
+
+        loaded = yield self.openStore(path).loadSession(
+            session.identifier, True, SessionMechanism.Header
+        )
+        self.assertEqual(loaded.identifier, session.identifier)
+
+    def test_closeRemovesTrigger(self) -> None:
+        """
+        Closing a store removes its shutdown trigger.
+        """
+        shutdownReactor = ShutdownReactor()
+        store = SQLiteSessionStore.open(
+            ":memory:", reactor=shutdownReactor, clock=Clock()
+        )
+        self.assertEqual(len(shutdownReactor.triggers), 1)
+        d = store.close()
+        self.assertEqual(shutdownReactor.triggers, [])
+        return d
@@ -0,0 +1,226 @@
+"""
+Tests for L{klein._tracing}.
+"""
+
+from typing import List
+
+from treq.testing import StubTreq
+
+from twisted.internet.defer import Deferred, succeed
+from twisted.python.failure import Failure
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.template import Element, TagLoader, slot, tags
+
+from zope.interface.verify import verifyObject
+
+from .test_form import TestObject
+from .test_resource import _render, requestMock
+from .. import Klein, Plating, RingBufferTracer, TracedSpan
+from .._tracing import traced
+from ..interfaces import ITracer, SessionMechanism
+from ..storage.memory import MemorySessionStore
+
+
+class RingBufferTracerTests(SynchronousTestCase):
+    """
+    Tests for L{RingBufferTracer}.
+    """
+
+    def test_interface(self) -> None:
+        """
+        L{RingBufferTracer} provides L{ITracer}.
+        """
+        self.assertTrue(verifyObject(ITracer, RingBufferTracer()))
+
+    def test_record(self) -> None:
+        """
+        Each span is recorded when it ends, with the attributes given when it
+        started and ended, and a description of its failure, if any.
+        """
+        tracer = RingBufferTracer()
+        request = requestMock(b"/")
+        first = tracer.startSpan("first", request, {"a": 1})
+        second = tracer.startSpan("second", request, {})
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            tracer.endSpan(second, {}, Failure())
+        tracer.endSpan(first, {"b": 2}, None)
+
+        [secondSpan, firstSpan] = tracer.spans
+        self.assertEqual(
+            (firstSpan.name, firstSpan.attributes, firstSpan.error),
+            ("first", {"a": 1, "b": 2}, None),
+        )
+        self.assertEqual(secondSpan.name, "second")
+        self.assertEqual(
+            secondSpan.error, "builtins.ZeroDivisionError: division by zero"
+        )
+        self.assertEqual(firstSpan.requestID, secondSpan.requestID)
+        self.assertGreaterEqual(firstSpan.duration, secondSpan.duration)
+
+    def test_size(self) -> None:
+        """
+        Only the most recent C{size} spans are kept.
+        """
+        tracer = RingBufferTracer(size=2)
+        request = requestMock(b"/")
+        for name in ["one", "two", "three"]:
+            tracer.endSpan(tracer.startSpan(name, request, {}), {}, None)
+        self.assertEqual([span.name for span in tracer.spans], ["two", "three"])
+
+
+class TracedTests(SynchronousTestCase):
+    """
+    Tests for L{traced}.
+    """
+
+    def setUp(self) -> None:
+        self.tracer = RingBufferTracer()
+        self.request = requestMock(b"/")
+        self.request.setComponent(ITracer, self.tracer)
+
+    def test_untraced(self) -> None:
+        """
+        If the request has no tracer, the function is simply called.
+        """
+        self.assertEqual(traced(requestMock(b"/"), "x", {}, max, 1, 2), 2)
+
+    def test_synchronous(self) -> None:
+        """
+        A function which returns or raises synchronously is traced as a span
+        which ends when it does.
+        """
+        self.assertEqual(traced(self.request, "max", {}, max, 1, 2), 2)
+        self.assertRaises(
+            ZeroDivisionError, traced, self.request, "div", {}, divmod, 1, 0
+        )
+        [maxSpan, divSpan] = self.tracer.spans
+        self.assertEqual((maxSpan.name, maxSpan.error), ("max", None))
+        self.assertEqual(divSpan.name, "div")
+        self.assertIn("ZeroDivisionError", divSpan.error)
+
+    def test_deferred(self) -> None:
+        """
+        A function which returns a L{Deferred} is traced as a span which ends
+        when the L{Deferred} fires, which fires with the same result.
+        """
+        waiting: Deferred = Deferred()
+        d = traced(self.request, "wait", {"n": 1}, lambda: waiting)
+        self.assertEqual(list(self.tracer.spans), [])
+        waiting.callback("done")
+        self.assertEqual(self.successResultOf(d), "done")
+        [span] = self.tracer.spans
+        self.assertEqual((span.name, span.attributes), ("wait", {"n": 1}))
+
+
+class ApplicationTracingTests(SynchronousTestCase):
+    """
+    Tests for the tracing of requests handled by a L{Klein} application with
+    a C{tracer}.
+    """
+
+    def names(self, spans: List[TracedSpan]) -> List[str]:
+        return [span.name for span in spans]
+
+    def test_disabled(self) -> None:
+        """
+        By default, a L{Klein} has no C{tracer}.
+        """
+        self.assertIsNone(Klein().tracer)
+
+    def test_routing(self) -> None:
+        """
+        Matching, handling and rendering a request, and the whole request,
+        are traced; a request which matches no route is traced as failing to
+        match.
+        """
+        tracer = RingBufferTracer()
+        app = Klein()
+        app.tracer = tracer
+
+        @app.route("/")
+        def root(request):
+            return succeed(Element(TagLoader(tags.p("hello"))))
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(app.resource(), request))
+        self.assertEqual(
+            self.names(tracer.spans),
+            ["klein.match", "klein.handler", "klein.request", "klein.render"],
+        )
+        self.assertEqual(tracer.spans[1].attributes, {"endpoint": "root"})
+        self.assertEqual(
+            tracer.spans[2].attributes, {"method": b"GET", "uri": b"/"}
+        )
+
+        tracer.spans.clear()
+        request = requestMock(b"/missing")
+        self.successResultOf(_render(app.resource(), request))
+        self.assertEqual(
+            self.names(tracer.spans), ["klein.match", "klein.request"]
+        )
+        self.assertIn("NotFound", tracer.spans[0].error)
+
+    def test_plating(self) -> None:
+        """
+        Rendering a L{Plating} page is traced.
+        """
+        tracer = RingBufferTracer()
+        app = Klein()
+        app.tracer = tracer
+        plating = Plating(tags=tags.html(tags.body(slot(Plating.CONTENT))))
+
+        @plating.routed(app.route("/"), tags.p(slot("message")))
+        def page(request):
+            return {"message": "hello"}
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(app.resource(), request))
+        self.assertIn(b"<p>hello</p>", request.getWrittenData())
+        self.assertIn("klein.plating.render", self.names(tracer.spans))
+
+    def test_dependencies(self) -> None:
+        """
+        Each of a L{Requirer}'s prepare hooks and injectors is traced, along
+        with procuring a session, and parsing and validating a form.
+        """
+        store = MemorySessionStore()
+        session = self.successResultOf(
+            store.newSession(True, SessionMechanism.Header)
+        )
+        tracer = RingBufferTracer()
+        to = TestObject(store)
+        router = to.router
+        router.tracer = tracer
+        stub = StubTreq(router.resource())
+        response = self.successResultOf(
+            stub.post(
+                "https://localhost/handle",
+                data=dict(name="hello", value="1234"),
+                headers={b"X-Test-Session": session.identifier},
+            )
+        )
+        self.assertEqual(response.code, 200)
+
+        names = self.names(tracer.spans)
+        for name in [
+            "klein.session.procure",
+            "klein.form.parse",
+            "klein.form.validate",
+        ]:
+            self.assertIn(name, names)
+        prepares = [
+            span.attributes["hook"]
+            for span in tracer.spans
+            if span.name == "klein.prepare"
+        ]
+        self.assertEqual(len(prepares), 2)
+        self.assertIn("TestObject.procureASession", prepares)
+        injected = [
+            span.attributes["parameter"]
+            for span in tracer.spans
+            if span.name == "klein.inject"
+        ]
+        self.assertEqual(sorted(injected), ["name", "value"])
+        self.assertEqual(len({span.requestID for span in tracer.spans}), 1)